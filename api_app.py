@@ -0,0 +1,386 @@
+# Stateless JSON API of the calculator, for other tools to call without going
+# through the dashboards.
+#
+# A plain ASGI application (no web framework), served by any ASGI server; e.g.
+# with four worker processes:
+#
+# >>> uvicorn api_app:app --workers 4
+#
+# Each worker builds the data indexes once at startup and keeps them in memory.
+# Calculations run in worker threads, off the event loop: /scan through the
+# memoized compute_scan (the result caches of utils/cache.py are shared between
+# its requests), batches and stream chunks through the vectorized compute_scans,
+# without filling the caches with one-off studies.
+#
+#   GET  /health         {"status": "ok"}
+#   POST /scan           one study (JSON object) -> its compute_scan summary
+#   POST /scans          JSON array of studies -> array of summaries
+#   POST /scans/stream   studies as JSON lines -> summaries as JSON lines,
+#                        written back as the request body arrives
+#   GET  /metrics        Prometheus text of utils/metrics.py
+#
+# With a DatasetRegistry (utils/tenants.py; for `app`, set the directory of the
+# tenants' files in NEURO_IMPACT_TENANTS_DIR), add ?tenant=<name> to compute
+# with the data of a tenant, uploaded as CSV with:
+#
+#   PUT  /tenants/<name>/scanner   scanner models added or replaced
+#   PUT  /tenants/<name>/carbon    carbon intensities added or replaced
+#   GET  /tenants                  names of the tenants
+#
+# Uploads need the header "Authorization: Bearer <token>", with the token set
+# in NEURO_IMPACT_UPLOAD_TOKEN for `app`; without a token they are refused.
+#
+# A study has the fields model, field_strength, scan_duration, idle_duration,
+# country and year, and optionally modality ("MRI") and the storage and
+# computing parameters of compute_scan. Add ?statement=true to also get the
+# statement of each study. In batches, a study that fails gives {"error": ...}
+# in place of its summary, so the others are still returned.
+
+import hmac
+import inspect
+import json
+import math
+import os
+from urllib.parse import parse_qs
+
+try:
+    # Optional, encodes the summaries several times faster than the json module
+    import orjson
+except ImportError:
+    orjson = None
+
+from utils import metrics
+from utils.calculator import compute_scan, get_statement, run_async, warm_up
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.tenants import KINDS, DatasetRegistry
+
+# Study fields: the arguments of compute_scan other than the data files
+_PARAMETERS = inspect.signature(compute_scan).parameters
+_FIELDS = [name for name in _PARAMETERS if name not in ("scannerData_filename", "countryCarbonIntensity_filename")]
+_TYPES = {"modality": str, "model": str, "country": str, "year": int}  # float otherwise
+# Years accepted in studies; the calculations use the closest year of the carbon data
+YEARS = range(1900, 2201)
+_DEFAULTS = {"modality": "MRI"}
+_REQUIRED = [name for name in _FIELDS if _PARAMETERS[name].default is _PARAMETERS[name].empty and name not in _DEFAULTS]
+# Storage and computing parameters, filled in for the studies of a batch not giving them
+_OPTIONAL = {name: _PARAMETERS[name].default for name in _FIELDS
+             if _PARAMETERS[name].default is not _PARAMETERS[name].empty}
+
+if orjson is not None:
+    _dumps, _parse = orjson.dumps, orjson.loads
+    _JSONError = orjson.JSONDecodeError
+else:
+    def _dumps(data):
+        return json.dumps(data).encode()
+    _parse, _JSONError = json.loads, json.JSONDecodeError
+
+# Largest body read in one piece (/scan and /scans); /scans/stream has no limit
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_study(study):
+    """
+    compute_scan arguments of a study given as a JSON object.
+
+    Raises:
+      ValueError: Not an object, missing or unknown fields, values of the wrong
+        type, numbers that are not finite (e.g. "nan"), or years that are not
+        whole numbers of the YEARS range.
+    """
+    if not isinstance(study, dict):
+        raise ValueError("A study must be a JSON object")
+    unknown = [name for name in study if name not in _FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field: {unknown[0]}")
+    missing = [name for name in _REQUIRED if name not in study]
+    if missing:
+        raise ValueError(f"Missing field: {missing[0]}")
+
+    arguments = {}
+    for name, value in {**_DEFAULTS, **study}.items():
+        try:
+            arguments[name] = _parse_value(_TYPES.get(name, float), value)
+        except (OverflowError, TypeError, ValueError):
+            raise ValueError(f"Invalid value for field {name}: {value!r}") from None
+    if arguments["year"] not in YEARS:
+        raise ValueError(f"Year out of range ({YEARS[0]}-{YEARS[-1]}): {study['year']!r}")
+    return arguments
+
+
+def _parse_value(kind, value):
+    # No silent coercion: true is not 1, and 2020.5 is not the year 2020
+    if isinstance(value, bool) or isinstance(value, float) and kind is int and not value.is_integer():
+        raise ValueError(value)
+    value = kind(value)
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(value)
+    return value
+
+
+def compute_studies(studies, statement, files):
+    """
+    Results of a batch of studies, computed together with compute_scans.
+
+    Unlike compute_scan, results are not memoized: one-off batches would only
+    evict the entries of the shared caches.
+
+    Args:
+      studies (list): Studies as JSON values, or exceptions (e.g. lines that
+        are not valid JSON) to report as their error.
+      statement (bool): Add the statement of each study.
+      files (tuple): Scanner and carbon intensity data files.
+
+    Returns:
+      list: The compute_scan summary of each study, or {"error": ...} for
+        those that failed.
+    """
+    import pandas as pd
+
+    from utils.batch import SUMMARY_COLUMNS, compute_scans
+    from utils.statements import render_statements
+
+    results = [None] * len(studies)
+    rows, positions = [], []
+    for position, study in enumerate(studies):
+        try:
+            if isinstance(study, Exception):
+                raise study
+            rows.append({**_OPTIONAL, **parse_study(study)})
+            positions.append(position)
+        except ValueError as e:
+            results[position] = {"error": str(e)}
+    if not rows:
+        return results
+
+    frame = compute_scans(pd.DataFrame(rows), *files, errors="report")
+    valid = frame["error"].isna().to_numpy()
+    summaries = iter(frame.loc[valid, SUMMARY_COLUMNS].to_dict("records"))
+    statements = iter(render_statements(frame[valid], "text").tolist() if statement else ())
+    for position, is_valid, error in zip(positions, valid.tolist(), frame["error"].tolist()):
+        if not is_valid:
+            results[position] = {"error": error}
+        elif statement:
+            results[position] = {**next(summaries), "statement": next(statements)}
+        else:
+            results[position] = next(summaries)
+    return results
+
+
+def _compute_lines(lines, statement, files):
+    # A chunk of /scans/stream: JSON lines in, JSON lines out
+    studies = []
+    for line in lines:
+        try:
+            studies.append(_parse(line))
+        except _JSONError as e:
+            studies.append(ValueError(f"Invalid JSON: {e}"))
+    return b"".join(_dumps(result) + b"\n" for result in compute_studies(studies, statement, files))
+
+
+def _compute_array(body, statement, files):
+    # The body of /scans: JSON array in, JSON array out
+    studies = _loads(body)
+    if not isinstance(studies, list):
+        raise HTTPError(400, "Expected a JSON array of studies")
+    return _dumps(compute_studies(studies, statement, files))
+
+
+def create_app(scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE,
+               registry=None, upload_token=None):
+    """
+    Builds the ASGI application.
+
+    Args:
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      registry (DatasetRegistry, optional): Data of the tenants, over the files
+        above. Defaults to None, for no tenants.
+      upload_token (str, optional): Bearer token required to upload tenant
+        data. Defaults to None, refusing every upload.
+
+    Returns:
+      callable: The ASGI application.
+    """
+    base_files = (scannerData_filename, countryCarbonIntensity_filename)
+
+    def compute(study, statement, files):
+        summary = compute_scan(**parse_study(study), scannerData_filename=files[0],
+                               countryCarbonIntensity_filename=files[1])
+        if statement:
+            summary = {**summary, "statement": get_statement(summary)}
+        return summary
+
+    # Calculations run in worker threads (see utils.calculator.run_async), so
+    # that a large batch does not block the event loop and the other requests
+
+    async def scan(receive, send, statement, files):
+        study = _loads(await _read_body(receive))
+        try:
+            result = await run_async(compute, study, statement, files)
+        except (OverflowError, ValueError) as e:
+            raise HTTPError(400, str(e)) from None
+        await _send_json(send, 200, result)
+
+    async def scans(receive, send, statement, files):
+        body = await _read_body(receive)
+        await _send(send, 200, await run_async(_compute_array, body, statement, files), b"application/json")
+
+    async def scans_stream(receive, send, statement, files):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")]})
+        pending = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            more_body = message.get("more_body", False)
+            lines = (pending + message.get("body", b"")).split(b"\n")
+            # An incomplete last line waits for the next part of the body
+            pending = lines.pop() if more_body else b""
+            lines = [line for line in lines if line.strip()]
+            if lines:
+                results = await run_async(_compute_lines, lines, statement, files)
+                await send({"type": "http.response.body", "body": results, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def health(receive, send, statement, files):
+        await _send_json(send, 200, {"status": "ok"})
+
+    async def metrics_text(receive, send, statement, files):
+        await _send(send, 200, metrics.render_prometheus().encode(), b"text/plain; version=0.0.4")
+
+    async def tenants(receive, send, statement, files):
+        await _send_json(send, 200, await run_async(registry.tenants))
+
+    async def upload(receive, send, tenant, kind):
+        try:
+            text = (await _read_body(receive)).decode("utf-8-sig")
+            await run_async(registry.upload, tenant, kind, text)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise HTTPError(400, str(e)) from None
+        await _send_json(send, 200, {"tenant": tenant, "dataset": kind})
+
+    routes = {
+        ("POST", "/scan"): scan,
+        ("POST", "/scans"): scans,
+        ("POST", "/scans/stream"): scans_stream,
+        ("GET", "/health"): health,
+        ("GET", "/metrics"): metrics_text,
+    }
+    if registry is not None:
+        routes[("GET", "/tenants")] = tenants
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            await _lifespan(receive, send, scannerData_filename, countryCarbonIntensity_filename)
+            return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"].rstrip("/") or "/"
+        handler = routes.get((scope["method"], path))
+        try:
+            if handler is None and registry is not None and path.startswith("/tenants/"):
+                await _route_upload(scope, receive, send, path, upload, upload_token)
+                return
+            if handler is None:
+                if any(route_path == path for _, route_path in routes):
+                    raise HTTPError(405, f"Method not allowed: {scope['method']}")
+                raise HTTPError(404, f"Not found: {path}")
+            query = parse_qs(scope.get("query_string", b"").decode())
+            statement = query.get("statement", ["false"])[-1].lower() in ("1", "true", "yes")
+            files = base_files
+            if "tenant" in query:
+                if registry is None:
+                    raise HTTPError(400, "No tenants on this server")
+                try:
+                    # Builds the tenant's indexes (and may write its files) when they are not in memory
+                    files = await run_async(registry.files, query["tenant"][-1])
+                except ValueError as e:
+                    raise HTTPError(404, str(e)) from None
+            with metrics.timer("api", endpoint=path):
+                await handler(receive, send, statement, files)
+        except HTTPError as e:
+            await _send_json(send, e.status, {"error": str(e)})
+
+    return app
+
+
+async def _route_upload(scope, receive, send, path, upload, upload_token):
+    # /tenants/<name>/<dataset>
+    parts = path.split("/")
+    if len(parts) != 4 or parts[3] not in KINDS:
+        raise HTTPError(404, f"Not found: {path}")
+    if scope["method"] != "PUT":
+        raise HTTPError(405, f"Method not allowed: {scope['method']}")
+    if upload_token is None:
+        raise HTTPError(403, "Uploads are disabled on this server")
+    authorization = dict(scope.get("headers", ())).get(b"authorization", b"")
+    if not hmac.compare_digest(authorization, b"Bearer " + upload_token.encode()):
+        raise HTTPError(401, "Missing or invalid upload token")
+    with metrics.timer("api", endpoint="/tenants/upload"):
+        await upload(receive, send, parts[2], parts[3])
+
+
+async def _lifespan(receive, send, scannerData_filename, countryCarbonIntensity_filename):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                # Load the datasets once per worker, before serving any request
+                warm_up(scannerData_filename, countryCarbonIntensity_filename)
+            except (OSError, ValueError) as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive):
+    body = bytearray()
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body over {MAX_BODY_BYTES} bytes, use /scans/stream")
+        more_body = message.get("more_body", False)
+    return bytes(body)
+
+
+def _loads(body):
+    try:
+        return _parse(body)
+    except _JSONError as e:
+        raise HTTPError(400, f"Invalid JSON: {e}") from None
+
+
+async def _send(send, status, body, content_type):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, data):
+    await _send(send, status, _dumps(data), b"application/json")
+
+
+app = create_app(registry=DatasetRegistry(os.environ["NEURO_IMPACT_TENANTS_DIR"])
+                 if os.environ.get("NEURO_IMPACT_TENANTS_DIR") else None,
+                 upload_token=os.environ.get("NEURO_IMPACT_UPLOAD_TOKEN") or None)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("api_app:app", host="127.0.0.1", port=8080)
@@ -0,0 +1,27 @@
+# Benchmarks of the calculation paths, run with pytest-benchmark:
+#
+# >>> python -m pytest benchmarks --benchmark-json=bench.json
+#
+# Without pytest-benchmark, the benchmarks are collected and skipped.
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+# Make the repository root importable, as when running the apps from it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tests.studies import studies  # noqa: E402, F401
+
+BENCHMARKS = Path(__file__).resolve().parent
+
+
+def pytest_collection_modifyitems(config, items):
+    if importlib.util.find_spec("pytest_benchmark") is not None:
+        return
+    skip = pytest.mark.skip(reason="pytest-benchmark is not installed")
+    for item in items:
+        if BENCHMARKS in item.path.parents:
+            item.add_marker(skip)
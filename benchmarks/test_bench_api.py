@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+from api_app import app
+
+# One event loop for all the requests, as in a server
+LOOP = asyncio.new_event_loop()
+
+STUDY = {"model": "Siemens MAGNETOM Prisma", "field_strength": 3.0, "scan_duration": 60, "idle_duration": 15,
+         "country": "United Kingdom", "year": 2026}
+
+
+def post(path, body):
+    """Runs one POST request through the ASGI app, returning the response body."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    LOOP.run_until_complete(app({"type": "http", "method": "POST", "path": path, "query_string": b""}, receive, send))
+    return b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def test_api_scan_cached(benchmark):
+    body = json.dumps(STUDY).encode()
+    post("/scan", body)
+    benchmark(post, "/scan", body)
+
+
+def test_api_scans_1k(benchmark):
+    body = json.dumps([{**STUDY, "scan_duration": minutes} for minutes in range(1_000)]).encode()
+    post("/scans", body)
+    benchmark(post, "/scans", body)
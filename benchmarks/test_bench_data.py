@@ -0,0 +1,96 @@
+import pytest
+
+from utils.carbon_index import CarbonIndex, get_carbon_index, load_carbon_index
+from utils.datasets import (COUNTRY_CARBON_FILE, SCANNER_DATA_FILE, compiled_path, get_carbon_data,
+                            load_carbon_data, load_scanner_data, save_compiled)
+from utils.scanners import (ScannerCatalog, build_field_strength_table, get_scanner_catalog, get_scanner_records,
+                            read_scanner_records, scanner_powers)
+
+
+@pytest.fixture(scope="module")
+def compiled_files(tmp_path_factory):
+    """Copies of the data files with up-to-date compiled artifacts."""
+    directory = tmp_path_factory.mktemp("data")
+    files = {}
+    for name, source, loader in (("scanner", SCANNER_DATA_FILE, load_scanner_data),
+                                 ("carbon", COUNTRY_CARBON_FILE, load_carbon_data)):
+        copy = directory / source.name
+        copy.write_bytes(source.read_bytes())
+        save_compiled(loader(copy, use_compiled=False), compiled_path(copy), source_file=copy)
+        files[name] = copy
+    return files
+
+
+# Cold loads, bypassing the process-wide store
+
+def test_cold_load_carbon_csv(benchmark):
+    benchmark(load_carbon_data, COUNTRY_CARBON_FILE, use_compiled=False)
+
+
+def test_cold_load_carbon_compiled(benchmark, compiled_files):
+    benchmark(load_carbon_data, compiled_files["carbon"])
+
+
+def test_cold_load_scanner_csv(benchmark):
+    benchmark(load_scanner_data, SCANNER_DATA_FILE, use_compiled=False)
+
+
+def test_cold_load_scanner_compiled(benchmark, compiled_files):
+    benchmark(load_scanner_data, compiled_files["scanner"])
+
+
+def test_cold_load_carbon_index(benchmark):
+    benchmark(load_carbon_index, COUNTRY_CARBON_FILE)
+
+
+def test_cold_read_scanner_records(benchmark):
+    benchmark(read_scanner_records, SCANNER_DATA_FILE)
+
+
+def test_build_carbon_index_from_frame(benchmark):
+    benchmark(CarbonIndex.from_frame, get_carbon_data())
+
+
+def test_build_scanner_catalog(benchmark):
+    benchmark(ScannerCatalog, get_scanner_records())
+
+
+def test_build_field_strength_table(benchmark):
+    benchmark(build_field_strength_table, get_scanner_records())
+
+
+# Warm loads, served by the process-wide store
+
+def test_warm_load_carbon(benchmark):
+    get_carbon_data()
+    benchmark(get_carbon_data)
+
+
+def test_warm_carbon_index(benchmark):
+    get_carbon_index()
+    benchmark(get_carbon_index)
+
+
+def test_warm_scanner_catalog(benchmark):
+    get_scanner_catalog()
+    benchmark(get_scanner_catalog)
+
+
+# Lookups
+
+@pytest.mark.parametrize("year", [2020, 2035], ids=["exact_year", "nearest_year"])
+def test_carbon_lookup(benchmark, year):
+    index = get_carbon_index()
+    benchmark(index.lookup, "United Kingdom", year)
+
+
+def test_carbon_lookup_many_100k(benchmark, studies):
+    table = studies(100_000)
+    index = get_carbon_index()
+    benchmark(index.lookup_many, table["country"].to_numpy(), table["year"].to_numpy())
+
+
+@pytest.mark.parametrize("model", ["Siemens MAGNETOM Prisma", "Other"], ids=["known_model", "other_model"])
+def test_scanner_powers(benchmark, model):
+    scanner_powers(model, 3.0)
+    benchmark(scanner_powers, model, 3.0)
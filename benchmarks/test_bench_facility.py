@@ -0,0 +1,30 @@
+import pytest
+
+from utils.facility import parse_facilities, simulate_facilities, simulate_scanner
+
+CLINICAL = {"blocks": [{"days": "Mon-Fri", "start": "07:30", "end": "19:00"},
+                       {"days": "Sat", "start": "08:00", "end": "12:00"}],
+            "scan_duration": 45, "idle_duration": 15, "closed": ["2024-01-01", "2024-12-25"]}
+SCANNERS = [{"model": "Siemens MAGNETOM Sola", "schedule": "clinical", "count": 2},
+            {"model": "Siemens MAGNETOM Prisma", "schedule": "clinical"},
+            {"model": "Other", "field_strength": 7, "schedule": "clinical"}]
+
+
+@pytest.fixture(scope="module")
+def facilities():
+    """20 facilities of 4 scanners (1.5T, 3T and 7T), each with its own standby power."""
+    return parse_facilities({
+        "schedules": {"clinical": CLINICAL},
+        "facilities": [{"name": f"centre {i}", "country": "France", "year": 2024,
+                        "scanners": [{**scanner, "standby_power": 5 + i + j} for j, scanner in enumerate(SCANNERS)]}
+                       for i in range(20)],
+    })
+
+
+def test_simulate_scanner_minutes(benchmark, facilities):
+    scanner = facilities[0].scanners[0]
+    benchmark(simulate_scanner, scanner.powers, scanner.schedule, 2024, 1)
+
+
+def test_simulate_20_facilities_hourly(benchmark, facilities):
+    benchmark(simulate_facilities, facilities, "hour", jobs=1)
@@ -0,0 +1,76 @@
+import pytest
+
+from utils import metrics
+from utils.batch import compute_scans
+from utils.calculator import carbon_intensity_stage, compute_scan, get_statement, scanner_powers_stage
+from utils.statements import STYLES, render_statements
+from utils.sweep import SweepGrid
+from utils.uncertainty import compute_scan_uncertainty
+
+ARGS = ("MRI", "Siemens MAGNETOM Prisma", 3.0, 60, 15, "United Kingdom", 2026)
+
+
+def test_compute_scan_uncached(benchmark):
+    benchmark(compute_scan.__wrapped__, *ARGS)
+
+
+def test_compute_scan_cached(benchmark):
+    compute_scan(*ARGS)
+    benchmark(compute_scan, *ARGS)
+
+
+def test_compute_scan_cached_metrics_enabled(benchmark):
+    compute_scan(*ARGS)
+    metrics.enable()
+    try:
+        benchmark(compute_scan, *ARGS)
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+
+def test_compute_scan_other_uncached(benchmark):
+    benchmark(compute_scan.__wrapped__, "MRI", "Other", 7.0, 60, 15, "France", 2020)
+
+
+def test_get_statement_uncached(benchmark):
+    summary = compute_scan(*ARGS)
+    benchmark(get_statement.__wrapped__, summary)
+
+
+def test_get_statement_markdown_uncached(benchmark):
+    summary = compute_scan(*ARGS)
+    benchmark(get_statement.__wrapped__, summary, markdown=True)
+
+
+@pytest.mark.parametrize("n", [1_000, 100_000, 1_000_000])
+def test_compute_scans(benchmark, studies, n):
+    table = studies(n)
+    benchmark.extra_info["rows"] = n
+    benchmark.pedantic(compute_scans, args=(table,), rounds=3 if n >= 1_000_000 else 10, warmup_rounds=1)
+
+
+def test_carbon_intensity_stage_cached(benchmark):
+    carbon_intensity_stage("United Kingdom", 2026)
+    benchmark(carbon_intensity_stage, "United Kingdom", 2026)
+
+
+def test_scanner_powers_stage_cached(benchmark):
+    scanner_powers_stage("Other", 3.0)
+    benchmark(scanner_powers_stage, "Other", 3.0)
+
+
+def test_sweep_cube_7t(benchmark):
+    grid = SweepGrid(field_strengths=7.0, scan_durations=range(30, 91, 5))
+    benchmark.extra_info["points"] = grid.size
+    benchmark.pedantic(grid.cube, rounds=3, warmup_rounds=1)
+
+
+def test_compute_scan_uncertainty_100k(benchmark):
+    benchmark(compute_scan_uncertainty.__wrapped__, "MRI", "Other", 3.0, 60, 15, "United Kingdom", 2026)
+
+
+@pytest.mark.parametrize("style", STYLES)
+def test_render_statements_100k(benchmark, studies, style):
+    results = compute_scans(studies(100_000))
+    benchmark.pedantic(render_statements, args=(results, style), rounds=3, warmup_rounds=1)
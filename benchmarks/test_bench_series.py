@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.intensity_series import get_intensity_series, load_intensity_series
+
+HOURS = pd.date_range("2024-01-01", periods=8760, freq="h", tz="UTC")
+ZONES = 50
+
+
+@pytest.fixture(scope="module")
+def series_file(tmp_path_factory):
+    """One year of hourly intensities for 50 zones, already compiled."""
+    file_name = tmp_path_factory.mktemp("series") / "hourly.csv"
+    rng = np.random.default_rng(0)
+    pd.concat([
+        pd.DataFrame({"zone": f"zone_{i}", "timestamp": HOURS.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                      "intensity": rng.uniform(50, 500, len(HOURS))})
+        for i in range(ZONES)
+    ]).to_csv(file_name, index=False)
+    load_intensity_series(file_name)
+    return file_name
+
+
+def test_load_series_compiled(benchmark, series_file):
+    benchmark(load_intensity_series, series_file)
+
+
+def test_series_integrate_window(benchmark, series_file):
+    series = get_intensity_series(series_file)
+    start = HOURS[4000].timestamp() + 1800
+    benchmark(series.integrate, "zone_7", start, start + 5400)
+
+
+def test_series_integrate_100k_windows(benchmark, series_file):
+    series = get_intensity_series(series_file)
+    rng = np.random.default_rng(1)
+    starts = HOURS[0].timestamp() + rng.uniform(0, 8700 * 3600, 100_000)
+    benchmark(series.integrate, "zone_7", starts, starts + rng.uniform(0, 7200, 100_000))
@@ -0,0 +1,36 @@
+import pytest
+
+from utils.calculator import compute_scan, warm_up
+from utils.tenants import DatasetRegistry
+
+SCANNER_CSV = "Manufacturer,Model,Field strength,scan_mode,idle_mode\nAcme,Mega 3T,3,50,10\n"
+CARBON_CSV = "Entity,Year,Carbon intensity of electricity - gCO2/kWh\nFrance,2024,40\n"
+
+
+@pytest.fixture(scope="module")
+def registry(tmp_path_factory):
+    """One tenant overriding a scanner model and a carbon intensity."""
+    registry = DatasetRegistry(tmp_path_factory.mktemp("tenants"))
+    registry.upload("site", "scanner", SCANNER_CSV)
+    registry.upload("site", "carbon", CARBON_CSV)
+    return registry
+
+
+def test_tenant_activation(benchmark, registry):
+    # Indexes rebuilt from the base ones, as after an eviction
+    def activate():
+        registry._deactivate("site")
+        return registry.files("site")
+
+    benchmark(activate)
+
+
+def test_tenant_files_active(benchmark, registry):
+    registry.files("site")
+    benchmark(registry.files, "site")
+
+
+def test_tenant_compute_scan(benchmark, registry):
+    files = registry.files("site")
+    warm_up(*files)
+    benchmark(compute_scan.__wrapped__, "MRI", "Acme Mega 3T", 3.0, 60, 15, "France", 2024, *files)
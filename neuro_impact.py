@@ -0,0 +1,204 @@
+# Headless command-line front end of the calculator
+#
+# >>> python -m neuro_impact batch studies.csv -o results.parquet
+# >>> python -m neuro_impact sweep --field-strength 7 --scan-duration 30 60 90 -o sweep.csv
+# >>> python -m neuro_impact sessions scanner_log.csv -o sessions.csv --rollup rollup.csv
+# >>> python -m neuro_impact facility facilities.json -o facilities.csv --profile load.csv
+# >>> python -m neuro_impact validate --years 2015 2024
+# >>> python -m neuro_impact compile
+# >>> python -m neuro_impact --metrics metrics.prom sweep --field-strength 3 -o sweep.csv
+
+import argparse
+import sys
+import time
+
+from utils import metrics
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE, compile_datasets
+from utils.sessions import process_session_log
+from utils.statements import STYLES
+from utils.validation import validate_carbon_file, validate_scanner_file
+
+# batch, sweep and facility import NumPy and pandas when they run, so that the
+# pure-Python commands (sessions, validate) work without them
+RESOLUTIONS = ("minute", "hour")  # keys of utils.facility.RESOLUTIONS
+
+
+def batch(args):
+    from utils.batch import run_manifest
+
+    start = time.perf_counter()
+    n_rows, n_failed = run_manifest(args.manifest, args.output, chunksize=args.chunksize, jobs=args.jobs,
+                                    scannerData_filename=args.scanner_data,
+                                    countryCarbonIntensity_filename=args.carbon_data, statements=args.statements,
+                                    errors="raise" if args.strict else "report")
+    print(f"{n_rows} studies written to {args.output} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    if n_failed:
+        print(f"{n_failed} studies failed, see the error column", file=sys.stderr)
+
+
+def sweep(args):
+    from utils.batch import write_chunks
+    from utils.sweep import SweepGrid
+
+    start = time.perf_counter()
+    grid = SweepGrid(field_strengths=args.field_strength, models=args.model, scan_durations=args.scan_duration,
+                     idle_durations=args.idle_duration, sample_sizes=args.sample_size, countries=args.country,
+                     years=args.year, scannerData_filename=args.scanner_data,
+                     countryCarbonIntensity_filename=args.carbon_data)
+    n_rows = write_chunks(grid.iter_results(args.chunksize), args.output)
+    print(f"{n_rows} points written to {args.output} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+def sessions(args):
+    start = time.perf_counter()
+    rollup = process_session_log(args.log, args.output, args.rollup, scannerData_filename=args.scanner_data,
+                                 countryCarbonIntensity_filename=args.carbon_data,
+                                 intensitySeries_filename=args.intensity_series)
+    n_sessions = sum(totals[0] for totals in rollup.totals.values())
+    print(f"{n_sessions} sessions written to {args.output} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+def facility(args):
+    from utils.batch import write_chunks
+    from utils.facility import read_facilities, simulate_facilities
+
+    start = time.perf_counter()
+    facilities = read_facilities(args.definitions, args.scanner_data, args.carbon_data)
+    results = simulate_facilities(facilities, args.resolution, jobs=args.jobs)
+    write_chunks([results.facilities], args.output)
+    if args.scanners:
+        write_chunks([results.scanners], args.scanners)
+    if args.profile:
+        write_chunks([results.profiles], args.profile)
+    print(f"{len(facilities)} facilities written to {args.output} in {time.perf_counter() - start:.1f} s",
+          file=sys.stderr)
+
+
+def validate(args):
+    reports = [validate_scanner_file(args.scanner_data), validate_carbon_file(args.carbon_data, args.years)]
+    for report in reports:
+        status = f"{len(report.errors)} errors" if report.errors else "OK"
+        print(f"{report.file_name}: {report.rows} rows, {status}, {len(report.warnings)} warnings", file=sys.stderr)
+        for error in report.errors:
+            print(f"  error: {error}", file=sys.stderr)
+        for warning in report.warnings[:args.warnings]:
+            print(f"  warning: {warning}", file=sys.stderr)
+        if len(report.warnings) > args.warnings:
+            print(f"  ... and {len(report.warnings) - args.warnings} more warnings", file=sys.stderr)
+    n_errors = sum(len(report.errors) for report in reports)
+    if n_errors:
+        raise ValueError(f"{n_errors} errors in the data files")
+
+
+def compile_data(args):
+    for file_name in compile_datasets(args.scanner_data, args.carbon_data):
+        print(f"Wrote {file_name}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="neuro_impact", description="Neuro Impact Calculator")
+    parser.add_argument("--scanner-data", default=SCANNER_DATA_FILE, help="scanner power CSV file")
+    parser.add_argument("--carbon-data", default=COUNTRY_CARBON_FILE, help="carbon intensity CSV file")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record timings and counters, and write them to FILE in the Prometheus text format")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_batch = commands.add_parser(
+        "batch", help="compute emissions for a manifest of studies",
+        description="Reads a CSV or Parquet manifest with one study per row (model, field_strength, "
+                    "scan_duration, idle_duration, country, year) in chunks, and writes one result row "
+                    "per study to a CSV or Parquet file as it goes.")
+    parser_batch.add_argument("manifest", help="input .csv or .parquet file")
+    parser_batch.add_argument("-o", "--output", required=True, help="output .csv or .parquet file")
+    parser_batch.add_argument("--chunksize", type=int, default=100_000, help="rows per chunk (default: 100000)")
+    parser_batch.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser_batch.add_argument("--statements", nargs="+", choices=STYLES, default=(),
+                              help="add the statement of each study in these styles, and its transport equivalents")
+    parser_batch.add_argument("--strict", action="store_true",
+                              help="stop at the first study that fails, instead of writing its error in the "
+                                   "error column and going on")
+    parser_batch.set_defaults(func=batch)
+
+    parser_sweep = commands.add_parser(
+        "sweep", help="compute emissions over a grid of parameters",
+        description="Computes every combination of the values given (all field strengths, models, "
+                    "countries and available years by default) and writes one row per combination "
+                    "to a CSV or Parquet file.")
+    parser_sweep.add_argument("-o", "--output", required=True, help="output .csv or .parquet file")
+    parser_sweep.add_argument("--field-strength", type=float, nargs="+", help="field strengths in Tesla")
+    parser_sweep.add_argument("--model", nargs="+", help='full model names, or "Other"')
+    parser_sweep.add_argument("--scan-duration", type=float, nargs="+", default=[60], help="minutes per participant")
+    parser_sweep.add_argument("--idle-duration", type=float, nargs="+", default=[15], help="minutes per participant")
+    parser_sweep.add_argument("--sample-size", type=int, nargs="+", default=[1], help="numbers of participants")
+    parser_sweep.add_argument("--country", nargs="+", help="countries")
+    parser_sweep.add_argument("--year", type=int, nargs="+", help="years")
+    parser_sweep.add_argument("--chunksize", type=int, default=100_000, help="points per chunk (default: 100000)")
+    parser_sweep.set_defaults(func=sweep)
+
+    parser_sessions = commands.add_parser(
+        "sessions", help="compute emissions from scanner session logs",
+        description="Streams a session log (CSV or JSON lines with session, scanner, country, mode, start "
+                    "and end, and optionally field_strength) and writes the emissions of each session per "
+                    "day, and optionally the totals per scanner, month and country.")
+    parser_sessions.add_argument("log", help="input .csv, .jsonl or .ndjson log")
+    parser_sessions.add_argument("-o", "--output", required=True, help="output .csv file, one row per session and day")
+    parser_sessions.add_argument("--rollup", help="output .csv file with the totals per scanner, month and country")
+    parser_sessions.add_argument("--intensity-series",
+                                 help="CSV file with time-resolved carbon intensities (zone, timestamp, intensity) "
+                                      "used instead of the annual values")
+    parser_sessions.set_defaults(func=sessions)
+
+    parser_facility = commands.add_parser(
+        "facility", help="simulate a year of operation of imaging facilities",
+        description="Reads facility definitions (JSON, see utils/facility.py: scanners and their weekly "
+                    "schedules), simulates every minute of the year of each scanner, and writes the annual "
+                    "energy, emissions and peak load of each facility.")
+    parser_facility.add_argument("definitions", help="input .json file")
+    parser_facility.add_argument("-o", "--output", required=True,
+                                 help="output .csv or .parquet file, one row per facility")
+    parser_facility.add_argument("--scanners", help="output .csv or .parquet file, one row per scanner")
+    parser_facility.add_argument("--profile",
+                                 help="output .csv or .parquet file with the load of each facility over time")
+    parser_facility.add_argument("--resolution", choices=RESOLUTIONS, default="hour",
+                                 help="step of the load profiles and peaks (default: hour)")
+    parser_facility.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser_facility.set_defaults(func=facility)
+
+    parser_validate = commands.add_parser(
+        "validate", help="check the CSV data files",
+        description="Checks the columns, values (numbers, NaN, negative powers), duplicated models and country-years "
+                    "of the data files, and the years covered by each country, with a non-zero exit status on errors.")
+    parser_validate.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"),
+                                 help="years every country must cover (errors instead of warnings)")
+    parser_validate.add_argument("--warnings", type=int, default=20, metavar="N",
+                                 help="number of warnings shown per file (default: 20)")
+    parser_validate.set_defaults(func=validate)
+
+    parser_compile = commands.add_parser(
+        "compile", help="validate and compile the CSV data files into fast-loading .npz artifacts",
+        description="Validates the data files (see validate), then writes a typed, columnar .npz file next to each "
+                    "CSV data file. The apps load it instead of the CSV as long as the CSV is not modified "
+                    "afterwards, and validate the CSV as they load it otherwise. Nothing is written if a file "
+                    "has errors.")
+    parser_compile.set_defaults(func=compile_data)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    try:
+        args.func(args)
+        if args.metrics:
+            with open(args.metrics, "w") as f:
+                f.write(metrics.render_prometheus())
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
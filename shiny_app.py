@@ -2,9 +2,15 @@
 
 # Prerequisites
 from datetime import date
-from shiny import App, render, ui
-import pandas as pd
-from utils.consumptions import mri_consumption, cooling_consumption, computing_consumption, storage_consumption
+from urllib.parse import parse_qs
+from shiny import App, reactive, render, ui
+from utils.calculator import (carbon_intensity_stage, get_statement, get_uncertainty_statement, run_async,
+                              scan_summary, scanner_powers_stage, warm_up)
+from utils.consumptions import footprint_consumption
+from utils.metrics import timer
+from utils.carbon_index import get_carbon_index
+from utils.scanners import get_field_strength_table, get_scanner_catalog
+from utils.tenants import TENANTS_DIR, DatasetRegistry
 from pathlib import Path
 
 # Paths to data
@@ -12,169 +18,118 @@ countryCarbonIntensity_filename = "data/carbon-intensity.csv"
 scannerData_filename = "data/Scanner Power - Main.csv"
 here = Path(__file__).parent
 
+# Data of the sites (tenants, see utils/tenants.py), shared by every session
+registry = DatasetRegistry(TENANTS_DIR, scannerData_filename, countryCarbonIntensity_filename)
 
-def get_choices(file_name, category, filter_cat=None, filter_val=None, other = False):
-
-    if file_name == scannerData_filename and category == "model_full":
-        df_choices = load_scanner_data(scannerData_filename=scannerData_filename)
-    else:
-        df_choices = pd.read_csv(file_name)
-
-    if filter_cat is not None and filter_val is not None:
-        df_choices = df_choices[df_choices[filter_cat] == filter_val]
-
-    choice_list = df_choices[category].unique().tolist()
-    if other:
-        choice_list.append("Other")
-
-    return choice_list
-
-def load_scanner_data(scannerData_filename=scannerData_filename):
-    df_models = pd.read_csv(scannerData_filename)
-    df_models['model_full'] = df_models['Manufacturer'] + " " + df_models['Model']
-    df_models.sort_values(by = ['model_full'], inplace = True)
-
-    # Make sure field strength is a float
-    df_models['Field strength'] = df_models['Field strength'].astype(float)
-
-    return df_models
-
-def compute_percents(summary, transport_mode):
-    # TODO: implement
-    return 0
-
-def convert_g2kg(grams):
-    return grams / 1000.0
-
-def get_statement(summary):
-    if summary["year"] != summary["year_eff"]:
-        year_text = f"We don't have data for {summary['year']} yet, so the estimation provided is computed based on the closest year available ({summary['year_eff']}) for the country selected, {summary['country']}.\n"
-    else:
-        year_text = ""
-    
-    if summary["model"] == "Other":
-        model_text = f"The value provided below is computed as the median for {summary['field_strength']:.1f}T MRI models in our database.\n"
-    else:
-        model_text = f"You have selected the {summary['model']} model.\n"
-
-    text = year_text + model_text + (
-        f"For the current study, {summary['scan_power']:.2f} kWh was used for MRI scanning for a duration of active scanning of {summary['scan_duration']:.0f} minutes "
-        f"and an additional {summary['idle_power']:.2f} kWh for idle scanning for a duration of {summary['idle_duration']:.0f} minutes, "
-        f"and {summary['computing_energy']:.2f} kWh for data processing and analysis.\n"
-        f"In {summary['country']} in {summary['year_eff']}, with a carbon intensity value of {summary['carbon_intensity']:.2f} grams of carbon dioxide per kWh (gCO2/kWh), "
-        f"this amounted to {convert_g2kg(summary['carbon_emissions']):.2f} kilograms of carbon dioxide-equivalent emissions.\n"
-        f"This is equivalent to {compute_percents(summary, 'flight'):.2f}% of a return flight from London to Paris, "
-        f"{compute_percents(summary, 'car'):.2f}% miles driven in a passenger car."
-    )
-    return text
-
-def compute_scan(modality, model, field_strength, scan_duration, idle_duration, country, year, scannerData_filename=scannerData_filename, countryCarbonIntensity_filename=countryCarbonIntensity_filename):
-    
-    # Country specific data
-    df_carbon = pd.read_csv(countryCarbonIntensity_filename)
-
-    # If the year selected is not in the data we have for the selected country, take closest available year
-    if year not in df_carbon[df_carbon["Entity"] == country]["Year"].values:
-        available_years = sorted(df_carbon[df_carbon["Entity"] == country]["Year"].unique())
-        year_eff = available_years[-1] # (abs(available_years - year)).argmin()
-        available_years = df_carbon[df_carbon["Entity"] == country]["Year"].unique()
-        year_eff = available_years[(abs(available_years - year)).argmin()]
-    else:
-        year_eff = year
-
-    mask = (df_carbon["Entity"] == country) & (df_carbon["Year"] == year_eff)
-
-    if not mask.any():
-        raise ValueError(f"No carbon intensity data for {country} in {year_eff}") # TODO: We won't have such a case now
-    
-    else:
-        carbon_intensity = df_carbon.loc[mask, "Carbon intensity of electricity - gCO2/kWh"].iloc[0] # TODO: check that
-
-        # Scanner specific data
-        df_energy = load_scanner_data(scannerData_filename=scannerData_filename)
-
-        # MACHINE-RELATED CALCULATIONS
-        ##############################
-
-        # If the model is in our database
-        if model in df_energy["model_full"].values:
-            scan_power = df_energy.loc[df_energy["model_full"] == model, "scan_mode"].iloc[0]
-            idle_power = df_energy.loc[df_energy["model_full"] == model, "idle_mode"].iloc[0]
-        
-        # If not, use the average based on our database (by field strength)
-        elif model == "Other":
-            scan_mode_vals = df_energy.loc[df_energy["Field strength"] == field_strength, "scan_mode"].dropna()
-            if scan_mode_vals.empty:
-                raise ValueError(f"No scan_mode entries for field strength {field_strength}")
-            scan_power = scan_mode_vals.median() # More robust than the mean given observed data 
-
-            idle_mode_vals = df_energy.loc[df_energy["Field strength"] == field_strength, "idle_mode"].dropna()
-            if idle_mode_vals.empty:
-                raise ValueError(f"No idle_mode entries for field strength {field_strength}")
-            idle_power = idle_mode_vals.median() # More robust than the mean given observed data
-        
-        carbon_emissions = carbon_intensity * mri_consumption(idle_power, scan_power, scan_duration, idle_duration)
-
-        # COMPUTING-RELATED CALCULATIONS
-        ################################
-
-        computing_energy = computing_consumption(cpu_hours=2, ram_gb=32, gpu_hours=0, pue_hpc = 1.56)
-
-
-        # SUMMARY
-        #########
-
-        summary = {
-            "country": country,
-            "year": year,
-            "year_eff": year_eff,
-            "model": model,
-            "field_strength": field_strength,
-            "carbon_intensity": carbon_intensity,
-            "scan_duration": scan_duration,
-            "idle_duration": idle_duration,
-            "carbon_emissions": carbon_emissions,
-            "scan_power": scan_power,
-            "idle_power": idle_power,
-            "computing_energy": computing_energy
-        }
-
-        return summary
 
 def server(input, output, session):
+        # Data files of the site given as ?tenant=<name> in the URL, the shipped ones otherwise
+        @reactive.calc
+        async def data_files():
+            tenant = parse_qs(session.input[".clientdata_url_search"]().lstrip("?")).get("tenant", [None])[-1]
+            try:
+                return await run_async(registry.files, tenant)
+            except ValueError as e:
+                ui.notification_show(str(e), type="error", duration=None)
+                return registry.base
+
+        # Choices of the tenant's data, in place of those of the shipped files
+        @reactive.effect
+        async def data_choices():
+            files = await data_files()
+            if files == registry.base:
+                return
+            scanner_file, carbon_file = files
+            countries = (await run_async(get_carbon_index, carbon_file)).countries
+            field_strengths = list(await run_async(get_field_strength_table, scanner_file))
+            with reactive.isolate():
+                country = input.country.get()
+            ui.update_select("country", choices=countries, selected=country if country in countries else None)
+            ui.update_select("field_strength", choices=field_strengths)
+
+        # Async renderers: data (re)loading and calculations run in worker threads,
+        # so one session does not block the others served by this process
         @render.ui
-        def model_ui():
+        async def model_ui():
             field_strength = input.field_strength.get()
-            if field_strength is None or field_strength == "":
-                choices = get_choices(scannerData_filename, "model_full", other=True)
-            else:
-                choices = get_choices(scannerData_filename, "model_full", filter_cat="Field strength", filter_val=float(field_strength), other=True)
-            return ui.input_select("model", "Model", choices=choices)
+            with timer("choices"):
+                scanner_file, _ = await data_files()
+                catalog = await run_async(get_scanner_catalog, scanner_file)
+                if field_strength is None or field_strength == "":
+                    choices = catalog.models()
+                else:
+                    choices = catalog.models(float(field_strength))
+            return ui.input_select("model", "Model", choices=choices + ["Other"])
 
         @render.image
         def logo():
             img_path = Path(__file__).parent / "V34.svg"
             return {"src": str(img_path), "width": "300px"}
-        @render.text  
-        def consumption(scannerData_filename=scannerData_filename, 
-                        countryCarbonIntensity_filename=countryCarbonIntensity_filename,
-                        input=input):
-            modality = input.modality.get()
-            model = input.model.get()
-            field_strength = float(input.field_strength.get())
+        # One reactive calculation per stage of the footprint (see utils/calculator.py),
+        # so changing an input only re-runs the stages downstream of it
+        @reactive.calc
+        async def carbon_intensity():
+            _, carbon_file = await data_files()
+            return await run_async(carbon_intensity_stage, input.country.get(), input.year.get(), carbon_file)
+
+        @reactive.calc
+        async def scan_powers():
+            scanner_file, _ = await data_files()
+            return await run_async(scanner_powers_stage, input.model.get(), float(input.field_strength.get()),
+                                   scanner_file)
+
+        @reactive.calc
+        def durations():
             sample_size = float(input.sample_size.get())
-            scan_duration = float(input.scan_duration.get()) * sample_size
-            idle_duration = float(input.idle_duration.get()) * sample_size
-            country = input.country.get()
-            year = input.year.get()
+            return float(input.scan_duration.get()) * sample_size, float(input.idle_duration.get()) * sample_size
+
+        @reactive.calc
+        def parameters():
+            # Storage and computing parameters
+            return {name: float(getattr(input, name).get())
+                    for name in ("years_storage", "redundancy", "cpu_hours", "ram_gb", "gpu_hours", "pue_hpc")}
 
+        @reactive.calc
+        async def energy():
+            scan_power, idle_power = await scan_powers()
+            scan_duration, idle_duration = durations()
+            return footprint_consumption(idle_power, scan_power, scan_duration, idle_duration, **parameters())
+
+        @render.text  
+        async def consumption():
             try:
-                return get_statement(compute_scan(modality, model, field_strength, scan_duration, idle_duration, country, year, scannerData_filename=scannerData_filename, countryCarbonIntensity_filename=countryCarbonIntensity_filename))
+                with timer("render", output="consumption"):
+                    scan_duration, idle_duration = durations()
+                    summary = scan_summary(input.country.get(), input.year.get(), input.model.get(),
+                                           float(input.field_strength.get()), scan_duration, idle_duration,
+                                           await carbon_intensity(), await scan_powers(), await energy())
+                    return get_statement(summary)
+            except Exception as e:
+                return f"Error: {e}"
+
+        @render.text
+        async def uncertainty():
+            if not input.uncertainty.get():
+                return ""
+            # NumPy is only loaded once the uncertainty is requested
+            from utils.uncertainty import compute_scan_uncertainty
+            try:
+                with timer("render", output="uncertainty"):
+                    scan_duration, idle_duration = durations()
+                    scanner_file, carbon_file = await data_files()
+                    result = await run_async(compute_scan_uncertainty, input.modality.get(), input.model.get(),
+                                             float(input.field_strength.get()), scan_duration, idle_duration,
+                                             input.country.get(), input.year.get(), scanner_file, carbon_file,
+                                             **parameters())
+                    return get_uncertainty_statement(result)
             except Exception as e:
                 return f"Error: {e}"
 
 if __name__ == "__main__":
 
+    # Load the datasets once, before serving any session
+    warm_up(scannerData_filename, countryCarbonIntensity_filename)
+
     # User interface (UI) definition
     app_ui = ui.page_fluid(
         ui.panel_title(ui.h2("Neuro Impact Calculator", class_="pt-5")),
@@ -191,21 +146,29 @@ if __name__ == "__main__":
                 ui.input_numeric("idle_duration", "Duration of idle scanning (in minutes)", 15), 
                 ui.input_numeric("sample_size", "Sample size", 1), 
                 ui.input_select(
-                    "country", "Country", choices=get_choices("data/carbon-intensity.csv", "Entity")
+                    "country", "Country", choices=get_carbon_index(countryCarbonIntensity_filename).countries
                 ),
                 ui.input_numeric("year", "Year of the scanning", date.today().year-1, max=date.today().year, min=2000), 
                 ui.input_select(
                     "modality", "Modality", choices=["MRI"]
                 ),
                 ui.input_select(
-                    "field_strength", "Field strength", choices=get_choices(scannerData_filename, "Field strength")
+                    "field_strength", "Field strength", choices=list(get_field_strength_table(scannerData_filename))
                 ),
                 ui.output_ui("model_ui"),
+                ui.input_numeric("years_storage", "Years of data storage", 5, min=0),
+                ui.input_numeric("redundancy", "Storage redundancy (copies)", 3, min=1),
+                ui.input_numeric("cpu_hours", "CPU hours", 2, min=0),
+                ui.input_numeric("ram_gb", "RAM (GB)", 32, min=0),
+                ui.input_numeric("gpu_hours", "GPU hours", 0, min=0),
+                ui.input_numeric("pue_hpc", "Data center PUE", 1.56, min=1),
+                ui.input_checkbox("uncertainty", "Estimate uncertainty (Monte Carlo)", False),
             ),
 
             # Main panel (right) for output
             ui.card(
                 ui.output_text("consumption"),
+                ui.output_text("uncertainty"),
             ),
         )
     )
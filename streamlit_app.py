@@ -1,15 +1,13 @@
 import streamlit as st
-import pandas as pd
 from datetime import date
 from pathlib import Path
 
-# Try to import utils, handle error if user hasn't set up folders yet
-try:
-    from utils.consumptions import mri_consumption, computing_consumption
-except ImportError:
-    # Fallback mocks to prevent crash if utils folder is missing during testing
-    def mri_consumption(idle_p, scan_p, scan_d, idle_d): return (idle_p * idle_d + scan_p * scan_d) / 60
-    def computing_consumption(cpu_hours, ram_gb, gpu_hours, pue_hpc): return 0.5
+from utils.calculator import compute_scan, convert_g2kg, get_statement, get_uncertainty_statement
+from utils.consumptions import COMPONENTS
+from utils.metrics import timer
+from utils.carbon_index import get_carbon_index
+from utils.scanners import get_field_strength_table, get_scanner_catalog
+from utils.tenants import TENANTS_DIR, DatasetRegistry
 
 # --- Configuration & Paths ---
 st.set_page_config(page_title="Neuro Impact Calculator", layout="wide")
@@ -20,133 +18,48 @@ COUNTRY_CARBON_FILE = HERE / "data/carbon-intensity.csv"
 SCANNER_DATA_FILE = HERE / "data/Scanner Power - Main.csv"
 
 # --- Helper Functions (Cached) ---
+# Data comes from the shared indexes in utils, built once per process for every
+# session (no per-rerun copies as with st.cache_data) and reloaded on file change.
 
-@st.cache_data
 def load_scanner_data(filepath):
-    """Loads and processes scanner data."""
+    """Loads the scanner catalog and the per field strength table."""
     try:
-        df_models = pd.read_csv(filepath)
-        df_models['model_full'] = df_models['Manufacturer'] + " " + df_models['Model']
-        df_models.sort_values(by=['model_full'], inplace=True)
-        df_models['Field strength'] = df_models['Field strength'].astype(float)
-        return df_models
+        return get_scanner_catalog(filepath), get_field_strength_table(filepath)
     except FileNotFoundError:
         st.error(f"File not found: {filepath}")
-        return pd.DataFrame(columns=['model_full', 'Field strength', 'Manufacturer', 'Model'])
+        return None, {}
 
-@st.cache_data
 def load_carbon_data(filepath):
-    """Loads carbon intensity data."""
+    """Loads the carbon intensity index."""
     try:
-        return pd.read_csv(filepath)
+        return get_carbon_index(filepath)
     except FileNotFoundError:
         st.error(f"File not found: {filepath}")
-        return pd.DataFrame(columns=['Entity', 'Year'])
+        return None
 
-# --- Calculation Logic (Adapted from original) ---
+@st.cache_resource
+def get_registry():
+    """Data of the sites (tenants, see utils/tenants.py), shared by every session."""
+    return DatasetRegistry(TENANTS_DIR, SCANNER_DATA_FILE, COUNTRY_CARBON_FILE)
 
-def compute_percents(summary, transport_mode):
-    # TODO: implement based on original logic
-    return 0
-
-def convert_g2kg(grams):
-    return grams / 1000.0
-
-def get_statement(summary):
-    if summary["year"] != summary["year_eff"]:
-        year_text = f"We don't have data for {summary['year']} yet, so the estimation provided is computed based on the closest year available ({summary['year_eff']}) for the country selected, {summary['country']}.\n\n"
-    else:
-        year_text = ""
-    
-    if summary["model"] == "Other":
-        model_text = f"The value provided below is computed as the median for {summary['field_strength']:.1f}T MRI models in our database.\n\n"
-    else:
-        model_text = f"You have selected the **{summary['model']}** model.\n\n"
-
-    text = year_text + model_text + (
-        f"For the current study, **{summary['scan_power']:.2f} kW** was used for MRI scanning for a duration of active scanning of {summary['scan_duration']:.0f} minutes "
-        f"and an additional **{summary['idle_power']:.2f} kW** for idle scanning for a duration of {summary['idle_duration']:.0f} minutes, "
-        f"and **{summary['computing_energy']:.2f} kWh** for data processing and analysis.\n\n"
-        f"In {summary['country']} in {summary['year_eff']}, with a carbon intensity value of {summary['carbon_intensity']:.2f} grams of carbon dioxide per kWh (gCO2/kWh), "
-        f"this amounted to: \n\n"
-        f"### {convert_g2kg(summary['carbon_emissions']):.2f} kg CO2e\n\n"
-        f"_(kilograms of carbon dioxide-equivalent emissions)_.\n\n"
-        f"This is equivalent to {compute_percents(summary, 'flight'):.2f}% of a return flight from London to Paris, "
-        f"{compute_percents(summary, 'car'):.2f}% miles driven in a passenger car."
-    )
-    return text
-
-def compute_scan(modality, model, field_strength, scan_duration, idle_duration, country, year, df_carbon, df_energy):
-    
-    # 1. Year Logic
-    country_data = df_carbon[df_carbon["Entity"] == country]
-    
-    if country_data.empty:
-         raise ValueError(f"No data available for country: {country}")
-
-    if year not in country_data["Year"].values:
-        available_years = sorted(country_data["Year"].unique())
-        # Find closest year
-        year_eff = min(available_years, key=lambda x: abs(x - year))
-    else:
-        year_eff = year
-
-    mask = (df_carbon["Entity"] == country) & (df_carbon["Year"] == year_eff)
-    carbon_intensity = df_carbon.loc[mask, "Carbon intensity of electricity - gCO2/kWh"].iloc[0]
-
-    # 2. Machine Calculations
-    # If the model is in our database
-    if model in df_energy["model_full"].values:
-        scan_power = df_energy.loc[df_energy["model_full"] == model, "scan_mode"].iloc[0]
-        idle_power = df_energy.loc[df_energy["model_full"] == model, "idle_mode"].iloc[0]
-    
-    # If "Other" logic
-    elif model == "Other":
-        scan_mode_vals = df_energy.loc[df_energy["Field strength"] == field_strength, "scan_mode"].dropna()
-        if scan_mode_vals.empty:
-            # Fallback or error
-            scan_power = 0 
-        else:
-            scan_power = scan_mode_vals.median()
+def get_data_files():
+    """Data files of the site given as ?tenant=<name> in the URL, the shipped ones otherwise."""
+    registry = get_registry()
+    try:
+        return registry.files(st.query_params.get("tenant"))
+    except ValueError as e:
+        st.error(str(e))
+        return registry.base
 
-        idle_mode_vals = df_energy.loc[df_energy["Field strength"] == field_strength, "idle_mode"].dropna()
-        if idle_mode_vals.empty:
-            idle_power = 0
-        else:
-            idle_power = idle_mode_vals.median()
-    
-    else:
-        raise ValueError("Model not found in database")
-
-    # Calculate emissions
-    # Note: Assuming mri_consumption takes kW and minutes and returns kWh
-    carbon_emissions = carbon_intensity * mri_consumption(idle_power, scan_power, scan_duration, idle_duration)
-
-    # 3. Computing Calculations
-    computing_energy = computing_consumption(cpu_hours=2, ram_gb=32, gpu_hours=0, pue_hpc=1.56)
-
-    summary = {
-        "country": country,
-        "year": year,
-        "year_eff": year_eff,
-        "model": model,
-        "field_strength": field_strength,
-        "carbon_intensity": carbon_intensity,
-        "scan_duration": scan_duration,
-        "idle_duration": idle_duration,
-        "carbon_emissions": carbon_emissions,
-        "scan_power": scan_power,
-        "idle_power": idle_power,
-        "computing_energy": computing_energy
-    }
-    return summary
+# --- Calculation Logic: see utils/calculator.py ---
 
 # --- Main Application Layout ---
 
 def main():
     # Load Data
-    df_scanner = load_scanner_data(SCANNER_DATA_FILE)
-    df_carbon = load_carbon_data(COUNTRY_CARBON_FILE)
+    scanner_file, carbon_file = get_data_files()
+    scanner_catalog, field_strength_table = load_scanner_data(scanner_file)
+    carbon_index = load_carbon_data(carbon_file)
 
     # --- Sidebar (Inputs) ---
     with st.sidebar:
@@ -157,7 +70,7 @@ def main():
         sample_size = st.number_input("Sample size", value=1, min_value=1)
 
         # Country Selection
-        country_list = df_carbon["Entity"].unique().tolist() if not df_carbon.empty else []
+        country_list = carbon_index.countries if carbon_index is not None else []
         country = st.selectbox("Country", options=country_list)
 
         # Year Selection
@@ -170,24 +83,32 @@ def main():
         modality = st.selectbox("Modality", ["MRI"])
 
         # Field Strength
-        if not df_scanner.empty:
-            strength_choices = sorted(df_scanner["Field strength"].unique().tolist())
-        else:
-            strength_choices = []
+        strength_choices = list(field_strength_table)
             
         field_strength = st.selectbox("Field strength", options=strength_choices)
 
         # Dynamic Model Selection (Logic moved here)
         # We filter models based on the selected field strength immediately
-        if field_strength is not None and not df_scanner.empty:
-            filtered_models = df_scanner[df_scanner["Field strength"] == float(field_strength)]
-            model_choices = filtered_models["model_full"].unique().tolist()
+        if field_strength is not None and scanner_catalog is not None:
+            with timer("choices"):
+                model_choices = scanner_catalog.models(float(field_strength))
             model_choices.append("Other") # Add the "Other" option explicitly
             
             model = st.selectbox("Model", options=model_choices)
         else:
             model = st.selectbox("Model", options=["Other"])
 
+        # Storage and computing (defaults of compute_scan)
+        st.subheader("Data storage and processing")
+        years_storage = st.number_input("Years of data storage", value=5, min_value=0)
+        redundancy = st.number_input("Storage redundancy (copies)", value=3, min_value=1)
+        cpu_hours = st.number_input("CPU hours", value=2.0, min_value=0.0)
+        ram_gb = st.number_input("RAM (GB)", value=32.0, min_value=0.0)
+        gpu_hours = st.number_input("GPU hours", value=0.0, min_value=0.0)
+        pue_hpc = st.number_input("Data center PUE", value=1.56, min_value=1.0)
+
+        uncertainty = st.checkbox("Estimate uncertainty (Monte Carlo)")
+
     # --- Main Panel (Outputs) ---
     st.title("Neuro Impact Calculator")
     
@@ -212,15 +133,40 @@ def main():
                     idle_duration=idle_duration_total,
                     country=country,
                     year=year,
-                    df_carbon=df_carbon,
-                    df_energy=df_scanner
+                    scannerData_filename=scanner_file,
+                    countryCarbonIntensity_filename=carbon_file,
+                    years_storage=years_storage,
+                    redundancy=redundancy,
+                    cpu_hours=cpu_hours,
+                    ram_gb=ram_gb,
+                    gpu_hours=gpu_hours,
+                    pue_hpc=pue_hpc
                 )
                 
                 # Get formatted text
-                output_text = get_statement(result_summary)
+                output_text = get_statement(result_summary, markdown=True)
                 
                 # Display Result
                 st.markdown(output_text)
+
+                # Breakdown per component
+                st.table({
+                    "Component": [component.capitalize() for component in COMPONENTS],
+                    "Energy (kWh)": [round(result_summary[f"{component}_energy"], 2) for component in COMPONENTS],
+                    "Emissions (kg CO2e)": [round(convert_g2kg(result_summary[f"{component}_emissions"]), 2)
+                                            for component in COMPONENTS],
+                })
+
+                if uncertainty:
+                    # NumPy is only loaded once the uncertainty is requested
+                    from utils.uncertainty import compute_scan_uncertainty
+
+                    result_uncertainty = compute_scan_uncertainty(
+                        modality, model, float(field_strength), scan_duration_total, idle_duration_total, country,
+                        year, scanner_file, carbon_file, years_storage=years_storage,
+                        redundancy=redundancy, cpu_hours=cpu_hours, ram_gb=ram_gb, gpu_hours=gpu_hours,
+                        pue_hpc=pue_hpc)
+                    st.markdown(get_uncertainty_statement(result_uncertainty, markdown=True))
                 
             except Exception as e:
                 st.error(f"An error occurred during calculation: {e}")
@@ -228,4 +174,6 @@ def main():
             st.info("Please load data and select parameters to calculate.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # One run of the script per interaction
+    with timer("render"):
+        main()
\ No newline at end of file
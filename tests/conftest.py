@@ -0,0 +1,11 @@
+# Tests of the calculation core, run from the repository root with:
+#
+# >>> python -m pytest tests
+
+import sys
+from pathlib import Path
+
+# Make the repository root importable, as when running the apps from it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tests.studies import studies  # noqa: E402, F401
@@ -0,0 +1,51 @@
+# Synthetic studies shared by the tests and the benchmarks
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.carbon_index import get_carbon_index
+from utils.scanners import get_scanner_catalog
+
+
+def make_studies(n, seed=0):
+    """
+    Synthetic study table drawn from the shipped data files.
+
+    Models ("Other" included, at every field strength), countries, years (also
+    outside the available range, so the nearest-year path is exercised) and
+    the storage and computing parameters are sampled uniformly; durations are
+    whole minutes.
+    """
+    rng = np.random.default_rng(seed)
+    catalog = get_scanner_catalog()
+    models = np.array(list(catalog.records) + ["Other"] * 3, dtype=object)
+    field_strengths = np.array([record.field_strength for record in catalog.records.values()] + [1.5, 3.0, 7.0])
+    countries = np.array(get_carbon_index().countries, dtype=object)
+    picks = rng.integers(0, len(models), n)
+    return pd.DataFrame({
+        "model": models[picks],
+        "field_strength": field_strengths[picks],
+        "scan_duration": rng.integers(0, 600, n).astype(float),
+        "idle_duration": rng.integers(0, 120, n).astype(float),
+        "country": countries[rng.integers(0, len(countries), n)],
+        "year": rng.integers(1980, 2040, n),
+        "years_storage": rng.integers(0, 10, n),
+        "redundancy": rng.integers(1, 4, n),
+        "cpu_hours": rng.uniform(0, 100, n),
+        "ram_gb": rng.choice([8.0, 32.0, 128.0], n),
+        "gpu_hours": rng.uniform(0, 10, n),
+        "pue_hpc": rng.uniform(1, 2, n),
+    })
+
+
+@pytest.fixture(scope="session")
+def studies():
+    """Cached synthetic study tables by size, to be copied before being modified."""
+    tables = {}
+
+    def get(n):
+        if n not in tables:
+            tables[n] = make_studies(n)
+        return tables[n]
+    return get
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+from api_app import create_app
+from utils.cache import scan_cache
+from utils.calculator import compute_scan, get_statement
+from utils.tenants import DatasetRegistry
+
+STUDY = {"model": "Siemens MAGNETOM Prisma", "field_strength": 3.0, "scan_duration": 60, "idle_duration": 15,
+         "country": "France", "year": 2024}
+
+SCANNER_CSV = b"Manufacturer,Model,Field strength,scan_mode,idle_mode\nAcme,Mega 3T,3,50,10\n"
+
+
+def request(app, method, path, body=b"", headers=(), query=b"", parts=None):
+    """
+    Runs one request through an ASGI app, returning the status and the response body.
+
+    The body is sent in one message, or as the list of `parts` when given.
+    """
+    parts = [body] if parts is None else parts
+    messages = [{"type": "http.request", "body": part, "more_body": i < len(parts) - 1}
+                for i, part in enumerate(parts)][::-1]
+    sent = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query, "headers": list(headers)}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return DatasetRegistry(tmp_path / "tenants")
+
+
+def test_upload_needs_the_token(registry):
+    app = create_app(registry=registry, upload_token="secret")
+
+    for headers in ((), [(b"authorization", b"Bearer wrong")]):
+        status, _ = request(app, "PUT", "/tenants/site/scanner", SCANNER_CSV, headers)
+        assert status == 401
+    assert registry.tenants() == []
+
+    status, _ = request(app, "PUT", "/tenants/site/scanner", SCANNER_CSV, [(b"authorization", b"Bearer secret")])
+    assert status == 200
+    assert registry.tenants() == ["site"]
+
+
+def test_upload_refused_without_token(registry):
+    app = create_app(registry=registry)
+    status, body = request(app, "PUT", "/tenants/site/scanner", SCANNER_CSV,
+                           [(b"authorization", b"Bearer anything")])
+    assert status == 403
+    assert "disabled" in json.loads(body)["error"]
+    assert registry.tenants() == []
+
+
+def test_scans_match_compute_scan():
+    studies = [STUDY, {**STUDY, "model": "Other", "year": 2040, "cpu_hours": 10}, {**STUDY, "country": "Atlantis"},
+               {**STUDY, "scan_duration": "nan"}, {**STUDY, "idle_duration": "inf"}, ["not", "a", "study"]]
+    entries = len(scan_cache)
+    status, body = request(create_app(), "POST", "/scans", json.dumps(studies).encode(), query=b"statement=true")
+    assert status == 200
+    results = json.loads(body)
+
+    for study, result in zip(studies[:2], results):
+        expected = compute_scan.__wrapped__("MRI", **study)
+        assert result == pytest.approx({**expected, "statement": get_statement(expected)})
+    assert [result.get("error") for result in results[2:]] == [
+        "No data available for country: Atlantis", "Invalid value for field scan_duration: 'nan'",
+        "Invalid value for field idle_duration: 'inf'", "A study must be a JSON object"]
+    # Batches do not go through the result cache of compute_scan
+    assert len(scan_cache) == entries
+
+
+@pytest.mark.parametrize("value", ["nan", "-inf"])
+def test_scan_rejects_non_finite_values(value):
+    status, body = request(create_app(), "POST", "/scan", json.dumps({**STUDY, "year": 2020, "ram_gb": value}).encode())
+    assert status == 400
+    assert json.loads(body)["error"] == f"Invalid value for field ram_gb: {value!r}"
+
+
+def test_scans_stream():
+    lines = [json.dumps({**STUDY, "scan_duration": minutes}).encode() for minutes in range(10, 110, 10)]
+    body = b"\n".join(lines[:5] + [b"{not json"] + lines[5:]) + b"\n"
+    # Split in the middle of lines, as a client streaming the body would
+    status, response = request(create_app(), "POST", "/scans/stream", parts=[body[:100], body[100:333], body[333:]])
+    assert status == 200
+
+    results = [json.loads(line) for line in response.splitlines()]
+    assert len(results) == 11
+    assert results[5]["error"].startswith("Invalid JSON")
+    assert [result["scan_duration"] for result in results[:5] + results[6:]] == list(range(10, 110, 10))
+
+
+@pytest.mark.parametrize("year, error", [
+    (1e30, "Year out of range (1900-2200): 1e+30"),
+    (1800, "Year out of range (1900-2200): 1800"),
+    (2020.5, "Invalid value for field year: 2020.5"),
+    (True, "Invalid value for field year: True"),
+])
+def test_invalid_years(year, error):
+    app = create_app()
+    body = json.dumps({**STUDY, "year": year}).encode()
+    status, response = request(app, "POST", "/scan", body)
+    assert (status, json.loads(response)) == (400, {"error": error})
+    status, response = request(app, "POST", "/scans", b"[" + body + b"]")
+    assert (status, json.loads(response)) == (200, [{"error": error}])
+    status, response = request(app, "POST", "/scans/stream", body)
+    assert (status, json.loads(response)) == (200, {"error": error})
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from utils.batch import SUMMARY_COLUMNS, compute_scans, run_manifest
+from utils.calculator import compute_scan
+
+
+def test_compute_scans_matches_compute_scan(studies):
+    studies = studies(3_000)
+    results = compute_scans(studies)
+    assert list(results.columns) == SUMMARY_COLUMNS
+    assert results.index.equals(studies.index)
+
+    for study, result in zip(studies.to_dict("records"), results.to_dict("records")):
+        expected = compute_scan.__wrapped__("MRI", **study)
+        for column in SUMMARY_COLUMNS:
+            if isinstance(expected[column], str):
+                assert result[column] == expected[column], column
+            else:
+                assert result[column] == pytest.approx(expected[column], rel=1e-12), column
+
+
+def test_compute_scans_keeps_the_index(studies):
+    studies = studies(10).set_axis(list("abcdefghij"))
+    assert compute_scans(studies).index.equals(studies.index)
+
+
+@pytest.mark.parametrize("column, value, message", [
+    ("model", "Acme Nonexistent", "Model not found in database: Acme Nonexistent"),
+    ("country", "Atlantis", "No data available for country: Atlantis"),
+])
+def test_compute_scans_unknown_values(studies, column, value, message):
+    studies = studies(5).copy()
+    studies.loc[3, column] = value
+    with pytest.raises(ValueError, match=message):
+        compute_scans(studies)
+
+
+def test_compute_scans_other_with_unknown_field_strength(studies):
+    studies = studies(5).copy()
+    studies.loc[2, ["model", "field_strength"]] = ["Other", 9.4]
+    with pytest.raises(ValueError, match="No scan_mode entries for field strength 9.4"):
+        compute_scans(studies)
+
+
+def test_compute_scans_missing_columns(studies):
+    with pytest.raises(ValueError, match="Missing study columns: country"):
+        compute_scans(studies(5).drop(columns="country"))
+
+
+def test_compute_scans_reports_errors(studies):
+    studies = studies(20).copy()
+    studies.loc[3, "country"] = "Atlantis"
+    studies.loc[5, "model"] = "Acme Nonexistent"
+    studies.loc[7, ["model", "field_strength"]] = ["Other", 9.4]
+    studies.loc[9, "year"] = None
+
+    results = compute_scans(studies, errors="report")
+    assert results["error"].fillna("").tolist()[3:10] == [
+        "No data available for country: Atlantis", "", "Model not found in database: Acme Nonexistent", "",
+        "No scan_mode entries for field strength 9.4", "", "Invalid value for field year: nan"]
+    failed = results["error"].notna().to_numpy()
+    assert results.loc[failed, "total_emissions"].isna().all()
+
+    valid = compute_scans(studies[~failed])
+    pd.testing.assert_frame_equal(results[~failed][SUMMARY_COLUMNS], valid, check_dtype=False)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_run_manifest_reports_failed_rows(studies, tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    manifest = studies(50).copy()
+    manifest.loc[[10, 40], "country"] = "Atlantis"
+    manifest.to_csv(tmp_path / "manifest.csv", index=False)
+
+    output = tmp_path / f"results{suffix}"
+    assert run_manifest(tmp_path / "manifest.csv", output, chunksize=20, jobs=1, statements=("text",)) == (50, 2)
+
+    results = pd.read_csv(output) if suffix == ".csv" else pd.read_parquet(output)
+    assert len(results) == 50
+    assert results["error"].notna().tolist() == [row in (10, 40) for row in range(50)]
+    assert results.loc[10, "error"] == "No data available for country: Atlantis"
+    assert results["statement_text"].isna().sum() + (results["statement_text"] == "").sum() == 2
+    assert results["total_emissions"].notna().sum() == 48
+
+
+def test_run_manifest_strict(studies, tmp_path):
+    manifest = studies(10).copy()
+    manifest.loc[4, "country"] = "Atlantis"
+    manifest.to_csv(tmp_path / "manifest.csv", index=False)
+    with pytest.raises(ValueError, match="Atlantis"):
+        run_manifest(tmp_path / "manifest.csv", tmp_path / "results.csv", jobs=1, errors="raise")
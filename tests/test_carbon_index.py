@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from utils.carbon_index import CarbonIndex, get_carbon_index
+
+YEARS = range(1980, 2040)
+
+
+def nearest_year(years, year, prefer_later):
+    """Brute-force closest year, ties going to the later (Shiny) or earlier (Streamlit) year."""
+    return min(years, key=lambda available: (abs(available - year), -available if prefer_later else available))
+
+
+@pytest.mark.parametrize("prefer_later", [True, False])
+def test_lookup_brute_force(prefer_later):
+    index = get_carbon_index()
+    for country in index.countries:
+        years, intensities = index.country_data(country)
+        for year in YEARS:
+            year_eff = nearest_year(years, year, prefer_later)
+            assert index.lookup(country, year, prefer_later) == (year_eff, intensities[years.index(year_eff)])
+
+
+@pytest.mark.parametrize("prefer_later", [True, False])
+def test_lookup_many_matches_lookup(prefer_later):
+    index = get_carbon_index()
+    countries = np.repeat(np.array(index.countries, dtype=object), len(YEARS))
+    years = np.tile(np.array(YEARS), len(index.countries))
+
+    year_eff, intensity = index.lookup_many(countries, years, prefer_later)
+    expected = [index.lookup(country, year, prefer_later) for country, year in zip(countries, years)]
+    assert year_eff.tolist() == [year for year, _ in expected]
+    assert intensity.tolist() == [value for _, value in expected]
+
+
+def test_ties():
+    index = CarbonIndex([("A", 2000, 1.0), ("A", 2010, 2.0), ("B", 2020, 3.0)])
+    assert index.lookup("A", 2005) == (2010, 2.0)
+    assert index.lookup("A", 2005, prefer_later=False) == (2000, 1.0)
+    assert index.lookup("A", 2004) == (2000, 1.0)
+    assert index.lookup("B", 1900) == (2020, 3.0)
+
+
+def test_unknown_country():
+    index = get_carbon_index()
+    with pytest.raises(ValueError, match="No data available for country: Atlantis"):
+        index.lookup("Atlantis", 2020)
+    with pytest.raises(ValueError, match="No data available for country: Atlantis"):
+        index.lookup_many(["France", "Atlantis"], [2020, 2020])
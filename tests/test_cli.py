@@ -0,0 +1,45 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Runs the command line with NumPy and pandas made unimportable
+WITHOUT_NUMPY = ("import sys; sys.modules.update(numpy=None, pandas=None); "
+                 "from neuro_impact import main; sys.exit(main(sys.argv[1:]))")
+
+LOG = """session,scanner,country,mode,start,end
+s1,Siemens MAGNETOM Prisma,France,scan,2024-03-01T09:00:00,2024-03-01T09:40:00
+s1,Siemens MAGNETOM Prisma,France,idle,2024-03-01T09:40:00,2024-03-01T09:55:00
+"""
+
+
+def run_without_numpy(*args):
+    return subprocess.run([sys.executable, "-c", WITHOUT_NUMPY, *args], cwd=ROOT, capture_output=True, text=True)
+
+
+@pytest.mark.parametrize("args", [("validate",), ("sessions", "{log}", "-o", "{output}")])
+def test_pure_python_commands_without_numpy(tmp_path, args):
+    log = tmp_path / "log.csv"
+    log.write_text(LOG)
+    output = tmp_path / "sessions.csv"
+    result = run_without_numpy(*(arg.format(log=log, output=output) for arg in args))
+    assert result.returncode == 0, result.stderr
+    if "sessions" in args:
+        assert len(output.read_text().splitlines()) == 2
+
+
+def test_numpy_commands_need_numpy(tmp_path):
+    result = run_without_numpy("sweep", "--field-strength", "3", "-o", str(tmp_path / "sweep.csv"))
+    assert result.returncode == 1
+    assert "numpy" in result.stderr
+
+
+def test_sessions_log_without_mode(tmp_path):
+    log = tmp_path / "log.csv"
+    log.write_text("\n".join(",".join(line.split(",")[:3] + line.split(",")[4:]) for line in LOG.splitlines()))
+    result = run_without_numpy("sessions", str(log), "-o", str(tmp_path / "sessions.csv"))
+    assert result.returncode == 1
+    assert "Error: Record 1 has no mode field" in result.stderr
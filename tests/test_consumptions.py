@@ -0,0 +1,38 @@
+import pytest
+
+from utils.calculator import compute_scan
+from utils.consumptions import COMPONENTS, cooling_consumption, footprint_consumption, mri_consumption
+
+
+def test_cooling_is_proportional_to_scanner_energy():
+    assert cooling_consumption(2 * 25.0) == pytest.approx(2 * cooling_consumption(25.0))
+    assert cooling_consumption(25.0) == pytest.approx(0.95 * 25.0 / 2.75)
+
+
+def test_cooling_below_scanner_energy():
+    energy = footprint_consumption(8.0, 25.0)
+    assert energy["cooling"] < energy["scanner"] == mri_consumption(8.0, 25.0)
+
+
+@pytest.mark.parametrize("sample_size", [2, 10, 100])
+def test_total_scales_linearly_with_sample_size(sample_size):
+    # The apps multiply the durations by the sample size, while the CPU hours
+    # entered are already the total of the sample. A sample whose processing
+    # also grows with its size gives n times the footprint of one study.
+    def study(n):
+        return compute_scan("MRI", "Other", 3.0, 60 * n, 15 * n, "France", 2022, cpu_hours=2 * n)
+
+    one, many = study(1), study(sample_size)
+    for component in COMPONENTS:
+        assert many[f"{component}_energy"] == pytest.approx(sample_size * one[f"{component}_energy"])
+    assert many["total_energy"] == pytest.approx(sample_size * one["total_energy"])
+    assert many["total_emissions"] == pytest.approx(sample_size * one["total_emissions"])
+
+
+def test_apps_computing_does_not_scale_with_sample_size():
+    # What the apps compute: only the durations are multiplied by the sample size
+    one = compute_scan("MRI", "Other", 3.0, 60, 15, "France", 2022)
+    many = compute_scan("MRI", "Other", 3.0, 60 * 10, 15 * 10, "France", 2022)
+    assert many["computing_energy"] == one["computing_energy"]
+    for component in ("scanner", "cooling", "storage"):
+        assert many[f"{component}_energy"] == pytest.approx(10 * one[f"{component}_energy"])
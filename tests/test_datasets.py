@@ -0,0 +1,80 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils.carbon_index import INTENSITY_COLUMN, load_carbon_index
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE, compile_datasets, compiled_path
+from utils.scanners import read_scanner_records
+
+
+@pytest.fixture
+def data_files(tmp_path):
+    """Copies of the shipped data files, without artifacts."""
+    copies = []
+    for source in (SCANNER_DATA_FILE, COUNTRY_CARBON_FILE):
+        copy = tmp_path / source.name
+        copy.write_bytes(source.read_bytes())
+        copies.append(copy)
+    return copies
+
+
+def append_row(file_name, row):
+    """Appends a row (column -> text) to a CSV file, with its other columns empty."""
+    with open(file_name, newline="") as f:
+        header = next(csv.reader(f))
+    with open(file_name, "r+", newline="") as f:
+        if not f.read().endswith("\n"):
+            f.write("\n")
+        csv.DictWriter(f, header, restval="").writerow(row)
+
+
+def test_indexes_from_artifact_match_csv(data_files):
+    scanner_file, carbon_file = data_files
+    index_csv, records_csv = load_carbon_index(carbon_file), read_scanner_records(scanner_file)
+
+    compile_datasets(scanner_file, carbon_file)
+    index, records = load_carbon_index(carbon_file), read_scanner_records(scanner_file)
+
+    assert index.countries == index_csv.countries
+    for country in index.countries:
+        assert index.country_data(country) == index_csv.country_data(country)
+    assert sorted(records) == sorted(records_csv)
+
+
+def test_stale_artifact_is_ignored(data_files):
+    scanner_file, carbon_file = data_files
+    compile_datasets(scanner_file, carbon_file)
+    append_row(carbon_file, {"Entity": "Atlantis", "Year": "2020", INTENSITY_COLUMN: "123.0"})
+    stat = os.stat(carbon_file)
+    os.utime(carbon_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert compiled_path(carbon_file).exists()
+    assert load_carbon_index(carbon_file).lookup("Atlantis", 2020) == (2020, 123.0)
+
+
+def test_csv_without_artifact_is_validated(data_files):
+    scanner_file, carbon_file = data_files
+    compile_datasets(scanner_file, carbon_file)
+    append_row(carbon_file, {"Entity": "Atlantis", "Year": "2020", INTENSITY_COLUMN: "not a number"})
+
+    with pytest.raises(ValueError, match="is not a number"):
+        load_carbon_index(carbon_file)
+
+    append_row(scanner_file, {"Manufacturer": "Acme", "Model": "Mega 3T", "Field strength": "3", "scan_mode": "N/A",
+                              "idle_mode": "10"})
+    compiled_path(scanner_file).unlink()
+    with pytest.raises(ValueError, match="scan_mode is not a number"):
+        read_scanner_records(scanner_file)
+
+
+def test_scan_without_artifact_does_not_import_numpy(data_files):
+    scanner_file, carbon_file = data_files
+    code = ("import sys; from utils.calculator import compute_scan; "
+            f"compute_scan('MRI', 'Other', 3.0, 60, 15, 'France', 2024, {str(scanner_file)!r}, {str(carbon_file)!r}); "
+            "print('numpy' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,99 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from utils.facility import (IDLE, MINUTES_PER_DAY, SCAN, STANDBY, Block, days_in_year, parse_facilities,
+                            parse_schedule, simulate_facilities, simulate_scanner, weekly_modes, year_modes)
+
+CLINICAL = {"blocks": [{"days": "Mon-Fri", "start": "07:30", "end": "19:00"}, {"days": "Sat", "end": "12:00"}],
+            "scan_duration": 45, "idle_duration": 15, "closed": ["2024-12-25"]}
+
+
+def facilities(**scanner):
+    return {"schedules": {"clinical": CLINICAL},
+            "facilities": [{"name": "Centre A", "country": "France", "year": 2024, "scanners": [
+                {"model": "Siemens MAGNETOM Prisma", "schedule": "clinical", "count": 2},
+                {"model": "Other", "field_strength": 1.5, "schedule": {"blocks": [{"days": "Fri-Mon"}]}},
+                {"model": "GE SIGNA Voyager", "schedule": "clinical", **scanner}]}]}
+
+
+@pytest.mark.parametrize("year", [2023, 2024])
+def test_mode_minutes_cover_the_year(year):
+    minutes, scanner_kwh, cooling_kwh = simulate_scanner((1.0, 20.0, 10.0), parse_schedule(CLINICAL), year)
+    assert minutes.sum() == days_in_year(year) * MINUTES_PER_DAY
+    assert len(scanner_kwh) == len(cooling_kwh) == days_in_year(year) * 24
+    assert scanner_kwh.sum() == pytest.approx((minutes * [1.0, 20.0, 10.0]).sum() / 60)
+
+
+def test_studies_of_a_block():
+    modes = weekly_modes(parse_schedule(CLINICAL))
+    monday = modes[0]
+    assert (monday[:450] == STANDBY).all() and (monday[19 * 60:] == STANDBY).all()
+    assert (monday[450:495] == SCAN).all() and (monday[495:510] == IDLE).all() and monday[510] == SCAN
+    assert (modes[6] == STANDBY).all()
+
+
+def test_closed_days_in_standby():
+    schedule = parse_schedule(CLINICAL)
+    modes = year_modes(schedule, 2024)
+    christmas, day_before = (date(2024, 12, 25) - date(2024, 1, 1)).days, (date(2024, 12, 24) - date(2024, 1, 1)).days
+    assert (modes[christmas] == STANDBY).all()
+    assert (modes[day_before] == weekly_modes(schedule)[date(2024, 12, 24).weekday()]).all()
+    # A closed day of another year does not change this one
+    assert (year_modes(schedule._replace(closed=frozenset({date(2023, 12, 25)})), 2024)[christmas] == SCAN).any()
+
+
+@pytest.mark.parametrize("days, expected", [("Fri-Mon", {4, 5, 6, 0}), ("Mon-Fri,Sun", {0, 1, 2, 3, 4, 6}),
+                                            (["sat", "Tuesday"], {5, 1}), ("Sun-Sun", {6})])
+def test_days(days, expected):
+    schedule = parse_schedule({"blocks": [{"days": days, "start": "08:00", "end": "09:00"}]})
+    assert schedule.blocks == (Block(frozenset(expected), 480, 540),)
+    assert set(np.flatnonzero((weekly_modes(schedule) != STANDBY).any(axis=1))) == expected
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"blocks": [{"days": "Mon-Fry"}]}, "Invalid days"),
+    ({"blocks": [{"start": "7h30"}]}, "Invalid time"),
+    ({"blocks": [{"end": "25:00"}]}, "Invalid time"),
+    ({"blocks": [{"start": "22:00", "end": "02:00"}]}, "Block ending before it starts"),
+    ({"blocks": [], "hours": 8}, "Unknown field in schedule: hours"),
+    ({"blocks": [], "scan_duration": 0}, "scan_duration must be over 0"),
+    ({"blocks": [], "closed": ["25/12/2024"]}, "Invalid isoformat"),
+])
+def test_schedule_errors(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_schedule(spec)
+
+
+@pytest.mark.parametrize("scanner, message", [
+    ({"count": 0}, "count must be a whole number over 0: 0"),
+    ({"count": -2}, "count must be a whole number over 0: -2"),
+    ({"count": 1.5}, "count must be a whole number over 0: 1.5"),
+    ({"count": True}, "count must be a whole number over 0: True"),
+    ({"schedule": "night"}, "Unknown schedule: night"),
+    ({"model": "Acme Mega"}, "Facility Centre A: "),
+    ({"colour": "blue"}, "Unknown field in scanner: colour"),
+])
+def test_facility_errors(scanner, message):
+    with pytest.raises(ValueError, match=message):
+        parse_facilities(facilities(**scanner))
+
+
+def test_facility_totals_are_the_sum_of_its_scanners():
+    results = simulate_facilities(parse_facilities(facilities(count=3)), jobs=1)
+    scanners, facility = results.scanners, results.facilities.iloc[0]
+
+    assert facility["scanners"] == scanners["count"].sum() == 6
+    for column in ("scan_hours", "idle_hours", "standby_hours", "scanner_energy", "cooling_energy", "total_energy",
+                   "total_emissions"):
+        assert facility[column] == pytest.approx(scanners[column].sum())
+    assert (scanners[["scan_hours", "idle_hours", "standby_hours"]].sum(axis=1)
+            == scanners["count"] * days_in_year(2024) * 24).all()
+    assert (scanners["total_energy"] > 0).all()
+
+    # The hourly profile averages to the annual energy
+    profile = results.profiles
+    assert len(profile) == days_in_year(2024) * 24
+    assert profile["load_kw"].sum() == pytest.approx(facility["total_energy"])
+    assert profile["load_kw"].max() == pytest.approx(facility["peak_kw"])
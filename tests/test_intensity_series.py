@@ -0,0 +1,35 @@
+import os
+
+from utils.intensity_series import compile_intensity_series, load_intensity_series, series_path
+
+
+def write_series(file_name, intensity):
+    file_name.write_text("zone,timestamp,intensity\n"
+                         f"FR,2024-01-01T00:00:00Z,{intensity}\n"
+                         f"FR,2024-01-01T01:00:00Z,{intensity}\n")
+
+
+def test_recompile_keeps_mapped_arrays(tmp_path):
+    file_name = tmp_path / "hourly.csv"
+    write_series(file_name, 50)
+    series = load_intensity_series(file_name)
+    start, end = series.time_range("FR")
+
+    write_series(file_name, 80)
+    stat = os.stat(file_name)
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    reloaded = load_intensity_series(file_name)
+
+    # The arrays mapped before are untouched, the new ones have the new values
+    assert series.integrate("FR", start, end) == 100
+    assert reloaded.integrate("FR", start, end) == 160
+    # No temporary or previous directory left behind
+    assert sorted(path.name for path in tmp_path.iterdir()) == [file_name.name, series_path(file_name).name]
+
+
+def test_compile_twice(tmp_path):
+    file_name = tmp_path / "hourly.csv"
+    write_series(file_name, 50)
+    compile_intensity_series(file_name)
+    compile_intensity_series(file_name)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["hourly.csv", "hourly.series"]
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from utils.sessions import parse_segments, process_session_log, split_days
+
+RECORD = {"session": "s1", "scanner": "Siemens MAGNETOM Prisma", "country": "France", "mode": "scan",
+          "start": "2023-12-31T23:00:00", "end": "2024-01-01T00:00:00"}
+
+
+def test_segment_ending_at_midnight_stays_on_its_day():
+    segments = list(split_days(parse_segments([RECORD])))
+    assert [(segment.start, segment.end) for segment in segments] == [
+        (datetime(2023, 12, 31, 23), datetime(2024, 1, 1))]
+
+
+def test_segment_spanning_midnight_is_split():
+    segments = list(split_days(parse_segments([{**RECORD, "end": "2024-01-02T00:30:00"}])))
+    assert [(segment.start, segment.end) for segment in segments] == [
+        (datetime(2023, 12, 31, 23), datetime(2024, 1, 1)),
+        (datetime(2024, 1, 1), datetime(2024, 1, 2)),
+        (datetime(2024, 1, 2), datetime(2024, 1, 2, 0, 30))]
+
+
+def test_session_log_ending_at_midnight(tmp_path):
+    log = tmp_path / "log.csv"
+    log.write_text("session,scanner,country,mode,start,end\n"
+                   + ",".join(RECORD[name] for name in ("session", "scanner", "country", "mode", "start", "end")))
+    rollup = process_session_log(log, tmp_path / "sessions.csv")
+    assert len((tmp_path / "sessions.csv").read_text().splitlines()) == 2
+    # One month, not a 2024-01 entry without sessions
+    assert [totals[0] for totals in rollup.totals.values()] == [1]
+
+
+@pytest.mark.parametrize("field", ["session", "scanner", "country", "mode", "start", "end"])
+def test_missing_field(field):
+    records = [RECORD, {name: value for name, value in RECORD.items() if name != field}]
+    with pytest.raises(ValueError, match=f"Record 2 has no {field} field"):
+        list(parse_segments(records))
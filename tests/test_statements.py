@@ -0,0 +1,42 @@
+import pytest
+
+from utils.batch import compute_scans
+from utils.calculator import compute_scan, get_statement
+from utils.statements import STYLES, render_statement, render_statements
+
+
+@pytest.fixture(scope="module")
+def studies(studies):
+    return studies(500)
+
+
+@pytest.fixture(scope="module")
+def summaries(studies):
+    return [compute_scan.__wrapped__("MRI", **study) for study in studies.to_dict("records")]
+
+
+@pytest.mark.parametrize("style", STYLES)
+def test_render_statements_matches_single_rendering(studies, summaries, style):
+    statements = render_statements(compute_scans(studies), style)
+    assert statements.index.equals(studies.index)
+    assert statements.tolist() == [render_statement(summary, style) for summary in summaries]
+
+
+@pytest.mark.parametrize("markdown, style", [(False, "text"), (True, "markdown")])
+def test_get_statement_styles(summaries, markdown, style):
+    for summary in summaries[:50]:
+        assert get_statement(summary, markdown=markdown) == render_statement(summary, style)
+
+
+def test_html_escapes_text_fields(studies):
+    results = compute_scans(studies.head(20))
+    results["country"] = "Trinidad & <Tobago>"
+    results["model"] = results["model"].where(results["model"] == "Other", 'Acme "Mega" <3T> & co')
+
+    statements = render_statements(results, "html")
+    for (_, row), statement in zip(results.iterrows(), statements):
+        assert statement == render_statement(row.to_dict(), "html")
+        assert "Trinidad &amp; &lt;Tobago&gt;" in statement
+        assert "<Tobago>" not in statement and "<3T>" not in statement
+        if row["model"] != "Other":
+            assert "Acme &quot;Mega&quot; &lt;3T&gt; &amp; co" in statement
@@ -0,0 +1,92 @@
+import pytest
+
+from utils import datasets
+from utils.carbon_index import get_carbon_index, load_carbon_index
+from utils.scanners import (ScannerCatalog, build_field_strength_table, get_field_strength_table,
+                            get_scanner_catalog, get_scanner_records, read_scanner_records)
+from utils.tenants import DatasetRegistry
+
+# A replaced and a new model (with a new field strength)
+SCANNER_CSV = ("Manufacturer,Model,Field strength,scan_mode,idle_mode\n"
+               "Siemens,MAGNETOM Prisma,3,30,12\n"
+               "Acme,Ultra 11T,11.7,80,20\n")
+# A replaced year, a new year and a new country
+CARBON_CSV = ("Entity,Year,Carbon intensity of electricity - gCO2/kWh\n"
+              "France,2020,40\n"
+              "France,2035,20\n"
+              "Atlantis,2024,300\n")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return DatasetRegistry(tmp_path / "tenants")
+
+
+def assert_same_carbon_index(index, expected):
+    assert index.countries == expected.countries
+    for country in expected.countries:
+        assert index.country_data(country) == expected.country_data(country)
+
+
+def assert_same_scanner_indexes(scanner_file):
+    # What the loaders build from the effective file
+    records = read_scanner_records(scanner_file)
+    assert sorted(get_scanner_records(scanner_file)) == sorted(records)
+    catalog, expected = get_scanner_catalog(scanner_file), ScannerCatalog(records)
+    assert catalog.records == expected.records
+    assert catalog.models_by_field_strength == expected.models_by_field_strength
+    assert get_field_strength_table(scanner_file) == build_field_strength_table(records)
+
+
+def test_overlaid_indexes_match_loaders(registry):
+    registry.upload("site", "scanner", SCANNER_CSV)
+    scanner_file, carbon_file = registry.upload("site", "carbon", CARBON_CSV)
+
+    assert scanner_file != registry.base.scannerData_filename
+    assert_same_scanner_indexes(scanner_file)
+    assert_same_carbon_index(get_carbon_index(carbon_file), load_carbon_index(carbon_file))
+
+    assert get_scanner_catalog(scanner_file).records["Siemens MAGNETOM Prisma"].scan_mode == 30
+    assert get_carbon_index(carbon_file).lookup("France", 2020) == (2020, 40)
+    assert get_carbon_index(carbon_file).lookup("Atlantis", 2000) == (2024, 300)
+
+
+def test_overlaid_indexes_match_loaders_after_eviction(tmp_path):
+    registry = DatasetRegistry(tmp_path / "tenants", max_active=1)
+    registry.upload("site", "scanner", SCANNER_CSV)
+    scanner_file, carbon_file = registry.upload("site", "carbon", CARBON_CSV)
+    registry.upload("other", "carbon", CARBON_CSV)
+    assert registry.active() == ["other"]
+    assert not datasets.is_stored(scanner_file) and not datasets.is_stored(carbon_file)
+
+    assert registry.files("site") == (scanner_file, carbon_file)
+    assert datasets.is_stored(scanner_file) and datasets.is_stored(carbon_file)
+    assert_same_scanner_indexes(scanner_file)
+    assert_same_carbon_index(get_carbon_index(carbon_file), load_carbon_index(carbon_file))
+
+
+def test_least_recently_used_tenants_are_evicted(tmp_path):
+    registry = DatasetRegistry(tmp_path / "tenants", max_active=2)
+    files = {tenant: registry.upload(tenant, "carbon", CARBON_CSV).countryCarbonIntensity_filename
+             for tenant in ("a", "b", "c")}
+
+    assert registry.active() == ["b", "c"]
+    assert not datasets.is_stored(files["a"]) and datasets.is_stored(files["b"]) and datasets.is_stored(files["c"])
+
+    registry.files("b")
+    registry.files("a")
+    assert registry.active() == ["b", "a"]
+    assert datasets.is_stored(files["a"]) and not datasets.is_stored(files["c"])
+    assert get_carbon_index(files["a"]).lookup("Atlantis", 2024) == (2024, 300)
+
+
+def test_evicted_files_are_reloaded(registry):
+    carbon_file = registry.upload("site", "carbon", CARBON_CSV).countryCarbonIntensity_filename
+    index = get_carbon_index(carbon_file)
+    datasets.evict(carbon_file)
+    assert not datasets.is_stored(carbon_file)
+
+    # Loaded from the effective file, with the same data as the overlaid index
+    reloaded = get_carbon_index(carbon_file)
+    assert reloaded is not index and datasets.is_stored(carbon_file)
+    assert_same_carbon_index(reloaded, index)
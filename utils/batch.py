@@ -0,0 +1,384 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.carbon_index import get_carbon_index
+from utils.consumptions import COMPONENTS, footprint_consumption
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.metrics import timed
+from utils.scanners import POWER_COLUMNS, get_field_strength_table, get_scanner_catalog
+from utils.statements import EQUIVALENT_COLUMNS, STYLES, statement_report
+
+# Input columns, named after the compute_scan arguments ("modality" is optional)
+STUDY_COLUMNS = ["model", "field_strength", "scan_duration", "idle_duration", "country", "year"]
+
+# Optional input columns, the storage and computing parameters of compute_scan, with their defaults
+PARAMETER_COLUMNS = {"years_storage": 5, "redundancy": 3, "cpu_hours": 2, "ram_gb": 32, "gpu_hours": 0, "pue_hpc": 1.56}
+
+# Output columns, named after the compute_scan summary keys
+SUMMARY_COLUMNS = [
+    "country", "year", "year_eff", "model", "field_strength", "carbon_intensity",
+    "scan_duration", "idle_duration", "carbon_emissions", "scan_power", "idle_power",
+    *(f"{component}_{quantity}" for component in COMPONENTS for quantity in ("energy", "emissions")),
+    "total_energy", "total_emissions",
+]
+
+
+def resolve_scanner_powers(models, field_strengths, scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Scan and idle power (kW) of many studies at once.
+
+    Models found in the scanner data use their own values; "Other" uses the
+    median of the models with the same field strength, as in compute_scan.
+
+    Args:
+      models (array-like of str): Full model names ("Manufacturer Model") or "Other".
+      field_strengths (array-like of float): Field strengths in Tesla.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+
+    Returns:
+      tuple: (scan_power, idle_power) NumPy arrays.
+    """
+    models = pd.Index(np.asarray(models, dtype=object))
+    field_strengths = np.asarray(field_strengths, dtype=np.float64)
+
+    # Known models: hash join on the catalog records
+    records = get_scanner_catalog(scannerData_filename).records
+    rows = pd.Index(list(records)).get_indexer(models)
+    is_known = rows >= 0
+
+    # Unmatched rows (-1) pick the NaN appended at the end
+    scan_power = np.array([record.scan_mode for record in records.values()] + [np.nan])[rows]
+    idle_power = np.array([record.idle_mode for record in records.values()] + [np.nan])[rows]
+
+    is_other = ~is_known & (models == "Other")
+    unknown = ~is_known & ~is_other
+    if unknown.any():
+        raise ValueError(f"Model not found in database: {models[unknown][0]}")
+
+    if is_other.any():
+        # Medians precomputed per field strength, more robust than the mean given observed data
+        table = get_field_strength_table(scannerData_filename)
+        rows = pd.Index(list(table)).get_indexer(field_strengths[is_other])
+        for column, power in (("scan_mode", scan_power), ("idle_mode", idle_power)):
+            stats = [getattr(field_strength_stats, column) for field_strength_stats in table.values()]
+            values = np.array([stat.median if stat.count else np.nan for stat in stats] + [np.nan])[rows]
+            missing = np.isnan(values)
+            if missing.any():
+                raise ValueError(f"No {column} entries for field strength {field_strengths[is_other][missing][0]}")
+            power[is_other] = values
+
+    return scan_power, idle_power
+
+
+def study_errors(studies, scannerData_filename=SCANNER_DATA_FILE,
+                 countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """
+    Error of each study that compute_scans cannot compute.
+
+    Checks, in this order, that the numeric values are numbers, that the
+    country is in the carbon data, and that the model is in the scanner data
+    (or is "Other" with a field strength having models).
+
+    Args:
+      studies (pandas.DataFrame): As for compute_scans.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+
+    Returns:
+      numpy.ndarray: The first error message of each study, None for valid studies.
+    """
+    messages = np.full(len(studies), None, dtype=object)
+
+    def report(invalid, message, *columns):
+        # Only the first error of a study is kept
+        rows = np.flatnonzero(invalid & pd.isna(messages))
+        values = [studies[column].to_numpy()[rows].tolist() for column in columns]
+        messages[rows] = [message.format(*row) for row in zip(*values)]
+
+    numeric = ["field_strength", "scan_duration", "idle_duration", "year",
+               *(name for name in PARAMETER_COLUMNS if name in studies.columns)]
+    for column in numeric:
+        values = pd.to_numeric(studies[column], errors="coerce").to_numpy(dtype=np.float64)
+        report(~np.isfinite(values), f"Invalid value for field {column}: {{!r}}", column)
+
+    countries = get_carbon_index(countryCarbonIntensity_filename).countries
+    report(~studies["country"].isin(countries).to_numpy(), "No data available for country: {}", "country")
+
+    models = studies["model"]
+    is_other = (models == "Other").to_numpy()
+    report(~models.isin(list(get_scanner_catalog(scannerData_filename).records)).to_numpy() & ~is_other,
+           "Model not found in database: {}", "model")
+    table = get_field_strength_table(scannerData_filename)
+    field_strengths = pd.to_numeric(studies["field_strength"], errors="coerce")
+    for column in POWER_COLUMNS:
+        covered = [field_strength for field_strength, stats in table.items() if getattr(stats, column).count]
+        report(is_other & ~field_strengths.isin(covered).to_numpy(),
+               f"No {column} entries for field strength {{}}", "field_strength")
+    return messages
+
+
+@timed("compute_scans")
+def compute_scans(studies, scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE,
+                  errors="raise"):
+    """
+    Batch version of compute_scan for a table of studies.
+
+    Intensities and scanner powers are resolved with index joins, and the
+    consumptions are evaluated as array expressions over all rows at once.
+
+    Args:
+      studies (pandas.DataFrame): One study per row, with the STUDY_COLUMNS
+        columns (durations in minutes) and optionally any of the
+        PARAMETER_COLUMNS (defaults otherwise).
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      errors (str, optional): "raise" (default) to raise the error of the
+        first study that fails, or "report" to compute the others and add an
+        "error" column (see study_errors), missing for the valid studies. The
+        computed columns of the studies that failed are missing (NaN, and NA
+        in year_eff, a nullable integer column in this mode).
+
+    Returns:
+      pandas.DataFrame: One row per study with the SUMMARY_COLUMNS columns
+        (and "error" when reporting errors), matching what compute_scan
+        returns, on the index of `studies`.
+    """
+    if errors not in ("raise", "report"):
+        raise ValueError(f"Unknown errors mode: {errors}")
+    missing = [column for column in STUDY_COLUMNS if column not in studies.columns]
+    if missing:
+        raise ValueError(f"Missing study columns: {', '.join(missing)}")
+    if errors == "report":
+        return _compute_valid_scans(studies, scannerData_filename, countryCarbonIntensity_filename)
+
+    field_strength = studies["field_strength"].to_numpy(dtype=np.float64)
+    scan_duration = studies["scan_duration"].to_numpy(dtype=np.float64)
+    idle_duration = studies["idle_duration"].to_numpy(dtype=np.float64)
+
+    # Country specific data, closest available year
+    year_eff, carbon_intensity = get_carbon_index(countryCarbonIntensity_filename).lookup_many(
+        studies["country"].to_numpy(), studies["year"].to_numpy())
+
+    # Scanner specific data
+    scan_power, idle_power = resolve_scanner_powers(studies["model"].to_numpy(), field_strength, scannerData_filename)
+
+    # All the components in one pass of array expressions
+    parameters = {
+        name: studies[name].to_numpy(dtype=np.float64) if name in studies.columns else default
+        for name, default in PARAMETER_COLUMNS.items()
+    }
+    energy = footprint_consumption(idle_power, scan_power, scan_duration, idle_duration, **parameters)
+
+    summary = {
+        "country": studies["country"].to_numpy(),
+        "year": studies["year"].to_numpy(),
+        "year_eff": year_eff,
+        "model": studies["model"].to_numpy(),
+        "field_strength": field_strength,
+        "carbon_intensity": carbon_intensity,
+        "scan_duration": scan_duration,
+        "idle_duration": idle_duration,
+        "carbon_emissions": carbon_intensity * energy["scanner"],
+        "scan_power": scan_power,
+        "idle_power": idle_power,
+    }
+    for component in COMPONENTS:
+        # Components not depending on any per-study value are plain numbers
+        summary[f"{component}_energy"] = np.broadcast_to(energy[component], len(studies))
+        summary[f"{component}_emissions"] = carbon_intensity * energy[component]
+    summary["total_energy"] = sum(energy[component] for component in COMPONENTS)
+    summary["total_emissions"] = carbon_intensity * summary["total_energy"]
+
+    return pd.DataFrame(summary, index=studies.index)
+
+
+def _compute_valid_scans(studies, scannerData_filename, countryCarbonIntensity_filename):
+    # compute_scans of the valid studies, the others only getting their error
+    messages = study_errors(studies, scannerData_filename, countryCarbonIntensity_filename)
+    valid = pd.isna(messages)
+    results = compute_scans(studies[valid], scannerData_filename, countryCarbonIntensity_filename)
+
+    summary = {}
+    for column in SUMMARY_COLUMNS:
+        if column in STUDY_COLUMNS:
+            summary[column] = studies[column].to_numpy()
+        else:
+            values = np.full(len(studies), np.nan)
+            values[valid] = results[column].to_numpy(dtype=np.float64)
+            # Integer columns (year_eff) as nullable integers
+            summary[column] = pd.array(values, dtype="Int64") if results[column].dtype.kind == "i" else values
+    summary["error"] = pd.array(messages, dtype="string")
+    return pd.DataFrame(summary, index=studies.index)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading or writing Parquet files requires pyarrow (pip install pyarrow)") from None
+    return pa, pq
+
+
+def read_chunks(file_name, chunksize=100_000):
+    """
+    Reads a study manifest (CSV or Parquet) as a stream of DataFrames.
+
+    Args:
+      file_name (str or Path): Manifest file; ".parquet" files need pyarrow.
+      chunksize (int, optional): Rows per chunk. Defaults to 100,000.
+
+    Yields:
+      pandas.DataFrame: Consecutive chunks of the manifest.
+    """
+    if Path(file_name).suffix == ".parquet":
+        pa, pq = _import_pyarrow()
+        for record_batch in pq.ParquetFile(file_name).iter_batches(batch_size=chunksize):
+            yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_name, chunksize=chunksize)
+
+
+def write_chunks(chunks, file_name):
+    """
+    Writes a stream of DataFrames to one CSV or Parquet file, chunk by chunk.
+
+    Args:
+      chunks (iterable of pandas.DataFrame): Frames sharing the same columns.
+      file_name (str or Path): Output file; ".parquet" files need pyarrow.
+
+    Returns:
+      int: Number of rows written.
+    """
+    n_rows = 0
+    if Path(file_name).suffix == ".parquet":
+        pa, pq = _import_pyarrow()
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(file_name, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                n_rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(file_name, "w", newline="") as f:
+            for chunk in chunks:
+                chunk.to_csv(f, header=n_rows == 0, index=False)
+                n_rows += len(chunk)
+    return n_rows
+
+
+def map_chunks(func, chunks, jobs=None):
+    """
+    Applies `func` to every chunk, in order, with up to `jobs` processes.
+
+    At most two chunks per process are in flight at a time, so memory stays
+    flat however long the stream is.
+
+    Args:
+      func (callable): Picklable function of one DataFrame.
+      chunks (iterable of pandas.DataFrame): Input chunks.
+      jobs (int, optional): Number of worker processes. Defaults to the CPU count.
+
+    Yields:
+      The results of `func`, in the order of `chunks`.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        yield from map(func, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _compute_report(compute, styles, chunk):
+    results = compute(chunk)
+    if "error" not in results.columns:
+        return statement_report(results, styles)
+
+    # Statements and equivalents of the valid studies only, empty for the others
+    valid = results["error"].isna().to_numpy()
+    computed = statement_report(results[valid], styles)
+    report = results.copy()
+    for column in computed.columns[len(results.columns):]:
+        values = computed[column].to_numpy()
+        report[column] = np.full(len(results), "" if values.dtype == object else np.nan, dtype=values.dtype)
+        report.loc[valid, column] = values
+    return report
+
+
+def _render_csv(compute, chunk):
+    results = compute(chunk)
+    failed = int(results["error"].notna().sum()) if "error" in results.columns else 0
+    return len(results), failed, results.to_csv(header=False, index=False)
+
+
+def run_manifest(input_file, output_file, chunksize=100_000, jobs=None,
+                 scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE,
+                 statements=(), errors="report"):
+    """
+    Streams a study manifest through compute_scans into a results file.
+
+    Args:
+      input_file (str or Path): CSV or Parquet manifest with the STUDY_COLUMNS columns.
+      output_file (str or Path): CSV or Parquet file receiving the SUMMARY_COLUMNS columns.
+      chunksize (int, optional): Rows per chunk. Defaults to 100,000.
+      jobs (int, optional): Number of worker processes. Defaults to the CPU count.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      statements (tuple of str, optional): Statement styles (see utils.statements)
+        to add as "statement_<style>" columns, with the EQUIVALENT_COLUMNS. None by default.
+      errors (str, optional): "report" (default) to write the studies that
+        fail with an "error" column and NaN results, so one bad row does not
+        stop the run, or "raise" to stop at the first one (see compute_scans).
+
+    Returns:
+      tuple: (number of studies processed, number of studies that failed).
+    """
+    unknown = [style for style in statements if style not in STYLES]
+    if unknown:
+        raise ValueError(f"Unknown statement style: {unknown[0]}")
+    compute = partial(compute_scans, scannerData_filename=scannerData_filename,
+                      countryCarbonIntensity_filename=countryCarbonIntensity_filename, errors=errors)
+    columns = SUMMARY_COLUMNS + (["error"] if errors == "report" else [])
+    if statements:
+        compute = partial(_compute_report, compute, tuple(statements))
+        columns = columns + EQUIVALENT_COLUMNS + [f"statement_{style}" for style in statements]
+    chunks = read_chunks(input_file, chunksize)
+    n_failed = 0
+    if Path(output_file).suffix == ".parquet":
+        def counted(results):
+            nonlocal n_failed
+            for chunk in results:
+                if "error" in chunk.columns:
+                    n_failed += int(chunk["error"].notna().sum())
+                yield chunk
+
+        return write_chunks(counted(map_chunks(compute, chunks, jobs)), output_file), n_failed
+
+    # Formatting floats as text costs more than computing them, so CSV is rendered in the workers too
+    n_rows = 0
+    with open(output_file, "w", newline="") as f:
+        f.write(",".join(columns) + "\n")
+        for n, failed, text in map_chunks(partial(_render_csv, compute), chunks, jobs):
+            f.write(text)
+            n_rows += n
+            n_failed += failed
+    return n_rows, n_failed
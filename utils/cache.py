@@ -0,0 +1,158 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from utils import metrics
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+
+_MISSING = object()
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+    maxsize: int
+    ttl: Optional[float]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache:
+    """
+    Thread-safe, bounded least-recently-used cache with an optional time to live.
+
+    Args:
+      maxsize (int, optional): Maximum number of entries. Defaults to 4096.
+      ttl (float, optional): Seconds after which an entry expires. Defaults to None (never).
+    """
+
+    def __init__(self, maxsize=4096, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expiry time, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, self.expirations,
+                              len(self._entries), self.maxsize, self.ttl)
+
+
+def memoize(cache, key):
+    """
+    Decorator caching the results of a function in `cache`.
+
+    The cache key is `key` called with the function's arguments (defaults
+    applied, passed by name), so equivalent calls share one entry. Cached
+    values are shared between callers and must be treated as read-only.
+    Exceptions are not cached.
+
+    Args:
+      cache (LRUCache): Cache receiving the results.
+      key (callable): Builds a hashable, normalized key from the arguments.
+    """
+    def decorator(func):
+        # Plain dict merging, inspect.Signature.bind costs more than most cached calls
+        parameters = inspect.signature(func).parameters
+        names = list(parameters)
+        defaults = {name: p.default for name, p in parameters.items() if p.default is not p.empty}
+        qualname = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = dict(defaults)
+            arguments.update(zip(names, args))
+            arguments.update(kwargs)
+            cache_key = (qualname, key(**arguments))
+
+            value = cache.get(cache_key, _MISSING)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                cache.put(cache_key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def data_version(*file_names):
+    """Modification times of data files, so cache keys change with the data."""
+    return tuple(os.stat(file_name).st_mtime_ns for file_name in file_names)
+
+
+def scan_key(modality, model, field_strength, scan_duration, idle_duration, country, year,
+             scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, **parameters):
+    """Normalized cache key of a compute_scan call; `parameters` are its storage and computing parameters."""
+    return (str(modality), str(model), float(field_strength), float(scan_duration), float(idle_duration),
+            str(country), float(year), tuple(sorted((name, float(value)) for name, value in parameters.items())),
+            data_version(scannerData_filename, countryCarbonIntensity_filename))
+
+
+def uncertainty_key(draws=100_000, seed=0, year_window=2, percentiles=(2.5, 50, 97.5), **arguments):
+    """Normalized cache key of a compute_scan_uncertainty call (the seed must be an integer)."""
+    return scan_key(**arguments), int(draws), int(seed), int(year_window), tuple(float(p) for p in percentiles)
+
+
+def carbon_intensity_key(country, year, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, **_):
+    """Normalized cache key of a carbon_intensity_stage call."""
+    return str(country), float(year), data_version(countryCarbonIntensity_filename)
+
+
+def scanner_powers_key(model, field_strength, scannerData_filename=SCANNER_DATA_FILE, **_):
+    """Normalized cache key of a scanner_powers_stage call."""
+    return str(model), float(field_strength), data_version(scannerData_filename)
+
+
+def statement_key(summary, **options):
+    """Cache key of a get_statement call."""
+    return tuple(summary.items()), tuple(sorted(options.items()))
+
+
+# Shared by the Shiny and Streamlit front ends
+scan_cache = LRUCache(maxsize=4096)
+stage_cache = LRUCache(maxsize=4096)
+statement_cache = LRUCache(maxsize=4096)
+for _name, _cache in (("scan", scan_cache), ("stage", stage_cache), ("statement", statement_cache)):
+    metrics.register_cache(_name, _cache)
@@ -0,0 +1,291 @@
+# Calculation core shared by the Shiny and Streamlit apps and the command line.
+#
+# Importing this module and computing single scans only needs the standard
+# library: data comes from the pure-Python indexes in utils.carbon_index and
+# utils.scanners (built from the compiled .npz artifacts of the data files with
+# NumPy when they are up to date, from the CSVs with the csv module otherwise).
+# NumPy and pandas are imported on first use of the batch API
+# (compute_scans and friends, from utils.batch), and asyncio on first use of
+# the async API.
+
+import functools
+import os
+import threading
+
+from utils.cache import (carbon_intensity_key, memoize, scan_cache, scan_key, scanner_powers_key, stage_cache,
+                         statement_cache, statement_key)
+from utils.carbon_index import get_carbon_index
+from utils.consumptions import COMPONENTS, footprint_consumption
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.metrics import timed
+from utils.scanners import get_field_strength_table, get_scanner_catalog, scanner_powers
+from utils.statements import compute_percents, convert_g2kg, render_statement  # the first two are part of this API
+
+# NumPy-based APIs, loaded from their module on first access
+_LAZY_NAMES = {
+    "compute_scans": "utils.batch",
+    "run_manifest": "utils.batch",
+    "STUDY_COLUMNS": "utils.batch",
+    "SUMMARY_COLUMNS": "utils.batch",
+    "compute_scan_uncertainty": "utils.uncertainty",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up(scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """Builds the indexes used by compute_scan, e.g. at application startup."""
+    get_carbon_index(countryCarbonIntensity_filename)
+    get_scanner_catalog(scannerData_filename)
+    get_field_strength_table(scannerData_filename)
+
+
+# Worker threads of the async API, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Shared thread pool running the calculations of the async API."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 2),
+                                           thread_name_prefix="calculator")
+        return _executor
+
+
+async def run_async(func, *args, executor=None, **kwargs):
+    """
+    Runs func(*args, **kwargs) in a worker, without blocking the event loop.
+
+    Args:
+      func (callable): Function to run. Must be picklable with its arguments
+        when `executor` is a process pool.
+      executor (concurrent.futures.Executor, optional): Pool to run it in.
+        Defaults to the shared thread pool of get_executor().
+
+    Returns:
+      The result of func.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def warm_up_async(scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """warm_up in a worker thread."""
+    await run_async(warm_up, scannerData_filename, countryCarbonIntensity_filename)
+
+
+async def compute_scan_async(*args, **kwargs):
+    """
+    compute_scan in a worker thread, for async servers: (re)loading the data
+    files on a cache miss does not block the other sessions. Takes the same
+    arguments as compute_scan.
+    """
+    return await run_async(compute_scan, *args, **kwargs)
+
+
+async def compute_scans_async(studies, scannerData_filename=SCANNER_DATA_FILE,
+                              countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, executor=None):
+    """
+    compute_scans in a worker, for async servers.
+
+    Args:
+      studies (pandas.DataFrame): One study per row, see compute_scans.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      executor (concurrent.futures.Executor, optional): Defaults to the shared
+        thread pool; a ProcessPoolExecutor keeps very large tables from holding
+        the GIL of the server process.
+
+    Returns:
+      pandas.DataFrame: One row per study, see compute_scans.
+    """
+    from utils.batch import compute_scans
+    return await run_async(compute_scans, studies, scannerData_filename, countryCarbonIntensity_filename,
+                           executor=executor)
+
+
+@memoize(statement_cache, statement_key)
+@timed("get_statement")
+def get_statement(summary, markdown=False):
+    """
+    Environmental impact statement of a compute_scan summary.
+
+    Args:
+      summary (dict): Result of compute_scan.
+      markdown (bool, optional): Markdown with emphasis (Streamlit) instead of
+        plain text (Shiny). Defaults to False. Other styles, and statements of
+        whole results frames, are rendered by utils.statements.
+
+    Returns:
+      str: The statement.
+    """
+    return render_statement(summary, "markdown" if markdown else "text")
+
+
+def get_uncertainty_statement(uncertainty, markdown=False):
+    """
+    Uncertainty statement of a compute_scan_uncertainty result.
+
+    Args:
+      uncertainty (dict): Result of compute_scan_uncertainty.
+      markdown (bool, optional): Markdown with emphasis instead of plain text. Defaults to False.
+
+    Returns:
+      str: The statement, giving the interval between the lowest and highest
+        percentiles (and the median when computed).
+    """
+    bold = "**" if markdown else ""
+    percentiles = uncertainty["percentiles"]
+    low_kwh, high_kwh = uncertainty["total_energy"][0], uncertainty["total_energy"][-1]
+    low_kg, high_kg = (convert_g2kg(value) for value in (uncertainty["total_emissions"][0], uncertainty["total_emissions"][-1]))
+
+    text = (
+        f"Allowing for the range of powers reported for the scanner and for the variation of the carbon intensity "
+        f"over the years, the study amounts to between {bold}{low_kg:.2f} and {high_kg:.2f} kg CO2e{bold} "
+        f"({low_kwh:.2f} to {high_kwh:.2f} kWh), "
+        f"the {percentiles[0]:g}th to {percentiles[-1]:g}th percentiles of {uncertainty['draws']:,} simulations"
+    )
+    if 50 in percentiles:
+        text += f", with a median of {convert_g2kg(uncertainty['total_emissions'][percentiles.index(50)]):.2f} kg CO2e"
+    return text + "."
+
+
+# The footprint as a small graph of stages, each recomputed only when its own
+# inputs change:
+#
+#   country, year ---------------> carbon_intensity_stage --+
+#                                                            +--> emissions per component
+#   model, field_strength -------> scanner_powers_stage --+  |
+#   durations, storage and ------> footprint_consumption -+--+
+#   computing parameters           (energy per component)
+#
+# The stages reading data files are memoized (keyed on the data versions); the
+# arithmetic ones are cheaper to recompute than to look up. Reactive front
+# ends mirror the graph with one reactive calculation per stage, while
+# compute_scan chains them for a single call.
+
+@memoize(stage_cache, carbon_intensity_key)
+@timed("carbon_intensity")
+def carbon_intensity_stage(country, year, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """
+    Carbon intensity of a country, using the closest available year.
+
+    Returns:
+      tuple: (year_eff, carbon_intensity), the year used and its value in gCO2/kWh.
+    """
+    return get_carbon_index(countryCarbonIntensity_filename).lookup(country, year)
+
+
+@memoize(stage_cache, scanner_powers_key)
+@timed("scanner_powers")
+def scanner_powers_stage(model, field_strength, scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Scan and idle power of a scanner model, or the medians of its field strength for "Other".
+
+    Returns:
+      tuple: (scan_power, idle_power) in kW.
+    """
+    return scanner_powers(model, field_strength, scannerData_filename)
+
+
+def scan_summary(country, year, model, field_strength, scan_duration, idle_duration, carbon_intensity, scan_powers,
+                 energy):
+    """
+    Summary of a study for get_statement, from the results of the stages.
+
+    Args:
+      carbon_intensity (tuple): Result of carbon_intensity_stage.
+      scan_powers (tuple): Result of scanner_powers_stage.
+      energy (dict): Result of footprint_consumption, in kWh per component.
+      Other arguments as in compute_scan.
+
+    Returns:
+      dict: Summary of the computed values, with "<component>_energy" (kWh) and
+        "<component>_emissions" (gCO2e) entries for each of the COMPONENTS.
+        "carbon_emissions" is the scanner's share.
+    """
+    year_eff, intensity = carbon_intensity
+    scan_power, idle_power = scan_powers
+    summary = {
+        "country": country,
+        "year": year,
+        "year_eff": year_eff,
+        "model": model,
+        "field_strength": field_strength,
+        "carbon_intensity": intensity,
+        "scan_duration": scan_duration,
+        "idle_duration": idle_duration,
+        "carbon_emissions": intensity * energy["scanner"],
+        "scan_power": scan_power,
+        "idle_power": idle_power,
+    }
+    for component in COMPONENTS:
+        summary[f"{component}_energy"] = energy[component]
+        summary[f"{component}_emissions"] = intensity * energy[component]
+    summary["total_energy"] = sum(energy[component] for component in COMPONENTS)
+    summary["total_emissions"] = intensity * summary["total_energy"]
+    return summary
+
+
+@memoize(scan_cache, scan_key)
+@timed("compute_scan")
+def compute_scan(modality, model, field_strength, scan_duration, idle_duration, country, year, scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE,
+                 years_storage=5, redundancy=3, cpu_hours=2, ram_gb=32, gpu_hours=0, pue_hpc=1.56):
+    """
+    Computes the energy and carbon emissions of a study, per component.
+
+    Args:
+      modality (str): "MRI".
+      model (str): Full model name ("Manufacturer Model"), or "Other" for the
+        median of the models of the field strength.
+      field_strength (float): Field strength in Tesla.
+      scan_duration (float): Duration of active scanning in minutes.
+      idle_duration (float): Duration of idle scanning in minutes.
+      country (str): Country where the data was collected.
+      year (int): Year of the scanning; the closest available year is used.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      years_storage (float, optional): Years the data will be stored. Defaults to 5.
+      redundancy (float, optional): Redundancy factor of the storage. Defaults to 3.
+      cpu_hours (float, optional): CPU hours of data processing. Defaults to 2.
+      ram_gb (float, optional): RAM used by the processing in GB. Defaults to 32.
+      gpu_hours (float, optional): GPU hours of data processing. Defaults to 0.
+      pue_hpc (float, optional): Power Usage Effectiveness of the data center. Defaults to 1.56.
+
+    Returns:
+      dict: Summary of the computed values, for get_statement (see scan_summary).
+    """
+
+    # Country specific data
+    # If the year selected is not in the data we have for the selected country, take closest available year
+    carbon_intensity = carbon_intensity_stage(country, year, countryCarbonIntensity_filename)
+
+    # MACHINE-RELATED CALCULATIONS
+    ##############################
+
+    # The model from our database, or if "Other" the median based on our database (by field strength)
+    scan_power, idle_power = scan_powers = scanner_powers_stage(model, field_strength, scannerData_filename)
+
+    # ENERGY PER COMPONENT (scanner, cooling, storage, computing)
+    ##############################################################
+
+    energy = footprint_consumption(idle_power, scan_power, scan_duration, idle_duration,
+                                   years_storage=years_storage, redundancy=redundancy, cpu_hours=cpu_hours,
+                                   ram_gb=ram_gb, gpu_hours=gpu_hours, pue_hpc=pue_hpc)
+
+    # SUMMARY
+    #########
+
+    return scan_summary(country, year, model, field_strength, scan_duration, idle_duration, carbon_intensity,
+                        scan_powers, energy)
@@ -0,0 +1,198 @@
+from bisect import bisect_left
+
+from utils.datasets import COUNTRY_CARBON_FILE, cached_load, read_compiled_rows
+
+INTENSITY_COLUMN = "Carbon intensity of electricity - gCO2/kWh"
+
+# Composite (country code, year) search keys of lookup_many: code * _KEY_SHIFT + year
+_KEY_SHIFT = 1 << 32
+
+
+class CarbonIndex:
+    """
+    (country, year) -> carbon intensity lookup, built once from the carbon data.
+
+    Each country keeps its available years sorted, so the nearest available
+    year is found with a binary search. Single lookups are pure Python; the
+    NumPy arrays used by `lookup_many` are built on first use.
+
+    Args:
+      rows (iterable): (country, year, carbon intensity) tuples.
+    """
+
+    __slots__ = ("countries", "_years", "_intensities", "_arrays")
+
+    def __init__(self, rows):
+        by_country = {}
+        for country, year, intensity in rows:
+            by_country.setdefault(country, []).append((int(year), float(intensity)))
+
+        # Countries in order of first appearance, like df["Entity"].unique()
+        self.countries = list(by_country)
+        self._years = {}
+        self._intensities = {}
+        for country, entries in by_country.items():
+            # Stable sort: for a duplicated year the first row wins, like .iloc[0]
+            entries.sort(key=lambda entry: entry[0])
+            self._years[country] = [year for year, _ in entries]
+            self._intensities[country] = [intensity for _, intensity in entries]
+        self._arrays = None
+
+    @classmethod
+    def from_frame(cls, df_carbon):
+        """Builds the index from a carbon intensity DataFrame."""
+        return cls(zip(df_carbon["Entity"], df_carbon["Year"], df_carbon[INTENSITY_COLUMN]))
+
+    def __contains__(self, country):
+        return country in self._years
+
+    def overlay(self, rows):
+        """
+        Copy of the index with some (country, year) values added or replaced.
+
+        Copy on write: only the countries in `rows` get new lists, the others
+        share those of this index.
+
+        Args:
+          rows (iterable): (country, year, carbon intensity) tuples, without duplicates.
+
+        Returns:
+          CarbonIndex: The new index, as built from this one's rows with `rows`
+            replacing the same (country, year) and the others appended.
+        """
+        index = CarbonIndex(())
+        index.countries = list(self.countries)
+        index._years = dict(self._years)
+        index._intensities = dict(self._intensities)
+
+        by_country = {}
+        for country, year, intensity in rows:
+            by_country.setdefault(country, {})[int(year)] = float(intensity)
+        for country, values in by_country.items():
+            if country not in self._years:
+                index.countries.append(country)
+            merged = dict(zip(self._years.get(country, ()), self._intensities.get(country, ())))
+            merged.update(values)
+            index._years[country] = sorted(merged)
+            index._intensities[country] = [merged[year] for year in index._years[country]]
+        return index
+
+    def country_data(self, country):
+        """
+        Sorted years and matching intensities available for a country.
+
+        Returns:
+          tuple: (years, intensities) lists, to be treated as read-only.
+        """
+        try:
+            return self._years[country], self._intensities[country]
+        except KeyError:
+            raise ValueError(f"No data available for country: {country}") from None
+
+    def lookup(self, country, year, prefer_later=True):
+        """
+        Carbon intensity for a country, using the closest available year.
+
+        Args:
+          country (str): Country as spelled in the carbon data.
+          year (int): Requested year.
+          prefer_later (bool, optional): When two available years are equally
+            close, take the later one. Defaults to True.
+
+        Returns:
+          tuple: (year_eff, carbon_intensity), the year actually used and its
+            intensity in gCO2/kWh.
+        """
+        years, intensities = self.country_data(country)
+
+        i = bisect_left(years, year)
+        if i < len(years) and years[i] == year:
+            return years[i], intensities[i]
+
+        # Otherwise pick the nearer neighbour of the insertion point
+        if i == len(years) or (i > 0 and (year - years[i - 1] < years[i] - year or
+                                          (year - years[i - 1] == years[i] - year and not prefer_later))):
+            i -= 1
+        return years[i], intensities[i]
+
+    def _flat_arrays(self):
+        # Rows sorted by country then year, as flat NumPy arrays; each country owns a contiguous slice
+        if self._arrays is None:
+            import numpy as np
+
+            countries = sorted(self._years)
+            lengths = np.array([len(self._years[country]) for country in countries], dtype=np.int64)
+            stops = np.cumsum(lengths)
+            years = np.array([year for country in countries for year in self._years[country]], dtype=np.int64)
+            intensities = np.array([value for country in countries for value in self._intensities[country]],
+                                   dtype=np.float64)
+            codes = {country: code for code, country in enumerate(countries)}
+            keys = np.repeat(np.arange(len(countries), dtype=np.int64), lengths) * _KEY_SHIFT + years
+            self._arrays = (codes, stops - lengths, stops, years, intensities, keys)
+        return self._arrays
+
+    def lookup_many(self, countries, years, prefer_later=True):
+        """
+        Vectorized `lookup` for many (country, year) pairs at once.
+
+        Args:
+          countries (array-like of str): Countries as spelled in the carbon data.
+          years (array-like of int): Requested years, same length as `countries`.
+          prefer_later (bool, optional): Tie-breaking, as in `lookup`. Defaults to True.
+
+        Returns:
+          tuple: (year_eff, carbon_intensity) NumPy arrays.
+        """
+        import numpy as np
+        import pandas as pd
+
+        codes, all_starts, all_stops, all_years, all_intensities, keys = self._flat_arrays()
+
+        row_codes, uniques = pd.factorize(np.asarray(countries, dtype=object))
+        if (row_codes < 0).any():
+            raise ValueError("No data available for country: nan")
+        try:
+            country_codes = np.array([codes[country] for country in uniques], dtype=np.int64)[row_codes]
+        except KeyError as e:
+            raise ValueError(f"No data available for country: {e.args[0]}") from None
+
+        years = np.asarray(years, dtype=np.int64)
+        start = all_starts[country_codes]
+        stop = all_stops[country_codes]
+
+        # First row of the country at or after the requested year, and the one before it
+        i = np.searchsorted(keys, country_codes * _KEY_SHIFT + years)
+        has_after = i < stop
+        after = np.minimum(i, stop - 1)
+        before = np.maximum(i - 1, start)
+
+        gap_after = all_years[after] - years
+        gap_before = years - all_years[before]
+        closer_before = (gap_before < gap_after) if prefer_later else (gap_before <= gap_after)
+        use_before = ~has_after | ((i > start) & (gap_after != 0) & closer_before)
+
+        rows = np.where(use_before, before, after)
+        return all_years[rows], all_intensities[rows]
+
+
+def get_carbon_index(countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """Shared `CarbonIndex` of a carbon intensity file, rebuilt when the file changes."""
+    return cached_load(countryCarbonIntensity_filename, load_carbon_index)
+
+
+def load_carbon_index(countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """
+    Builds the `CarbonIndex` of a carbon intensity file, from its compiled
+    artifact when it is up to date (validated when compiled, see
+    utils.datasets), from the CSV once validated otherwise.
+
+    Raises:
+      ValueError: The CSV has errors (see utils.validation).
+    """
+    columns = ["Entity", "Year", INTENSITY_COLUMN]
+    rows = read_compiled_rows(countryCarbonIntensity_filename, columns)
+    if rows is None:
+        from utils.validation import read_carbon_rows  # imports this module
+
+        rows = [[row[column] for column in columns] for row in read_carbon_rows(countryCarbonIntensity_filename)]
+    return CarbonIndex(rows)
@@ -1,40 +1,55 @@
+# All functions below accept numbers, NumPy arrays or pandas Series for any argument.
+# Arrays broadcast against each other and against numbers, and give NumPy arrays back;
+# numbers only go through plain Python arithmetic, so scalar results are unchanged.
+
+def _as_array(value):
+  """Returns numbers unchanged and any other input as a float NumPy array."""
+  if isinstance(value, (int, float)):
+    return value
+  import numpy as np
+  return np.asarray(value, dtype=float)
+
+
 def mri_consumption(kw_idle, kw_scan, scan_time = 60, idle_time = 15):
   """
   Calculates the energy consumption of an MRI scanner.
 
   Args:
-    kw_idle (float): Power consumption in kilowatts (kW) during idle mode.
-    kw_scan (float): Power consumption in kilowatts (kW) during scan mode.
-    scan_time (int, optional): Duration of the scan in minutes. Defaults to 60.
-    idle_time (int, optional): Duration of idle time in minutes. Defaults to 15.
+    kw_idle (float or array-like): Power consumption in kilowatts (kW) during idle mode.
+    kw_scan (float or array-like): Power consumption in kilowatts (kW) during scan mode.
+    scan_time (int or array-like, optional): Duration of the scan in minutes. Defaults to 60.
+    idle_time (int or array-like, optional): Duration of idle time in minutes. Defaults to 15.
 
   Returns:
-    float: Total energy consumption in kilowatt-hours (kWh).
+    float or numpy.ndarray: Total energy consumption in kilowatt-hours (kWh).
   """
+  kw_idle, kw_scan, scan_time, idle_time = map(_as_array, (kw_idle, kw_scan, scan_time, idle_time))
   kwh = (scan_time * kw_scan) / 60 + (idle_time * kw_idle) / 60
 
   return kwh
 
 
-def cooling_consumption(mri_consumption, scan_time = 60):
+def cooling_consumption(mri_consumption):
   """
   Calculates the energy consumption required for cooling an MRI machine.
 
   This function models the cooling energy based on the MRI machine's energy consumption
-  and a simplified Coefficient of Performance (COP) for cooling systems.
+  and a simplified Coefficient of Performance (COP) for cooling systems: the heat to
+  remove is a share of the energy the scanner draws over the same time, so the cooling
+  energy is proportional to the scanner energy (and to the number of studies).
 
   Args:
-    mri_consumption (float): The energy consumption of the MRI machine in kWh.
-    scan_time (int, optional): The duration of the MRI scan in minutes. Defaults to 60.
+    mri_consumption (float or array-like): The energy consumption of the MRI machine in kWh.
 
   Returns:
-    float: The estimated energy consumption for cooling in kilowatt-hours (kWh).
+    float or numpy.ndarray: The estimated energy consumption for cooling in kilowatt-hours (kWh).
   """
+  mri_consumption = _as_array(mri_consumption)
   #Keeping the Coefficient of Performance (COP) a constant, but following the equation aiming to allows expanding the tool later based on the location and time
   cop_t_amb = 3.0 - 0.05 * (20 - 15)
-  h_load = 0.95 * mri_consumption
+  h_load = 0.95 * mri_consumption  # heat load in kWh, over the time of the scanner energy
 
-  e_cool = h_load / cop_t_amb * scan_time
+  e_cool = h_load / cop_t_amb
 
 
   return e_cool
@@ -47,14 +62,15 @@ def storage_consumption(scan_time = 60, years_storage = 5, redundancy = 3):
   a given energy density for storage, years of storage, and a redundancy factor.
 
   Args:
-    scan_time (int, optional): The duration of the MRI scan in minutes. Defaults to 60.
-    years_storage (int, optional): The number of years the data will be stored. Defaults to 5.
-    redundancy (int, optional): The redundancy factor for data storage (e.g., for backups).
+    scan_time (int or array-like, optional): The duration of the MRI scan in minutes. Defaults to 60.
+    years_storage (int or array-like, optional): The number of years the data will be stored. Defaults to 5.
+    redundancy (int or array-like, optional): The redundancy factor for data storage (e.g., for backups).
                                 Defaults to 3.
 
   Returns:
-    float: The estimated energy consumption for data storage in kilowatt-hours (kWh).
+    float or numpy.ndarray: The estimated energy consumption for data storage in kilowatt-hours (kWh).
   """
+  scan_time, years_storage, redundancy = map(_as_array, (scan_time, years_storage, redundancy))
   volume_estimated = (scan_time / 60) * 5
   kwh = 0.0537 * volume_estimated * years_storage * redundancy
   #converting the estimation of 50kWh/TB/Year to GiB
@@ -68,15 +84,16 @@ def computing_consumption(cpu_hours=2, ram_gb=32, gpu_hours=0, pue_hpc = 1.56):
   optional GPU hours, and a Power Usage Effectiveness (PUE) for High-Performance Computing (HPC).
 
   Args:
-    cpu_hours (float): Number of CPU hours used.
-    ram_gb (float): Amount of RAM used in gigabytes.
-    gpu_hours (float, optional): Number of GPU hours used. Defaults to 0.
-    pue_hpc (float, optional): Power Usage Effectiveness for HPC data centers.
+    cpu_hours (float or array-like): Number of CPU hours used.
+    ram_gb (float or array-like): Amount of RAM used in gigabytes.
+    gpu_hours (float or array-like, optional): Number of GPU hours used. Defaults to 0.
+    pue_hpc (float or array-like, optional): Power Usage Effectiveness for HPC data centers.
                                Defaults to 1.56 (from Uptime Institute survey).
 
   Returns:
-    float: Total estimated energy consumption in kilowatt-hours (kWh).
+    float or numpy.ndarray: Total estimated energy consumption in kilowatt-hours (kWh).
   """
+  cpu_hours, ram_gb, gpu_hours, pue_hpc = map(_as_array, (cpu_hours, ram_gb, gpu_hours, pue_hpc))
   # Constants
   w_core = 12.0 #validate value later one
   w_ram_gb = 0.3725 #same constant used by Lannelongue, Loïc, Jason Grealey, and Michael Inouye. "Green algorithms: quantifying the carbon footprint of computation." Advanced science 8.12 (2021): 2100707.
@@ -86,4 +103,32 @@ def computing_consumption(cpu_hours=2, ram_gb=32, gpu_hours=0, pue_hpc = 1.56):
   e_ram = (cpu_hours * ram_gb * w_ram_gb) / 1000
   e_gpu = (gpu_hours * w_gpu) / 1000
   kwh = (e_cpu + e_ram + e_gpu) * pue_hpc ## Value from pue_hpc comming from  Uptime Institute 14th annual global data center survey (retrieved DataCenter Knowledge (news platform))
-  return kwh
\ No newline at end of file
+  return kwh
+
+# Components of the footprint of a study, in the order of footprint_consumption
+COMPONENTS = ("scanner", "cooling", "storage", "computing")
+
+def footprint_consumption(kw_idle, kw_scan, scan_time = 60, idle_time = 15, years_storage = 5, redundancy = 3,
+                          cpu_hours = 2, ram_gb = 32, gpu_hours = 0, pue_hpc = 1.56):
+  """
+  Calculates the energy consumption of every component of a study in one pass.
+
+  Any argument can be an array (one value per study), so batch callers get all
+  the components as array expressions over all the studies at once.
+
+  Args:
+    kw_idle, kw_scan, scan_time, idle_time: As in mri_consumption.
+    years_storage, redundancy: As in storage_consumption.
+    cpu_hours, ram_gb, gpu_hours, pue_hpc: As in computing_consumption.
+
+  Returns:
+    dict: Energy consumption in kilowatt-hours (kWh) of each of the COMPONENTS,
+      as floats or numpy.ndarrays.
+  """
+  scanner = mri_consumption(kw_idle, kw_scan, scan_time, idle_time)
+  return {
+    "scanner": scanner,
+    "cooling": cooling_consumption(scanner),
+    "storage": storage_consumption(scan_time, years_storage, redundancy),
+    "computing": computing_consumption(cpu_hours, ram_gb, gpu_hours, pue_hpc),
+  }
@@ -0,0 +1,316 @@
+# NumPy and pandas are imported where they are used, so that importing this
+# module (and the single-scan path built on it) stays fast.
+
+import csv
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from utils import metrics
+
+# Paths to the shipped data
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SCANNER_DATA_FILE = DATA_DIR / "Scanner Power - Main.csv"
+COUNTRY_CARBON_FILE = DATA_DIR / "carbon-intensity.csv"
+
+
+class _Entry(NamedTuple):
+    mtime_ns: int
+    value: Any
+
+
+# Process-wide store: (absolute path, loader) -> _Entry
+_store = {}
+_lock = threading.RLock()  # loaders may build on other stored data
+
+
+def compiled_path(file_name):
+    """Path of the compiled artifact of a CSV data file (same name, `.npz`)."""
+    return Path(file_name).with_suffix(".npz")
+
+
+def save_compiled(df, file_name, source_file=None):
+    """
+    Writes a DataFrame as a typed, columnar NumPy `.npz` artifact.
+
+    Text columns are dictionary-encoded (small integer codes plus the distinct
+    values), integer columns are downcast to the smallest type holding them,
+    and float columns are kept as float64 so results match the CSV exactly.
+
+    Args:
+      df (pandas.DataFrame): Data to write.
+      file_name (str or Path): Output `.npz` file.
+      source_file (str or Path, optional): CSV the data comes from; its mtime
+        is recorded so stale artifacts are ignored.
+    """
+    import numpy as np
+    import pandas as pd
+
+    arrays = {"columns": np.array(df.columns, dtype=str)}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_integer_dtype(values):
+            arrays[f"values_{i}"] = pd.to_numeric(values, downcast="integer").to_numpy()
+        elif pd.api.types.is_float_dtype(values):
+            arrays[f"values_{i}"] = values.to_numpy(dtype=np.float64)
+        else:
+            codes, categories = pd.factorize(values)  # missing values get code -1
+            arrays[f"codes_{i}"] = codes.astype(np.int16 if len(categories) < 2**15 else np.int32)
+            arrays[f"categories_{i}"] = np.asarray(categories, dtype=str)
+    if source_file is not None:
+        arrays["source_mtime_ns"] = np.array(os.stat(source_file).st_mtime_ns, dtype=np.int64)
+    with open(file_name, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def _open_compiled(source_file):
+    # The artifact of a CSV data file if it is up to date, None otherwise (or without NumPy).
+    # NumPy is only imported when there is an artifact, so the CSV path stays pure Python.
+    file_name = compiled_path(source_file)
+    if not file_name.exists():
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    try:
+        artifact = np.load(file_name)
+    except FileNotFoundError:  # removed in between
+        return None
+    if "source_mtime_ns" in artifact and artifact["source_mtime_ns"] != os.stat(source_file).st_mtime_ns:
+        artifact.close()
+        return None
+    return artifact
+
+
+def load_compiled(source_file):
+    """
+    Reads the compiled artifact of a CSV data file, if it is up to date.
+
+    Args:
+      source_file (str or Path): CSV data file.
+
+    Returns:
+      pandas.DataFrame or None: The data, with text columns as categoricals,
+        or None when there is no artifact or the CSV changed after it was compiled.
+    """
+    import numpy as np
+    import pandas as pd
+
+    artifact = _open_compiled(source_file)
+    if artifact is None:
+        return None
+    with artifact:
+        data = {}
+        for i, column in enumerate(artifact["columns"].tolist()):
+            if f"values_{i}" in artifact:
+                values = artifact[f"values_{i}"]
+                data[column] = values.astype(np.int64) if values.dtype.kind == "i" else values
+            else:
+                # Kept dictionary-encoded in memory too
+                data[column] = pd.Categorical.from_codes(artifact[f"codes_{i}"], artifact[f"categories_{i}"])
+    return pd.DataFrame(data)
+
+
+def read_compiled_rows(source_file, columns):
+    """
+    Rows of some columns of the compiled artifact of a CSV data file, if it is up to date.
+
+    Only needs NumPy (not pandas), for the pure-Python indexes.
+
+    Args:
+      source_file (str or Path): CSV data file.
+      columns (list of str): Columns to read.
+
+    Returns:
+      list or None: One tuple of Python values (str, int or float; None for
+        missing text) per row, or None when there is no up-to-date artifact or
+        NumPy is not installed.
+    """
+    artifact = _open_compiled(source_file)
+    if artifact is None:
+        return None
+    with artifact:
+        names = artifact["columns"].tolist()
+        values = []
+        for column in columns:
+            i = names.index(column)
+            if f"values_{i}" in artifact:
+                values.append(artifact[f"values_{i}"].tolist())
+            else:
+                categories = artifact[f"categories_{i}"].tolist() + [None]  # code -1: missing
+                values.append([categories[code] for code in artifact[f"codes_{i}"].tolist()])
+    return list(zip(*values))
+
+
+def load_scanner_data(scannerData_filename=SCANNER_DATA_FILE, use_compiled=True):
+    """
+    Loads and processes the scanner power data.
+
+    Args:
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      use_compiled (bool, optional): Read the compiled artifact instead of the
+        CSV when it is up to date. Defaults to True.
+
+    Returns:
+      pandas.DataFrame: Scanner data with a `model_full` column, sorted by it.
+    """
+    import pandas as pd
+
+    if use_compiled:
+        df_models = load_compiled(scannerData_filename)
+        if df_models is not None:
+            return df_models
+
+    # Field strength parsed as a float directly, not cast afterwards
+    df_models = pd.read_csv(scannerData_filename, dtype={"Field strength": float})
+    df_models['model_full'] = df_models['Manufacturer'] + " " + df_models['Model']
+    df_models.sort_values(by=['model_full'], inplace=True)
+
+    return df_models
+
+
+def load_carbon_data(countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, use_compiled=True):
+    """
+    Loads the carbon intensity data per country and year.
+
+    Args:
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      use_compiled (bool, optional): Read the compiled artifact instead of the
+        CSV when it is up to date. Defaults to True.
+
+    Returns:
+      pandas.DataFrame: Carbon intensity data.
+    """
+    if use_compiled:
+        df_carbon = load_compiled(countryCarbonIntensity_filename)
+        if df_carbon is not None:
+            return df_carbon
+
+    import pandas as pd
+    return pd.read_csv(countryCarbonIntensity_filename)
+
+
+def read_csv_rows(file_name):
+    """
+    Reads a CSV file as a list of dicts (column -> text) with the csv module.
+
+    Pure Python, for the readers of single lookups, which never need NumPy
+    or pandas.
+    """
+    with open(file_name, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def compile_datasets(scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE,
+                     validate=True):
+    """
+    Compiles the CSV data files into `.npz` artifacts next to them.
+
+    Args:
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      validate (bool, optional): Validate both files first (see utils.validation),
+        and write nothing if either has errors. Defaults to True.
+
+    Returns:
+      list: Paths of the artifacts written.
+
+    Raises:
+      ValueError: A file has errors.
+    """
+    if validate:
+        from utils.validation import raise_problems, validate_carbon_file, validate_scanner_file
+
+        for report in (validate_scanner_file(scannerData_filename),
+                       validate_carbon_file(countryCarbonIntensity_filename)):
+            raise_problems(report.errors, f"data file {report.file_name}")
+
+    written = []
+    for file_name, loader in ((scannerData_filename, load_scanner_data),
+                              (countryCarbonIntensity_filename, load_carbon_data)):
+        save_compiled(loader(file_name, use_compiled=False), compiled_path(file_name), source_file=file_name)
+        written.append(compiled_path(file_name))
+    return written
+
+
+def cached_load(file_name, loader):
+    """
+    Returns `loader(file_name)`, loading it at most once per process.
+
+    The result is kept in a process-wide store shared by every session and
+    front end, and is loaded again only when the file's mtime changes.
+    Returned objects are shared and must be treated as read-only.
+
+    Args:
+      file_name (str or Path): Data file to load.
+      loader (callable): Function building the stored object from the file.
+
+    Returns:
+      The object built by `loader`.
+    """
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    key = (path, loader)
+
+    entry = _store.get(key)
+    if entry is None or entry.mtime_ns != stat.st_mtime_ns:
+        with _lock:
+            entry = _store.get(key)
+            if entry is None or entry.mtime_ns != stat.st_mtime_ns:
+                reload = entry is not None
+                start = time.perf_counter()
+                entry = _Entry(stat.st_mtime_ns, loader(path))
+                _store[key] = entry
+                labels = {"loader": loader.__name__, "file": os.path.basename(path)}
+                metrics.observe("data_load_seconds", time.perf_counter() - start, **labels)
+                metrics.increment("data_loads_total", **labels)
+                if reload:
+                    metrics.increment("data_reloads_total", **labels)
+                metrics.set_gauge("data_file_bytes", stat.st_size, **labels)
+    return entry.value
+
+
+def put(file_name, loader, value):
+    """
+    Stores an object built otherwise as `loader(file_name)`, for the file as it is now.
+
+    Used for indexes derived from others (see utils.tenants) which share most
+    of their data with them; `value` must equal what the loader would build.
+    """
+    path = os.path.abspath(file_name)
+    with _lock:
+        _store[(path, loader)] = _Entry(os.stat(path).st_mtime_ns, value)
+
+
+def evict(*file_names):
+    """Drops everything stored for these files."""
+    paths = {os.path.abspath(file_name) for file_name in file_names}
+    with _lock:
+        for key in [key for key in _store if key[0] in paths]:
+            del _store[key]
+
+
+def is_stored(file_name):
+    """Whether anything is stored for this file (e.g. to check an eviction)."""
+    path = os.path.abspath(file_name)
+    with _lock:
+        return any(key[0] == path for key in _store)
+
+
+def get_scanner_data(scannerData_filename=SCANNER_DATA_FILE):
+    """Shared, read-only scanner data (see `load_scanner_data`)."""
+    return cached_load(scannerData_filename, load_scanner_data)
+
+
+def get_carbon_data(countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """Shared, read-only carbon intensity data (see `load_carbon_data`)."""
+    return cached_load(countryCarbonIntensity_filename, load_carbon_data)
+
+
+def clear():
+    """Drops everything held in the store."""
+    with _lock:
+        _store.clear()
@@ -0,0 +1,361 @@
+# Annual energy and emissions of imaging facilities with several scanners,
+# from the weekly schedule of each scanner.
+#
+# During its opening hours, a scanner runs back-to-back studies of
+# scan_duration minutes of scanning followed by idle_duration minutes of idle
+# time, as the studies of compute_scan; the rest of the time (overnight,
+# weekends, closed days) it stays in standby. Each scanner is simulated over
+# every minute of the year at once with NumPy (a weekly template of modes,
+# tiled over the calendar), and the scanners of all the facilities in
+# parallel worker processes; scanners with the same powers and schedule are
+# simulated once. Results are the annual totals per scanner and facility,
+# and the load profile of each facility at minute or hour resolution.
+#
+# Facility definitions are JSON:
+#
+#   {"schedules": {"clinical": {"blocks": [{"days": "Mon-Fri", "start": "07:30", "end": "19:00"}],
+#                               "scan_duration": 45, "idle_duration": 15, "closed": ["2024-12-25"]}},
+#    "facilities": [{"name": "Centre A", "country": "France", "year": 2024,
+#                    "scanners": [{"model": "Siemens MAGNETOM Prisma", "schedule": "clinical", "count": 2},
+#                                 {"model": "Other", "field_strength": 7, "schedule": "clinical"}]}]}
+#
+# A scanner's schedule is the name of one of "schedules" or a schedule itself.
+
+import json
+import math
+import statistics
+from datetime import date
+from functools import partial
+from typing import FrozenSet, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.batch import map_chunks
+from utils.carbon_index import get_carbon_index
+from utils.consumptions import cooling_consumption, mri_consumption
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.scanners import get_scanner_catalog, get_standby_powers, scanner_powers
+
+# Modes of a scanner, as stored per minute
+STANDBY, SCAN, IDLE = 0, 1, 2
+MODES = ("standby", "scan", "idle")
+
+MINUTES_PER_DAY = 24 * 60
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# Minutes per step of the load profiles
+RESOLUTIONS = {"minute": 1, "hour": 60}
+
+SCANNER_COLUMNS = ["facility", "scanner", "model", "field_strength", "count", "scan_hours", "idle_hours",
+                   "standby_hours", "scanner_energy", "cooling_energy", "total_energy", "total_emissions", "peak_kw"]
+FACILITY_COLUMNS = ["facility", "country", "year", "year_eff", "carbon_intensity", "scanners", "scan_hours",
+                    "idle_hours", "standby_hours", "scanner_energy", "cooling_energy", "total_energy",
+                    "total_emissions", "mean_kw", "peak_kw", "peak_time"]
+PROFILE_COLUMNS = ["facility", "time", "scanner_kw", "cooling_kw", "load_kw"]
+
+
+class Block(NamedTuple):
+    """Opening hours on some days of the week, in minutes since midnight."""
+    days: FrozenSet[int]  # 0 for Monday
+    start: int
+    end: int
+
+
+class Schedule(NamedTuple):
+    """Weekly schedule of a scanner."""
+    blocks: Tuple[Block, ...]
+    scan_duration: float = 60  # minutes of each study
+    idle_duration: float = 15
+    closed: FrozenSet[date] = frozenset()  # days in standby, e.g. public holidays
+
+
+class Scanner(NamedTuple):
+    """Identical scanners of a facility."""
+    name: str
+    model: str
+    field_strength: float
+    count: int
+    schedule: Schedule
+    powers: Tuple[float, float, float]  # kW in standby, scan and idle mode (MODES order)
+
+
+class Facility(NamedTuple):
+    name: str
+    country: str
+    year: int
+    year_eff: int
+    carbon_intensity: float  # gCO2/kWh
+    scanners: Tuple[Scanner, ...]
+
+
+class FacilityResults(NamedTuple):
+    scanners: pd.DataFrame  # SCANNER_COLUMNS, one row per scanner entry of the facilities
+    facilities: pd.DataFrame  # FACILITY_COLUMNS
+    profiles: pd.DataFrame  # PROFILE_COLUMNS, average load of each facility over each step
+
+
+def _check_keys(spec, allowed, what):
+    if not isinstance(spec, dict):
+        raise ValueError(f"{what} must be a JSON object")
+    unknown = [key for key in spec if key not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field in {what}: {unknown[0]}")
+
+
+def _parse_days(spec):
+    # "Mon-Fri,Sun" or ["Mon", "Sat"]
+    days = set()
+    for part in spec.split(",") if isinstance(spec, str) else spec:
+        first, _, last = part.strip().partition("-")
+        try:
+            first, last = (WEEKDAYS.index(day.strip()[:3].title()) for day in (first, last or first))
+        except ValueError:
+            raise ValueError(f"Invalid days: {spec!r} (expected e.g. \"Mon-Fri\")") from None
+        days.update(day % 7 for day in range(first, last + 1 if last >= first else last + 8))
+    return frozenset(days)
+
+
+def _parse_time(text):
+    # "07:30" -> 450, up to "24:00"
+    hours, _, minutes = str(text).partition(":")
+    try:
+        minute = int(hours) * 60 + int(minutes or 0)
+    except ValueError:
+        raise ValueError(f"Invalid time: {text!r} (expected HH:MM)") from None
+    if not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time: {text!r}")
+    return minute
+
+
+def parse_schedule(spec):
+    """
+    Schedule of its JSON definition.
+
+    Args:
+      spec (dict): "blocks", a list of {"days", "start", "end"} (e.g. "Mon-Fri",
+        "07:30", "19:00"), and optionally "scan_duration" and "idle_duration"
+        (minutes of each study, 60 and 15 by default) and "closed" (ISO dates).
+
+    Returns:
+      Schedule: The schedule.
+
+    Raises:
+      ValueError: Invalid definition.
+    """
+    _check_keys(spec, ("blocks", "scan_duration", "idle_duration", "closed"), "schedule")
+    blocks = []
+    for block in spec.get("blocks", ()):
+        _check_keys(block, ("days", "start", "end"), "schedule block")
+        start, end = _parse_time(block.get("start", "00:00")), _parse_time(block.get("end", "24:00"))
+        if end <= start:
+            raise ValueError(f"Block ending before it starts: {block} (split blocks spanning midnight)")
+        blocks.append(Block(_parse_days(block.get("days", "Mon-Sun")), start, end))
+    scan_duration, idle_duration = float(spec.get("scan_duration", 60)), float(spec.get("idle_duration", 15))
+    if not scan_duration > 0 or not idle_duration >= 0:
+        raise ValueError("scan_duration must be over 0 and idle_duration at least 0")
+    closed = frozenset(date.fromisoformat(day) for day in spec.get("closed", ()))
+    return Schedule(tuple(blocks), scan_duration, idle_duration, closed)
+
+
+def _standby_power(model, field_strength, scannerData_filename):
+    standby = get_standby_powers(scannerData_filename)
+    if model != "Other":
+        return standby[model]
+    # As for the other powers of "Other": the median of the models of the field strength
+    values = [standby[record.model_full] for record in get_scanner_catalog(scannerData_filename).records.values()
+              if record.field_strength == field_strength and not math.isnan(standby[record.model_full])]
+    if not values:
+        raise ValueError(f"No standby power for field strength {field_strength}")
+    return statistics.median(values)
+
+
+def parse_facilities(spec, scannerData_filename=SCANNER_DATA_FILE,
+                     countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """
+    Facilities of their JSON definition (see the top of this module), with the
+    powers of their scanners and their carbon intensity resolved.
+
+    Each scanner has "model", "schedule", and optionally "field_strength"
+    (required for "Other"), "count" (1 by default), "name" (the model by
+    default) and "standby_power" (kW, to replace the one of the scanner data).
+
+    Returns:
+      list of Facility: The facilities.
+
+    Raises:
+      ValueError: Invalid definition, unknown model or country.
+    """
+    _check_keys(spec, ("schedules", "facilities"), "facility definitions")
+    schedules = {name: parse_schedule(schedule) for name, schedule in spec.get("schedules", {}).items()}
+    catalog = get_scanner_catalog(scannerData_filename)
+    carbon_index = get_carbon_index(countryCarbonIntensity_filename)
+
+    facilities = []
+    for facility in spec.get("facilities", ()):
+        _check_keys(facility, ("name", "country", "year", "scanners"), "facility")
+        name = str(facility.get("name", f"facility {len(facilities) + 1}"))
+        try:
+            year_eff, intensity = carbon_index.lookup(facility["country"], int(facility["year"]))
+            scanners = []
+            for scanner in facility.get("scanners", ()):
+                _check_keys(scanner, ("name", "model", "field_strength", "count", "schedule", "standby_power"),
+                            "scanner")
+                model = scanner["model"]
+                record = catalog.records.get(model)
+                field_strength = float(scanner.get("field_strength", record.field_strength if record else math.nan))
+                schedule = scanner["schedule"]
+                if isinstance(schedule, str) and schedule not in schedules:
+                    raise ValueError(f"Unknown schedule: {schedule}")
+                schedule = schedules[schedule] if isinstance(schedule, str) else parse_schedule(schedule)
+                scan_power, idle_power = scanner_powers(model, field_strength, scannerData_filename)
+                standby_power = (float(scanner["standby_power"]) if "standby_power" in scanner
+                                 else _standby_power(model, field_strength, scannerData_filename))
+                powers = (standby_power, scan_power, idle_power)
+                if any(math.isnan(power) for power in powers):
+                    raise ValueError(f"Missing power for model {model}")
+                count = scanner.get("count", 1)
+                if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+                    raise ValueError(f"count must be a whole number over 0: {count!r}")
+                scanners.append(Scanner(str(scanner.get("name", model)), model, field_strength, count,
+                                        schedule, powers))
+        except KeyError as e:
+            raise ValueError(f"Facility {name}: missing or unknown {e.args[0]!r}") from None
+        except ValueError as e:
+            raise ValueError(f"Facility {name}: {e}") from None
+        facilities.append(Facility(name, facility["country"], int(facility["year"]), year_eff, intensity,
+                                   tuple(scanners)))
+    return facilities
+
+
+def read_facilities(file_name, scannerData_filename=SCANNER_DATA_FILE,
+                    countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """parse_facilities of a JSON file."""
+    with open(file_name, encoding="utf-8") as f:
+        return parse_facilities(json.load(f), scannerData_filename, countryCarbonIntensity_filename)
+
+
+def weekly_modes(schedule):
+    """
+    Mode of a scanner in every minute of the week.
+
+    Returns:
+      numpy.ndarray: int8 array of shape (7, 1440), Monday first, of STANDBY, SCAN and IDLE.
+    """
+    modes = np.full((7, MINUTES_PER_DAY), STANDBY, dtype=np.int8)
+    period = schedule.scan_duration + schedule.idle_duration
+    for block in schedule.blocks:
+        # Studies start with the block; the last one is cut at its end
+        phase = np.arange(block.end - block.start) % period
+        pattern = np.where(phase < schedule.scan_duration, SCAN, IDLE)
+        for day in block.days:
+            modes[day, block.start:block.end] = pattern
+    return modes
+
+
+def days_in_year(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+def year_modes(schedule, year):
+    """Mode of a scanner in every minute of a year, as an int8 array of shape (days, 1440)."""
+    first = date(year, 1, 1)
+    modes = weekly_modes(schedule)[(first.weekday() + np.arange(days_in_year(year))) % 7]
+    closed = [(day - first).days for day in schedule.closed if day.year == year]
+    modes[closed] = STANDBY
+    return modes
+
+
+def simulate_scanner(powers, schedule, year, step=60):
+    """
+    Energy of one scanner over a year, minute by minute.
+
+    The scanner draws its standby, scan or idle power in each minute. The
+    cooling of each study is cooling_consumption of its scanner energy, as in
+    compute_scan, spread over its scan minutes.
+
+    Args:
+      powers (tuple): kW in standby, scan and idle mode.
+      schedule (Schedule): Weekly schedule.
+      year (int): Calendar year.
+      step (int, optional): Minutes per step of the energy returned. Defaults to 60.
+
+    Returns:
+      tuple: (minutes in each of the MODES, scanner kWh per step, cooling kWh per step).
+    """
+    standby_power, scan_power, idle_power = powers
+    modes = year_modes(schedule, year).ravel()
+    scanner_kwh = np.array(powers)[modes] / 60
+
+    study_energy = mri_consumption(idle_power, scan_power, schedule.scan_duration, schedule.idle_duration)
+    cooling_per_minute = cooling_consumption(study_energy) / schedule.scan_duration
+    cooling_kwh = (modes == SCAN) * cooling_per_minute
+
+    minutes = np.bincount(modes, minlength=len(MODES))
+    return minutes, scanner_kwh.reshape(-1, step).sum(axis=1), cooling_kwh.reshape(-1, step).sum(axis=1)
+
+
+def _simulate(step, run):
+    powers, schedule, year = run
+    return simulate_scanner(powers, schedule, year, step)
+
+
+def simulate_facilities(facilities, resolution="hour", jobs=None):
+    """
+    Annual energy, emissions and load profiles of facilities.
+
+    Args:
+      facilities (list of Facility): Result of parse_facilities.
+      resolution (str, optional): Step of the load profiles, "minute" or
+        "hour". Defaults to "hour".
+      jobs (int, optional): Number of worker processes. Defaults to the CPU count.
+
+    Returns:
+      FacilityResults: Totals per scanner and per facility (hours, kWh, gCO2e,
+        and peak load in kW at the resolution), and the load profile of each
+        facility (average kW over each step, times in local time).
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution} (expected one of {', '.join(RESOLUTIONS)})")
+    step = RESOLUTIONS[resolution]
+
+    # Each distinct scanner run once, in parallel
+    runs = list(dict.fromkeys((scanner.powers, scanner.schedule, facility.year)
+                              for facility in facilities for scanner in facility.scanners))
+    results = dict(zip(runs, map_chunks(partial(_simulate, step), runs, jobs)))
+
+    scanner_rows, facility_rows, profiles = [], [], []
+    for facility in facilities:
+        minutes = np.zeros(len(MODES))
+        scanner_kwh = cooling_kwh = 0.0
+        for scanner in facility.scanners:
+            run_minutes, run_scanner, run_cooling = results[scanner.powers, scanner.schedule, facility.year]
+            minutes = minutes + scanner.count * run_minutes
+            scanner_kwh = scanner_kwh + scanner.count * run_scanner
+            cooling_kwh = cooling_kwh + scanner.count * run_cooling
+            energy = scanner.count * (run_scanner.sum() + run_cooling.sum())
+            scanner_rows.append([
+                facility.name, scanner.name, scanner.model, scanner.field_strength, scanner.count,
+                *(scanner.count * run_minutes[[SCAN, IDLE, STANDBY]] / 60), scanner.count * run_scanner.sum(),
+                scanner.count * run_cooling.sum(), energy, energy * facility.carbon_intensity,
+                scanner.count * (run_scanner + run_cooling).max() * 60 / step])
+
+        n_steps = days_in_year(facility.year) * MINUTES_PER_DAY // step
+        scanner_kw = np.broadcast_to(scanner_kwh * 60 / step, n_steps)
+        cooling_kw = np.broadcast_to(cooling_kwh * 60 / step, n_steps)
+        load_kw = scanner_kw + cooling_kw
+        times = pd.date_range(str(facility.year), periods=n_steps, freq=f"{step}min")
+        peak = int(load_kw.argmax())
+        energy = float(np.sum(scanner_kwh) + np.sum(cooling_kwh))
+        facility_rows.append([
+            facility.name, facility.country, facility.year, facility.year_eff, facility.carbon_intensity,
+            sum(scanner.count for scanner in facility.scanners), *(minutes[[SCAN, IDLE, STANDBY]] / 60),
+            float(np.sum(scanner_kwh)), float(np.sum(cooling_kwh)), energy, energy * facility.carbon_intensity,
+            float(load_kw.mean()), float(load_kw[peak]), times[peak]])
+        profiles.append(pd.DataFrame({"facility": facility.name, "time": times, "scanner_kw": scanner_kw,
+                                      "cooling_kw": cooling_kw, "load_kw": load_kw}))
+
+    return FacilityResults(pd.DataFrame(scanner_rows, columns=SCANNER_COLUMNS),
+                           pd.DataFrame(facility_rows, columns=FACILITY_COLUMNS),
+                           pd.concat(profiles, ignore_index=True) if profiles
+                           else pd.DataFrame(columns=PROFILE_COLUMNS))
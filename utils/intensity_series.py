@@ -0,0 +1,215 @@
+# Time-resolved carbon intensity (e.g. hourly values per grid zone).
+#
+# A series CSV has the columns zone, timestamp (ISO 8601, UTC unless an
+# offset is given) and intensity (gCO2/kWh). Each value holds from its
+# timestamp until the next one of the zone; the last one for as long as the
+# step before it.
+#
+# The CSV is compiled once into a directory of NumPy arrays (same name,
+# ".series"), memory-mapped when loaded: the zones are contiguous slices of
+# sorted time boundaries, values, and prefix sums of intensity x time. The
+# integral over any time window is then two binary searches, whatever the
+# length of the series, and only the pages touched are read from disk. A
+# recompilation writes a new directory and swaps it in, so the arrays already
+# mapped by other processes are never modified.
+
+import json
+import math
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from utils.datasets import cached_load
+
+SERIES_FILES = ("times.npy", "values.npy", "cumulative.npy")
+
+
+def series_path(file_name):
+    """Directory of the compiled arrays of a series CSV file."""
+    return Path(file_name).with_suffix(".series")
+
+
+def compile_intensity_series(file_name):
+    """
+    Compiles a series CSV file into its memory-mappable arrays.
+
+    Args:
+      file_name (str or Path): Series CSV with zone, timestamp and intensity columns.
+
+    Returns:
+      Path: Directory of the arrays.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(file_name, usecols=["zone", "timestamp", "intensity"])
+    if df["intensity"].isna().any():
+        raise ValueError(f"Missing intensity values in {file_name}")
+    df["seconds"] = (pd.to_datetime(df["timestamp"], utc=True) - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    df = df.sort_values(["zone", "seconds"], kind="stable")
+    if df.duplicated(["zone", "seconds"]).any():
+        raise ValueError(f"Duplicated timestamps in {file_name}")
+
+    times, values, cumulative, zones = [], [], [], {}
+    offset = 0
+    for zone, group in df.groupby("zone", sort=True):
+        if len(group) < 2:
+            raise ValueError(f"Zone {zone} needs at least two timestamps")
+        seconds = group["seconds"].to_numpy(dtype=np.int64)
+        intensity = group["intensity"].to_numpy(dtype=np.float64)
+        # Boundaries of the steps, the last step as long as the one before
+        bounds = np.append(seconds, 2 * seconds[-1] - seconds[-2])
+        hours = np.diff(bounds) / 3600
+        times.append(bounds)
+        values.append(np.append(intensity, intensity[-1]))  # aligned with bounds
+        cumulative.append(np.concatenate(([0.0], np.cumsum(intensity * hours))))
+        zones[str(zone)] = [offset, offset + len(bounds)]
+        offset += len(bounds)
+
+    # Written into a new directory, then swapped in: the files of the previous
+    # one stay valid for the processes that have them memory-mapped
+    directory = series_path(file_name)
+    temporary = Path(tempfile.mkdtemp(prefix=f".{directory.stem}.", suffix=".series", dir=directory.parent))
+    try:
+        for name, arrays in zip(SERIES_FILES, (times, values, cumulative)):
+            np.save(temporary / name, np.concatenate(arrays))
+        with open(temporary / "zones.json", "w") as f:
+            json.dump({"source_mtime_ns": os.stat(file_name).st_mtime_ns, "zones": zones}, f)
+        _replace_directory(temporary, directory)
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+    return directory
+
+
+def _replace_directory(new, directory):
+    # os.replace only overwrites empty directories, so the current one is moved aside first
+    old = directory.with_name(f".{directory.stem}.{uuid.uuid4().hex}.series")
+    try:
+        os.replace(directory, old)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(new, directory)
+    except OSError:
+        # Another process compiled the same file meanwhile, and its directory is in place
+        pass
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class IntensitySeries:
+    """
+    Memory-mapped carbon intensity series of several zones.
+
+    Args:
+      directory (str or Path): Directory written by compile_intensity_series.
+    """
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        with open(directory / "zones.json") as f:
+            self.zones = {zone: tuple(bounds) for zone, bounds in json.load(f)["zones"].items()}
+        # Plain ndarray views of the maps: same pages, without the np.memmap overhead on every slice
+        self._times, self._values, self._cumulative = (
+            np.load(directory / name, mmap_mode="r").view(np.ndarray) for name in SERIES_FILES)
+
+    def __contains__(self, zone):
+        return zone in self.zones
+
+    def time_range(self, zone):
+        """(first, end) of a zone's series, as POSIX timestamps in seconds."""
+        start, stop = self._zone(zone)
+        return int(self._times[start]), int(self._times[stop - 1])
+
+    def _zone(self, zone):
+        try:
+            return self.zones[zone]
+        except KeyError:
+            raise ValueError(f"No intensity series for zone: {zone}") from None
+
+    def _cumulative_at(self, start, stop, seconds):
+        # Integral of the intensity (gCO2/kWh x h) from the zone's first timestamp to `seconds`
+        times = self._times[start:stop]
+        if (seconds < times[0]).any() or (seconds > times[-1]).any():
+            raise ValueError("Time window outside of the intensity series")
+        # Boundaries are whole seconds: search with integer keys, as a float key would convert the whole array
+        keys = np.floor(seconds).astype(np.int64)
+        step = np.minimum(times.searchsorted(keys, side="right") - 1, len(times) - 2) + start
+        return self._cumulative[step] + self._values[step] * (seconds - self._times[step]) / 3600
+
+    def _cumulative_at_scalar(self, start, stop, seconds):
+        # Same for one timestamp, in plain Python numbers
+        times = self._times[start:stop]
+        if not int(times[0]) <= seconds <= int(times[-1]):
+            raise ValueError("Time window outside of the intensity series")
+        step = min(int(times.searchsorted(np.int64(math.floor(seconds)), side="right")) - 1, stop - start - 2) + start
+        return float(self._cumulative[step]) + float(self._values[step]) * (seconds - int(self._times[step])) / 3600
+
+    def integrate(self, zone, start_seconds, end_seconds):
+        """
+        Integral of the intensity over time windows, in gCO2/kWh x hours.
+
+        Multiplied by a constant power (kW), this gives the emissions (gCO2e)
+        over the window. O(log n) per window.
+
+        Args:
+          zone (str): Zone of the series.
+          start_seconds, end_seconds (float or array-like): POSIX timestamps of
+            the windows, in seconds.
+
+        Returns:
+          float or numpy.ndarray: Integral over each window.
+        """
+        start, stop = self._zone(zone)
+        if np.ndim(start_seconds) == 0 and np.ndim(end_seconds) == 0:
+            return (self._cumulative_at_scalar(start, stop, float(end_seconds))
+                    - self._cumulative_at_scalar(start, stop, float(start_seconds)))
+        return (self._cumulative_at(start, stop, np.asarray(end_seconds, dtype=np.float64))
+                - self._cumulative_at(start, stop, np.asarray(start_seconds, dtype=np.float64)))
+
+    def mean_intensity(self, zone, start_seconds, end_seconds):
+        """Time-weighted mean intensity (gCO2/kWh) over time windows."""
+        hours = (np.asarray(end_seconds, dtype=np.float64) - np.asarray(start_seconds, dtype=np.float64)) / 3600
+        return self.integrate(zone, start_seconds, end_seconds) / hours
+
+    def integrate_between(self, zone, start, end):
+        """
+        `integrate` over the window between two datetimes.
+
+        Args:
+          zone (str): Zone of the series.
+          start, end (datetime.datetime): Window; naive datetimes are taken as UTC.
+        """
+        return self.integrate(zone, _seconds(start), _seconds(end))
+
+    def emissions(self, zone, start, end, power_kw):
+        """Emissions (gCO2e) of a constant power (kW) drawn between two datetimes."""
+        return power_kw * self.integrate_between(zone, start, end)
+
+
+def _seconds(moment):
+    from datetime import timezone
+
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def load_intensity_series(file_name):
+    """Memory-maps the compiled arrays of a series CSV, compiling them first if missing or stale."""
+    directory = series_path(file_name)
+    try:
+        with open(directory / "zones.json") as f:
+            up_to_date = json.load(f)["source_mtime_ns"] == os.stat(file_name).st_mtime_ns
+    except FileNotFoundError:
+        up_to_date = False
+    if not up_to_date:
+        compile_intensity_series(file_name)
+    return IntensitySeries(directory)
+
+
+def get_intensity_series(file_name):
+    """Shared IntensitySeries of a series CSV file, reloaded when the file changes."""
+    return cached_load(file_name, load_intensity_series)
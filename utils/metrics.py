@@ -0,0 +1,201 @@
+# Opt-in instrumentation: time spent per stage of a calculation, counters of
+# data (re)loads, data file sizes, and the statistics of the result caches.
+#
+# Disabled by default: an instrumented call then costs one flag check on top
+# of the call itself, so the hooks stay in place in production. Enable with
+# enable(), or by setting NEURO_IMPACT_METRICS=1 in the environment. Metrics
+# are exported as Prometheus text (render_prometheus) or as one structured
+# log record (log_metrics). Standard library only, like the single-scan path.
+
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "neuro_impact"
+
+# name -> (Prometheus type, help)
+METRICS = {
+    "stage_seconds": ("summary", "Time spent computing each stage of a calculation, and rendering."),
+    "data_loads_total": ("counter", "Data files loaded into the process-wide store, reloads included."),
+    "data_reloads_total": ("counter", "Data files loaded again after they changed on disk."),
+    "data_load_seconds": ("summary", "Time spent loading data files into the store."),
+    "data_file_bytes": ("gauge", "Size of the data files at their last load."),
+    "cache_hits_total": ("counter", "Lookups answered by a result cache."),
+    "cache_misses_total": ("counter", "Lookups not found in a result cache."),
+    "cache_evictions_total": ("counter", "Entries dropped from a full result cache."),
+    "cache_entries": ("gauge", "Entries held by a result cache."),
+}
+
+_enabled = os.environ.get("NEURO_IMPACT_METRICS", "").lower() in ("1", "true", "yes", "on")
+_lock = threading.Lock()
+_values = {}  # (name, labels) -> value, or [count, sum, max] for summaries
+_caches = {}  # name -> LRUCache, read at export time
+
+
+def enable():
+    """Starts recording metrics."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stops recording metrics; those recorded so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Drops the metrics recorded so far."""
+    with _lock:
+        _values.clear()
+
+
+def register_cache(name, cache):
+    """Exports the hit, miss and size statistics of an LRUCache, which it counts anyway."""
+    _caches[name] = cache
+
+
+def _labels(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """Adds `value` to a counter, when enabled."""
+    if _enabled:
+        key = (name, _labels(labels))
+        with _lock:
+            _values[key] = _values.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Sets a gauge, when enabled."""
+    if _enabled:
+        with _lock:
+            _values[(name, _labels(labels))] = value
+
+
+def observe(name, seconds, **labels):
+    """Records one duration of a summary, when enabled."""
+    if _enabled:
+        key = (name, _labels(labels))
+        with _lock:
+            summary = _values.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += seconds
+            summary[2] = max(summary[2], seconds)
+
+
+@contextmanager
+def timer(stage, **labels):
+    """
+    Times the enclosed block as `stage` of stage_seconds, when enabled.
+
+    >>> with timer("render", output="consumption"):
+    ...     text = get_statement(summary)
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+
+def timed(stage):
+    """
+    Decorator timing each call of a function as `stage` of stage_seconds, when enabled.
+
+    Placed under @memoize, it times the computations only; the cache hits
+    show in the cache statistics.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe("stage_seconds", time.perf_counter() - start, stage=stage)
+        return wrapper
+    return decorator
+
+
+def _samples():
+    # (name, labels, value) of every metric, the cache statistics read now
+    with _lock:
+        samples = [(name, labels, list(value) if isinstance(value, list) else value)
+                   for (name, labels), value in _values.items()]
+    for cache_name, cache in _caches.items():
+        stats = cache.stats()
+        labels = (("cache", cache_name),)
+        samples += [("cache_hits_total", labels, stats.hits), ("cache_misses_total", labels, stats.misses),
+                    ("cache_evictions_total", labels, stats.evictions), ("cache_entries", labels, stats.size)]
+    return sorted(samples, key=lambda sample: (sample[0], sample[1]))
+
+
+def snapshot():
+    """
+    The metrics as plain data.
+
+    Returns:
+      dict: metric name -> list of {"labels": {...}, "value": number}, summaries
+        having "count", "sum" and "max" (seconds) instead of "value".
+    """
+    metrics = {}
+    for name, labels, value in _samples():
+        sample = {"labels": dict(labels)}
+        if isinstance(value, list):
+            sample.update(count=value[0], sum=value[1], max=value[2])
+        else:
+            sample["value"] = value
+        metrics.setdefault(name, []).append(sample)
+    return metrics
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def render_prometheus():
+    """The metrics in the Prometheus text exposition format."""
+    lines = []
+    last = None
+    for name, labels, value in _samples():
+        full_name = f"{PREFIX}_{name}"
+        if name != last:
+            kind, help_text = METRICS.get(name, ("untyped", name))
+            lines += [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} {kind}"]
+            last = name
+        if isinstance(value, list):
+            lines.append(f"{full_name}_count{_format_labels(labels)} {value[0]}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {value[1]!r}")
+        else:
+            lines.append(f"{full_name}{_format_labels(labels)} {value!r}")
+    return "\n".join(lines) + "\n"
+
+
+def log_metrics(logger=None, level=None):
+    """
+    Logs the metrics as one JSON record (see snapshot), e.g. periodically or at exit.
+
+    Args:
+      logger (logging.Logger, optional): Defaults to the "neuro_impact" logger.
+      level (int, optional): Defaults to logging.INFO.
+    """
+    import json
+    import logging
+
+    (logger or logging.getLogger(PREFIX)).log(level or logging.INFO, json.dumps({"metrics": snapshot()}))
@@ -0,0 +1,321 @@
+import math
+from typing import NamedTuple, Optional
+
+from utils.datasets import SCANNER_DATA_FILE, cached_load, read_compiled_rows, read_csv_rows
+
+POWER_COLUMNS = ("scan_mode", "idle_mode")
+
+
+def to_float(value):
+    """float(value), or NaN for missing and non-numeric entries such as "N/A"."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class ScannerRecord(NamedTuple):
+    """Powers (kW) and metadata of one scanner model."""
+    model_full: str
+    manufacturer: str
+    model: str
+    field_strength: float
+    scan_mode: float
+    idle_mode: float
+    source: Optional[str]
+
+
+def read_scanner_records(scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Reads the scanner data as one `ScannerRecord` per row.
+
+    Rows come from the compiled artifact when it is up to date (validated
+    when compiled, see utils.datasets), sorted by full model name, and from the
+    CSV in file order once validated otherwise (csv module, so single lookups
+    never need pandas).
+
+    Raises:
+      ValueError: The CSV has errors (see utils.validation).
+    """
+    columns = ["Manufacturer", "Model", "Field strength", "scan_mode", "idle_mode", "Source"]
+    rows = read_compiled_rows(scannerData_filename, columns)
+    if rows is None:
+        from utils.validation import read_scanner_rows  # imports this module
+
+        rows = [[row[column] for column in columns] for row in read_scanner_rows(scannerData_filename)]
+    return [
+        ScannerRecord(manufacturer + " " + model, manufacturer, model, float(field_strength), to_float(scan_mode),
+                      to_float(idle_mode), source or None)
+        for manufacturer, model, field_strength, scan_mode, idle_mode, source in rows
+    ]
+
+
+def overlay_records(records, overrides):
+    """
+    Scanner records with some models added or replaced (copy on write: the
+    records kept are shared, not copied).
+
+    Args:
+      records (list of ScannerRecord): Base rows.
+      overrides (list of ScannerRecord): Rows replacing the base rows of the same
+        full model name, or adding new models.
+
+    Returns:
+      list: The overrides, then the base rows of the other models, in file order.
+    """
+    replaced = {record.model_full for record in overrides}
+    return list(overrides) + [record for record in records if record.model_full not in replaced]
+
+
+class ScannerCatalog:
+    """
+    Scanner records keyed by full model name ("Manufacturer Model").
+
+    Built once from the scanner data, so resolving a model is a dictionary
+    lookup and the model choices of a field strength are prebuilt.
+
+    Args:
+      records (iterable of ScannerRecord): Rows of the scanner data.
+    """
+
+    __slots__ = ("records", "models_by_field_strength")
+
+    def __init__(self, records):
+        self.records = {}
+        for record in records:
+            # First row wins for duplicated models, like .iloc[0]
+            if record.model_full not in self.records:
+                self.records[record.model_full] = record
+
+        by_field_strength = {}
+        for record in self.records.values():
+            by_field_strength.setdefault(record.field_strength, []).append(record.model_full)
+        self.models_by_field_strength = {
+            field_strength: tuple(sorted(models)) for field_strength, models in sorted(by_field_strength.items())
+        }
+
+    def __contains__(self, model):
+        return model in self.records
+
+    def models(self, field_strength=None):
+        """
+        Sorted full model names, optionally of one field strength only.
+
+        Args:
+          field_strength (float, optional): Field strength in Tesla. Defaults to all.
+
+        Returns:
+          list: Full model names.
+        """
+        if field_strength is None:
+            return sorted(self.records)
+        return list(self.models_by_field_strength.get(float(field_strength), ()))
+
+
+class PowerStats(NamedTuple):
+    """Aggregates of one power column (kW) over the models of a field strength."""
+    median: float
+    mean: float
+    min: float
+    max: float
+    count: int
+
+
+class FieldStrengthStats(NamedTuple):
+    """Power aggregates of all the models of one field strength."""
+    field_strength: float
+    scan_mode: PowerStats
+    idle_mode: PowerStats
+
+    def power(self, column):
+        """
+        Median power (kW) of a column, as used for the "Other" model.
+
+        Args:
+          column (str): "scan_mode" or "idle_mode".
+
+        Returns:
+          float: Median of the non-missing values.
+        """
+        stats = getattr(self, column)
+        if stats.count == 0:
+            raise ValueError(f"No {column} entries for field strength {self.field_strength}")
+        return stats.median
+
+
+def _power_stats(values):
+    values = sorted(value for value in values if not math.isnan(value))
+    n = len(values)
+    if n == 0:
+        return PowerStats(math.nan, math.nan, math.nan, math.nan, 0)
+    median = values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+    return PowerStats(median, sum(values) / n, values[0], values[-1], n)
+
+
+def build_field_strength_table(records):
+    """
+    Aggregates the scanner powers per field strength.
+
+    Args:
+      records (iterable of ScannerRecord): Rows of the scanner data.
+
+    Returns:
+      dict: Field strength (float) -> FieldStrengthStats, in increasing field strength.
+    """
+    by_field_strength = {}
+    for record in records:
+        by_field_strength.setdefault(record.field_strength, []).append(record)
+
+    return {
+        field_strength: FieldStrengthStats(
+            field_strength,
+            **{column: _power_stats(getattr(record, column) for record in group) for column in POWER_COLUMNS})
+        for field_strength, group in sorted(by_field_strength.items())
+    }
+
+
+class PowerRange(NamedTuple):
+    """Lowest and highest power (kW) reported for one mode of a scanner model."""
+    low: float
+    high: float
+
+
+class ReportedPowers(NamedTuple):
+    """Power ranges of a scanner model as reported by the manufacturer, before averaging."""
+    scan: PowerRange
+    idle: PowerRange
+
+
+def parse_power_range(text):
+    """
+    Bounds of a reported power, e.g. "20.2 – 22.7" or "11.9".
+
+    Returns:
+      PowerRange: The bounds in kW, or None for missing entries such as "N/A".
+    """
+    bounds = [to_float(bound) for bound in text.replace("–", "-").split("-")] if text else []
+    if not bounds or any(math.isnan(bound) for bound in bounds):
+        return None
+    return PowerRange(min(bounds), max(bounds))
+
+
+def read_reported_powers(scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Reads the raw power columns of the scanner data, keyed by full model name.
+
+    The scan range comes from "Scan mode (kW)". Idle power spans every value
+    reported for the standby and ready-to-scan modes, whose average is
+    idle_mode. The adjusted scan_mode / idle_mode values are used when no
+    raw value is reported.
+
+    Returns:
+      dict: Full model name -> ReportedPowers (first row wins for duplicates).
+    """
+    reported = {}
+    for row in read_csv_rows(scannerData_filename):
+        model_full = row["Manufacturer"] + " " + row["Model"]
+        if model_full in reported:
+            continue
+        scan = parse_power_range(row["Scan mode (kW)"]) or parse_power_range(row["scan_mode"])
+        idle_ranges = [power_range for power_range in (parse_power_range(row["Standby (no scan) mode (kW)"]),
+                                                       parse_power_range(row["Ready-to-scan mode (kW)"]))
+                       if power_range is not None]
+        if idle_ranges:
+            idle = PowerRange(min(low for low, _ in idle_ranges), max(high for _, high in idle_ranges))
+        else:
+            idle = parse_power_range(row["idle_mode"])
+        reported[model_full] = ReportedPowers(scan, idle)
+    return reported
+
+
+def get_reported_powers(scannerData_filename=SCANNER_DATA_FILE):
+    """Shared read_reported_powers result of a scanner file, reread when the file changes."""
+    return cached_load(scannerData_filename, read_reported_powers)
+
+
+def read_standby_powers(scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Standby (no scan) power (kW) of each scanner model, e.g. overnight.
+
+    The middle of the "Standby (no scan) mode (kW)" range reported, or
+    idle_mode when none is.
+
+    Returns:
+      dict: Full model name -> standby power (first row wins for duplicates).
+    """
+    standby = {}
+    for row in read_csv_rows(scannerData_filename):
+        model_full = row["Manufacturer"] + " " + row["Model"]
+        if model_full not in standby:
+            reported = parse_power_range(row["Standby (no scan) mode (kW)"])
+            standby[model_full] = (reported.low + reported.high) / 2 if reported else to_float(row["idle_mode"])
+    return standby
+
+
+def get_standby_powers(scannerData_filename=SCANNER_DATA_FILE):
+    """Shared read_standby_powers result of a scanner file, reread when the file changes."""
+    return cached_load(scannerData_filename, read_standby_powers)
+
+
+def get_scanner_records(scannerData_filename=SCANNER_DATA_FILE):
+    """Shared `ScannerRecord`s of a scanner file, reread when the file changes."""
+    return cached_load(scannerData_filename, read_scanner_records)
+
+
+def get_scanner_catalog(scannerData_filename=SCANNER_DATA_FILE):
+    """Shared `ScannerCatalog` of a scanner file, rebuilt when the file changes."""
+    return cached_load(scannerData_filename, load_scanner_catalog)
+
+
+def load_scanner_catalog(scannerData_filename=SCANNER_DATA_FILE):
+    return ScannerCatalog(get_scanner_records(scannerData_filename))
+
+
+def get_field_strength_table(scannerData_filename=SCANNER_DATA_FILE):
+    """Shared field strength table of a scanner file, rebuilt when the file changes."""
+    return cached_load(scannerData_filename, load_field_strength_table)
+
+
+def load_field_strength_table(scannerData_filename=SCANNER_DATA_FILE):
+    return build_field_strength_table(get_scanner_records(scannerData_filename))
+
+
+def other_model_powers(field_strength, scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Scan and idle power (kW) used for the "Other" model of a field strength.
+
+    These are the medians over the models of that field strength in our
+    database, more robust than the mean given observed data.
+
+    Args:
+      field_strength (float): Field strength in Tesla.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+
+    Returns:
+      tuple: (scan_power, idle_power) in kW.
+    """
+    stats = get_field_strength_table(scannerData_filename).get(float(field_strength))
+    if stats is None:
+        raise ValueError(f"No scan_mode entries for field strength {field_strength}")
+    return stats.power("scan_mode"), stats.power("idle_mode")
+
+
+def scanner_powers(model, field_strength, scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Scan and idle power (kW) of a scanner model.
+
+    Args:
+      model (str): Full model name ("Manufacturer Model"), or "Other" for the
+        medians of the field strength.
+      field_strength (float): Field strength in Tesla, used for "Other".
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+
+    Returns:
+      tuple: (scan_power, idle_power) in kW.
+    """
+    record = get_scanner_catalog(scannerData_filename).records.get(model)
+    if record is not None:
+        return record.scan_mode, record.idle_mode
+    if model == "Other":
+        return other_model_powers(field_strength, scannerData_filename)
+    raise ValueError("Model not found in database")
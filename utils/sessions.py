@@ -0,0 +1,267 @@
+# Streaming pipeline for scanner session logs. Every step is a generator, so
+# logs of any size are processed in constant memory: one session at a time,
+# plus the rollup table (one entry per scanner, month and country).
+#
+# A log has one record per mode interval of a session, as CSV or JSON lines
+# (".jsonl"/".ndjson"), with the fields:
+#   session, scanner (full model name or "Other"), country, mode, start, end
+# and optionally field_strength (needed for "Other") and zone (grid zone of an
+# hourly intensity series, defaults to the country). start and end are ISO
+# timestamps. Records of a session must be contiguous, as scanners export them.
+
+import csv
+import itertools
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+from utils.carbon_index import get_carbon_index
+from utils.consumptions import mri_consumption
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.scanners import scanner_powers
+
+# Log modes counted as scanning or as idle time; other modes (e.g. "off") are ignored
+SCAN_MODES = frozenset({"scan"})
+IDLE_MODES = frozenset({"idle", "standby", "ready"})
+# Fields of a log record without a default
+REQUIRED_FIELDS = ("session", "scanner", "country", "mode", "start", "end")
+
+SESSION_COLUMNS = ["session", "scanner", "country", "day", "year_eff", "carbon_intensity", "scan_duration",
+                   "idle_duration", "scan_power", "idle_power", "scanner_energy", "carbon_emissions"]
+ROLLUP_COLUMNS = ["scanner", "month", "country", "sessions", "scan_duration", "idle_duration", "scanner_energy",
+                  "carbon_emissions"]
+
+
+class Segment(NamedTuple):
+    """One mode interval of a session."""
+    session: str
+    scanner: str
+    field_strength: float
+    country: str
+    zone: str
+    mode: str
+    start: datetime
+    end: datetime
+
+
+class SessionDay(NamedTuple):
+    """
+    Scan and idle minutes of a session on one day, and with an intensity
+    series the integral of the intensity over them (gCO2/kWh x hours).
+    """
+    session: str
+    scanner: str
+    field_strength: float
+    country: str
+    day: str  # ISO date
+    scan_duration: float
+    idle_duration: float
+    scan_intensity_hours: float = math.nan
+    idle_intensity_hours: float = math.nan
+
+
+def read_log_records(file_name):
+    """
+    Reads a session log record by record.
+
+    Args:
+      file_name (str or Path): CSV file, or JSON lines for ".jsonl" / ".ndjson".
+
+    Yields:
+      dict: The fields of each record.
+    """
+    with open(file_name, newline="", encoding="utf-8") as f:
+        if Path(file_name).suffix in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            for row in reader:
+                yield dict(zip(header, row))
+
+
+def parse_segments(records):
+    """
+    Validates log records into Segments, skipping the modes not counted.
+
+    Raises:
+      ValueError: A record misses one of the REQUIRED_FIELDS, or ends before it starts.
+
+    Yields:
+      Segment: One per scan or idle interval.
+    """
+    for line, record in enumerate(records, start=1):
+        missing = [name for name in REQUIRED_FIELDS if record.get(name) is None]
+        if missing:
+            raise ValueError(f"Record {line} has no {missing[0]} field")
+        mode = str(record["mode"]).strip().lower()
+        if mode not in SCAN_MODES and mode not in IDLE_MODES:
+            continue
+        start, end = datetime.fromisoformat(record["start"]), datetime.fromisoformat(record["end"])
+        if end < start:
+            raise ValueError(f"Record {line} of session {record['session']} ends before it starts")
+        field_strength = record.get("field_strength")
+        yield Segment(str(record["session"]), record["scanner"],
+                      float(field_strength) if field_strength not in (None, "") else math.nan,
+                      record["country"], record.get("zone") or record["country"], mode, start, end)
+
+
+def split_days(segments):
+    """Splits the segments spanning midnight into one segment per day."""
+    for segment in segments:
+        start = segment.start
+        if start.date() == segment.end.date():
+            yield segment
+            continue
+        while start.date() < segment.end.date():
+            midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time(), start.tzinfo)
+            yield segment._replace(start=start, end=midnight)
+            start = midnight
+        # Nothing is left of a segment ending at midnight
+        if start < segment.end:
+            yield segment._replace(start=start)
+
+
+def session_days(segments, intensity_series=None):
+    """
+    Sums the scan and idle minutes of each session per day.
+
+    Args:
+      segments (iterable of Segment): Segments of the log.
+      intensity_series (IntensitySeries, optional): Time-resolved intensities;
+        each segment is then also integrated against the intensity of its zone
+        over its exact time window.
+
+    Yields:
+      SessionDay: One per session and day, in log order.
+    """
+    for _, group in itertools.groupby(split_days(segments), key=lambda segment: segment.session):
+        totals = {}
+        for segment in group:
+            day = totals.setdefault(segment.start.date(), [segment, 0.0, 0.0, 0.0, 0.0])
+            is_scan = segment.mode in SCAN_MODES
+            day[1 if is_scan else 2] += (segment.end - segment.start).total_seconds() / 60
+            if intensity_series is not None:
+                day[3 if is_scan else 4] += intensity_series.integrate_between(
+                    segment.zone, segment.start, segment.end)
+        for day, (segment, scan_duration, idle_duration, scan_integral, idle_integral) in totals.items():
+            if intensity_series is None:
+                scan_integral = idle_integral = math.nan
+            yield SessionDay(segment.session, segment.scanner, segment.field_strength, segment.country,
+                             day.isoformat(), scan_duration, idle_duration, scan_integral, idle_integral)
+
+
+def session_emissions(days, scannerData_filename=SCANNER_DATA_FILE,
+                      countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """
+    Energy and emissions of each session day.
+
+    Emissions use the intensity integrals of the day when computed (see
+    session_days), and the annual carbon intensity of the year otherwise; the
+    carbon_intensity column is then the mean intensity over the session, and
+    year_eff is left empty.
+
+    Yields:
+      dict: One row per session day, with the SESSION_COLUMNS keys.
+    """
+    carbon_index = get_carbon_index(countryCarbonIntensity_filename)
+    powers = {}  # (scanner, field strength) -> powers, a log has few scanners
+    for day in days:
+        key = (day.scanner, day.field_strength)
+        if key not in powers:
+            powers[key] = scanner_powers(day.scanner, day.field_strength, scannerData_filename)
+        scan_power, idle_power = powers[key]
+        energy = mri_consumption(idle_power, scan_power, day.scan_duration, day.idle_duration)
+        if math.isnan(day.scan_intensity_hours):
+            year_eff, carbon_intensity = carbon_index.lookup(day.country, int(day.day[:4]))
+            emissions = carbon_intensity * energy
+        else:
+            emissions = scan_power * day.scan_intensity_hours + idle_power * day.idle_intensity_hours
+            year_eff, carbon_intensity = None, emissions / energy if energy else math.nan
+        yield {
+            "session": day.session,
+            "scanner": day.scanner,
+            "country": day.country,
+            "day": day.day,
+            "year_eff": year_eff,
+            "carbon_intensity": carbon_intensity,
+            "scan_duration": day.scan_duration,
+            "idle_duration": day.idle_duration,
+            "scan_power": scan_power,
+            "idle_power": idle_power,
+            "scanner_energy": energy,
+            "carbon_emissions": emissions,
+        }
+
+
+class Rollup:
+    """Running totals of session rows per scanner, month and country."""
+
+    def __init__(self):
+        self.totals = {}
+        self._last_session = None
+
+    def add(self, row):
+        key = (row["scanner"], row["day"][:7], row["country"])
+        totals = self.totals.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0])
+        # A session is counted once, in the month it starts
+        if row["session"] != self._last_session:
+            totals[0] += 1
+            self._last_session = row["session"]
+        totals[1] += row["scan_duration"]
+        totals[2] += row["idle_duration"]
+        totals[3] += row["scanner_energy"]
+        totals[4] += row["carbon_emissions"]
+
+    def rows(self):
+        """The totals as rows with the ROLLUP_COLUMNS keys, sorted by scanner, month and country."""
+        for key in sorted(self.totals):
+            yield dict(zip(ROLLUP_COLUMNS, (*key, *self.totals[key])))
+
+
+def _write_csv(rows, file_name, columns):
+    with open(file_name, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows([row[column] for column in columns] for row in rows)
+
+
+def process_session_log(log_file, output_file, rollup_file=None, scannerData_filename=SCANNER_DATA_FILE,
+                        countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, intensitySeries_filename=None):
+    """
+    Streams a session log to per session-day results, written as they are computed.
+
+    Args:
+      log_file (str or Path): Session log, CSV or JSON lines.
+      output_file (str or Path): CSV file receiving one row per session and day.
+      rollup_file (str or Path, optional): CSV file receiving the totals per
+        scanner, month and country, written at the end.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      intensitySeries_filename (str or Path, optional): CSV file with time-resolved
+        intensities per zone (see utils.intensity_series), used instead of the
+        annual values.
+
+    Returns:
+      Rollup: The totals per scanner, month and country.
+    """
+    rollup = Rollup()
+    intensity_series = None
+    if intensitySeries_filename is not None:
+        from utils.intensity_series import get_intensity_series
+        intensity_series = get_intensity_series(intensitySeries_filename)
+
+    def rows():
+        days = session_days(parse_segments(read_log_records(log_file)), intensity_series)
+        for row in session_emissions(days, scannerData_filename, countryCarbonIntensity_filename):
+            rollup.add(row)
+            yield row
+
+    _write_csv(rows(), output_file, SESSION_COLUMNS)
+    if rollup_file is not None:
+        _write_csv(rollup.rows(), rollup_file, ROLLUP_COLUMNS)
+    return rollup
@@ -0,0 +1,246 @@
+# Statement templates, shared by get_statement (one summary) and
+# render_statements (a whole results frame).
+#
+# A statement is a sequence of parts, each a str.format template over the
+# summary fields plus the STATEMENT_FIELDS derived from them, and some shown
+# only under a condition (e.g. a year different from the one requested). Each
+# style (plain text for Shiny, Markdown for Streamlit, HTML for reports) is
+# compiled once from the same parts, so the variants cannot diverge. In bulk,
+# every field is formatted once per column and the parts are joined as
+# arrays, without building a dict per row. NumPy and pandas are only imported
+# for the bulk path, and html for the HTML style.
+
+import itertools
+from string import Formatter, Template
+
+# Emissions of the transport references, in gCO2e
+# Return flight London-Paris, one passenger: 2 x 344 km great-circle distance,
+# +8% for routing, at 186 gCO2e per passenger-km (short haul, radiative forcing included)
+FLIGHT_EMISSIONS = 2 * 344 * 1.08 * 186
+# Average WLTP CO2 emissions of new passenger cars in 2023 (EEA)
+CAR_EMISSIONS_PER_KM = 106.4
+CAR_EMISSIONS_PER_MILE = 171
+
+# Fields derived from the summary, available to the templates
+STATEMENT_FIELDS = ["carbon_emissions_kg", "total_emissions_kg", "flight_percent", "car_km", "car_miles"]
+
+STYLES = ("text", "markdown", "html")
+
+# Transport equivalents added to the results by statement_report
+EQUIVALENT_COLUMNS = ["flight_percent", "car_km", "car_miles"]
+
+# Markup of each style, substituted into the parts below
+_MARKUP = {
+    "text": {
+        "open": "", "close": "", "p": "\n", "b": "", "eb": "", "power_unit": "kWh",
+        "emissions": "this amounted to {carbon_emissions_kg:.2f} kilograms of carbon dioxide-equivalent emissions.\n",
+    },
+    "markdown": {
+        "open": "", "close": "", "p": "\n\n", "b": "**", "eb": "**", "power_unit": "kW",
+        "emissions": ("this amounted to: \n\n### {carbon_emissions_kg:.2f} kg CO2e\n\n"
+                      "_(kilograms of carbon dioxide-equivalent emissions)_.\n\n"),
+    },
+    "html": {
+        "open": "<p>", "close": "</p>", "p": "</p>\n<p>", "b": "<strong>", "eb": "</strong>", "power_unit": "kW",
+        "emissions": ("this amounted to:</p>\n<h3>{carbon_emissions_kg:.2f} kg CO2e</h3>\n"
+                      "<p><em>(kilograms of carbon dioxide-equivalent emissions)</em>.</p>\n<p>"),
+    },
+}
+
+# (condition, part): the part is shown when the condition (see _conditions) holds, always for None
+_PARTS = [
+    (None, "${open}"),
+    ("year_differs",
+     "We don't have data for {year} yet, so the estimation provided is computed based on the closest year "
+     "available ({year_eff}) for the country selected, {country}.${p}"),
+    ("is_other",
+     "The value provided below is computed as the median for {field_strength:.1f}T MRI models in our database.${p}"),
+    ("is_model", "You have selected the ${b}{model}${eb} model.${p}"),
+    (None,
+     "For the current study, ${b}{scan_power:.2f} ${power_unit}${eb} was used for MRI scanning for a duration of "
+     "active scanning of {scan_duration:.0f} minutes and an additional ${b}{idle_power:.2f} ${power_unit}${eb} for "
+     "idle scanning for a duration of {idle_duration:.0f} minutes, and ${b}{computing_energy:.2f} kWh${eb} for data "
+     "processing and analysis.${p}"
+     "In {country} in {year_eff}, with a carbon intensity value of {carbon_intensity:.2f} grams of carbon dioxide "
+     "per kWh (gCO2/kWh), ${emissions}"
+     "Adding the cooling of the scanner ({cooling_energy:.2f} kWh), data storage ({storage_energy:.2f} kWh) and "
+     "data processing, the study amounts to a total of ${b}{total_emissions_kg:.2f} kg CO2e${eb}.${p}"
+     "This is equivalent to {flight_percent:.2f}% of a return flight from London to Paris, or {car_km:.0f} km "
+     "({car_miles:.0f} miles) driven in a passenger car.${close}"),
+]
+
+# Text fields, escaped in HTML
+_TEXT_FIELDS = frozenset({"country", "model"})
+
+
+def convert_g2kg(grams):
+    return grams / 1000.0
+
+
+def compute_percents(summary, transport_mode):
+    """
+    Total emissions of a study as a transport equivalent.
+
+    Works on a compute_scan summary as on a compute_scans results frame, for
+    which it returns a column.
+
+    Args:
+      summary (dict or pandas.DataFrame): Result of compute_scan or compute_scans.
+      transport_mode (str): "flight" for the percentage of a return flight from
+        London to Paris, "car" for the miles driven in a passenger car, or
+        "car_km" for the kilometers.
+
+    Returns:
+      float or pandas.Series: The equivalent.
+    """
+    emissions = summary["total_emissions"]
+    if transport_mode == "flight":
+        return 100 * emissions / FLIGHT_EMISSIONS
+    if transport_mode == "car":
+        return emissions / CAR_EMISSIONS_PER_MILE
+    if transport_mode == "car_km":
+        return emissions / CAR_EMISSIONS_PER_KM
+    raise ValueError(f"Unknown transport mode: {transport_mode}")
+
+
+def statement_fields(summary):
+    """The STATEMENT_FIELDS of a summary (or of a results frame, as columns)."""
+    return {
+        "carbon_emissions_kg": convert_g2kg(summary["carbon_emissions"]),
+        "total_emissions_kg": convert_g2kg(summary["total_emissions"]),
+        "flight_percent": compute_percents(summary, "flight"),
+        "car_km": compute_percents(summary, "car_km"),
+        "car_miles": compute_percents(summary, "car"),
+    }
+
+
+class StatementTemplate:
+    """
+    The statement parts of one style, compiled.
+
+    Args:
+      style (str): One of STYLES.
+    """
+
+    def __init__(self, style):
+        if style not in _MARKUP:
+            raise ValueError(f"Unknown statement style: {style}")
+        self.style = style
+        # Markup first (the emissions text has fields of its own), then the fields of each part
+        self.parts = [(condition, Template(part).substitute(_MARKUP[style])) for condition, part in _PARTS]
+        # (literal, field, format spec) tokens of each part, for the bulk path
+        self.tokens = [[(literal, field, spec) for literal, field, spec, _ in Formatter().parse(part)]
+                       for _, part in self.parts]
+
+    def render(self, summary):
+        """Statement of one compute_scan summary."""
+        fields = {**summary, **statement_fields(summary)}
+        if self.style == "html":
+            from html import escape
+            fields.update((name, escape(str(fields[name]))) for name in _TEXT_FIELDS)
+        conditions = _conditions(summary)
+        return "".join(part.format_map(fields) for condition, part in self.parts
+                       if condition is None or conditions[condition])
+
+    def render_many(self, results):
+        """
+        Statements of every row of a results frame.
+
+        Args:
+          results (pandas.DataFrame): Result of compute_scans (SUMMARY_COLUMNS).
+
+        Returns:
+          pandas.Series: One statement per row, on the index of `results`.
+        """
+        import numpy as np
+        import pandas as pd
+
+        derived = statement_fields(results)
+        conditions = {name: np.asarray(value, dtype=bool) for name, value in _conditions(results).items()}
+        formatted = {}  # (field, spec) -> column of text, each formatted once
+
+        def column(field, spec):
+            if (field, spec) not in formatted:
+                # Most fields (country, model, powers...) take few values: each is formatted once
+                values = derived[field] if field in derived else results[field]
+                codes, values = pd.factorize(values, use_na_sentinel=False)
+                text = [format(value, spec) for value in values.tolist()]
+                if self.style == "html" and field in _TEXT_FIELDS:
+                    from html import escape
+                    text = [escape(value) for value in text]
+                formatted[field, spec] = np.array(text, dtype=object)[codes]
+            return formatted[field, spec]
+
+        # Pieces of the statements, in order: literal texts and text columns,
+        # each row then joined once (adding up the columns would copy every
+        # statement again for each piece)
+        pieces = []
+        for (condition, _), tokens in zip(self.parts, self.tokens):
+            part = []
+            for literal, field, spec in tokens:
+                if literal:
+                    part.append(literal)
+                if field is not None:
+                    part.append(column(field, spec))
+            if condition is None:
+                pieces += part
+            else:
+                joined = _join_rows(part, len(results))
+                pieces.append(np.where(conditions[condition], joined, ""))
+        return pd.Series(_join_rows(pieces, len(results)), index=results.index, name=f"statement_{self.style}")
+
+
+def _join_rows(pieces, n_rows):
+    # Pieces are texts (the same on every row) or columns of n_rows texts
+    import numpy as np
+
+    columns = [itertools.repeat(piece, n_rows) if isinstance(piece, str) else piece for piece in pieces]
+    return np.array(["".join(row) for row in zip(*columns)], dtype=object)
+
+
+def _conditions(summary):
+    # Works alike on scalars and on columns
+    return {"year_differs": summary["year"] != summary["year_eff"], "is_other": summary["model"] == "Other",
+            "is_model": summary["model"] != "Other"}
+
+
+_templates = {}
+
+
+def get_template(style):
+    """Compiled StatementTemplate of a style, built once."""
+    if style not in _templates:
+        _templates[style] = StatementTemplate(style)
+    return _templates[style]
+
+
+def render_statement(summary, style="text"):
+    """Statement of one compute_scan summary, in one of STYLES."""
+    return get_template(style).render(summary)
+
+
+def render_statements(results, style="markdown"):
+    """Statements of every row of a compute_scans results frame, as a Series (see StatementTemplate.render_many)."""
+    return get_template(style).render_many(results)
+
+
+def statement_report(results, styles=("markdown",)):
+    """
+    A results frame with the transport equivalents and statements added as columns.
+
+    Args:
+      results (pandas.DataFrame): Result of compute_scans.
+      styles (tuple of str, optional): Styles of the statement columns
+        ("statement_<style>"). Defaults to Markdown only.
+
+    Returns:
+      pandas.DataFrame: The results plus the EQUIVALENT_COLUMNS and one
+        statement column per style.
+    """
+    report = results.copy()
+    fields = statement_fields(results)
+    for name in EQUIVALENT_COLUMNS:
+        report[name] = fields[name]
+    for style in styles:
+        report[f"statement_{style}"] = render_statements(results, style)
+    return report
@@ -0,0 +1,172 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.batch import PARAMETER_COLUMNS, compute_scans
+from utils.carbon_index import get_carbon_index
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.scanners import get_field_strength_table, get_scanner_catalog
+
+# Axes of a sweep, in grid order; "scanner" pairs each model with its field strength
+AXES = ("scanner", "scan_duration", "idle_duration", "sample_size", "country", "year", *PARAMETER_COLUMNS)
+
+
+def _values(value_range):
+    """A sweep range as a 1-d array; a single number or string is a one-value range."""
+    if isinstance(value_range, (str, int, float)):
+        value_range = [value_range]
+    return np.asarray(list(value_range))
+
+
+def _scanner_axis(field_strengths, models, scannerData_filename):
+    catalog = get_scanner_catalog(scannerData_filename)
+    if field_strengths is None:
+        field_strengths = list(get_field_strength_table(scannerData_filename))
+    if models is not None:
+        models = [str(model) for model in _values(models)]
+        unknown = [model for model in models if model != "Other" and model not in catalog]
+        if unknown:
+            raise ValueError(f"Model not found in database: {unknown[0]}")
+
+    pairs = []
+    for field_strength in _values(field_strengths).astype(float):
+        if models is None:
+            candidates = catalog.models(field_strength) + ["Other"]
+        else:
+            candidates = [model for model in models
+                          if model == "Other" or catalog.records[model].field_strength == field_strength]
+        pairs.extend((model, field_strength) for model in candidates)
+    if not pairs:
+        raise ValueError("No scanner model matches the field strengths selected")
+
+    models, field_strengths = zip(*pairs)
+    return np.array(models, dtype=object), np.array(field_strengths, dtype=np.float64)
+
+
+class SweepGrid:
+    """
+    Cartesian grid of studies, evaluated chunk by chunk with compute_scans.
+
+    Every argument is a range of values (a single value is a one-value range).
+    Points are numbered in C order over AXES (the last axis varies fastest), so
+    only the studies of the current chunk are ever materialized.
+
+    Args:
+      field_strengths (list of float, optional): Defaults to all the field
+        strengths of the scanner data.
+      models (list of str, optional): Full model names and/or "Other", each used
+        at the field strengths it exists for. Defaults to every model of the
+        field strengths, plus "Other".
+      scan_durations, idle_durations (list of float, optional): Durations in
+        minutes per participant. Default to 60 and 15.
+      sample_sizes (list of int, optional): Defaults to 1.
+      countries (list of str, optional): Defaults to all the countries of the carbon data.
+      years (list of int, optional): Defaults to every year from the first to
+        the last available in the carbon data.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+      **parameters: Ranges of the storage and computing parameters of
+        compute_scan (PARAMETER_COLUMNS); defaults otherwise.
+    """
+
+    def __init__(self, field_strengths=None, models=None, scan_durations=60, idle_durations=15, sample_sizes=1,
+                 countries=None, years=None, scannerData_filename=SCANNER_DATA_FILE,
+                 countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, **parameters):
+        unknown = [name for name in parameters if name not in PARAMETER_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown sweep parameter: {unknown[0]}")
+
+        carbon_index = get_carbon_index(countryCarbonIntensity_filename)
+        if countries is None:
+            countries = carbon_index.countries
+        if years is None:
+            available = [carbon_index.country_data(country)[0] for country in carbon_index.countries]
+            years = range(min(country_years[0] for country_years in available),
+                          max(country_years[-1] for country_years in available) + 1)
+
+        self.scannerData_filename = scannerData_filename
+        self.countryCarbonIntensity_filename = countryCarbonIntensity_filename
+        self.axes = {
+            "scanner": _scanner_axis(field_strengths, models, scannerData_filename),
+            "scan_duration": _values(scan_durations).astype(np.float64),
+            "idle_duration": _values(idle_durations).astype(np.float64),
+            "sample_size": _values(sample_sizes).astype(np.int64),
+            "country": _values(countries).astype(object),
+            "year": _values(years).astype(np.int64),
+        }
+        for name, default in PARAMETER_COLUMNS.items():
+            self.axes[name] = _values(parameters.get(name, default)).astype(np.float64)
+
+        self.shape = tuple(len(values[0]) if name == "scanner" else len(values) for name, values in self.axes.items())
+        self.size = math.prod(self.shape)
+
+    def coords(self):
+        """Values of each axis, scanner values being (model, field strength) pairs."""
+        coords = {name: list(values) for name, values in self.axes.items()}
+        coords["scanner"] = list(zip(*self.axes["scanner"]))
+        return coords
+
+    def studies(self, start=0, stop=None):
+        """
+        Studies of the points start to stop (excluded), as compute_scans input.
+
+        Durations are totals over the sample, as in the apps.
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        positions = np.unravel_index(np.arange(start, stop), self.shape)
+
+        models, field_strengths = self.axes["scanner"]
+        columns = {"model": models[positions[0]], "field_strength": field_strengths[positions[0]]}
+        for (name, values), position in zip(list(self.axes.items())[1:], positions[1:]):
+            columns[name] = values[position]
+        columns["scan_duration"] = columns["scan_duration"] * columns["sample_size"]
+        columns["idle_duration"] = columns["idle_duration"] * columns["sample_size"]
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, stop))
+
+    def iter_results(self, chunksize=100_000):
+        """
+        Evaluates the grid in chunks of points.
+
+        Yields:
+          pandas.DataFrame: compute_scans results of consecutive points, with the
+            sample_size and PARAMETER_COLUMNS columns added, indexed by point number.
+        """
+        for start in range(0, self.size, chunksize):
+            studies = self.studies(start, start + chunksize)
+            results = compute_scans(studies, self.scannerData_filename, self.countryCarbonIntensity_filename)
+            for name in ("sample_size", *PARAMETER_COLUMNS):
+                results[name] = studies[name]
+            yield results
+
+    def frame(self, chunksize=100_000):
+        """The whole grid as one tidy DataFrame, one row per point."""
+        return pd.concat(self.iter_results(chunksize))
+
+    def cube(self, value="total_emissions", chunksize=100_000):
+        """
+        One result column as an array of shape `shape`, indexed like coords().
+
+        Only this array is kept in memory (8 bytes per point), so large grids
+        can be summarized without building the tidy frame.
+        """
+        cube = np.empty(self.size, dtype=np.float64)
+        for results in self.iter_results(chunksize):
+            cube[results.index[0]:results.index[-1] + 1] = results[value].to_numpy(dtype=np.float64)
+        return cube.reshape(self.shape)
+
+
+def sweep(chunksize=100_000, **ranges):
+    """
+    Emissions of every combination of the parameter ranges, as a tidy DataFrame.
+
+    >>> sweep(field_strengths=7.0, scan_durations=[30, 60, 90])
+
+    Args:
+      chunksize (int, optional): Points evaluated at a time. Defaults to 100,000.
+      **ranges: Arguments of SweepGrid.
+
+    Returns:
+      pandas.DataFrame: One row per point, see SweepGrid.iter_results.
+    """
+    return SweepGrid(**ranges).frame(chunksize)
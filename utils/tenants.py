@@ -0,0 +1,232 @@
+# Per-tenant datasets: each site can add or replace scanner models and carbon
+# intensities of the shipped data (the base), without copying it in memory.
+#
+# A tenant's upload is validated and kept as its override file. Its effective
+# data files (the base rows with the override applied) are written next to it,
+# so every function taking data file names works with them unchanged, and the
+# result caches key on them. In memory, the effective indexes are built from
+# the base ones, sharing every row not overridden (copy on write), and only
+# those of the most recently used tenants are kept:
+#
+#   <root>/<tenant>/overrides/<base file name>   rows uploaded by the tenant
+#   <root>/<tenant>/<base file name>             effective data file
+
+import csv
+import io
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+
+from utils import datasets
+from utils.carbon_index import INTENSITY_COLUMN, get_carbon_index, load_carbon_index
+from utils.datasets import COUNTRY_CARBON_FILE, DATA_DIR, SCANNER_DATA_FILE, read_csv_rows
+from utils.scanners import (ScannerCatalog, build_field_strength_table, get_scanner_records,
+                            load_field_strength_table, load_scanner_catalog, overlay_records, read_scanner_records)
+from utils.validation import check_carbon_rows, check_scanner_rows, raise_problems
+
+TENANTS_DIR = DATA_DIR / "tenants"
+
+# Datasets a tenant can override, in TenantFiles order
+KINDS = ("scanner", "carbon")
+
+_TENANT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+
+class TenantFiles(NamedTuple):
+    """Data files to pass to the calculations for a tenant."""
+    scannerData_filename: Path
+    countryCarbonIntensity_filename: Path
+
+
+def _read(file_name):
+    with open(file_name, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def _write_rows(file_name, header, rows):
+    # Written aside then renamed, so readers never see a partial file
+    temporary = file_name.with_name(file_name.name + ".tmp")
+    with open(temporary, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=header, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temporary, file_name)
+
+
+def _carbon_key(row):
+    return row["Entity"], int(row["Year"])
+
+
+class DatasetRegistry:
+    """
+    Data files of each tenant: the base files, with the rows each tenant uploaded.
+
+    Args:
+      root (str or Path, optional): Directory of the tenants' files, one folder
+        per tenant. Defaults to data/tenants.
+      scannerData_filename (str or Path): Base CSV file with scanner-related specs.
+      countryCarbonIntensity_filename (str or Path): Base CSV file with carbon intensity values.
+      max_active (int, optional): Tenants whose indexes are kept in memory; the
+        least recently used are dropped beyond that, and rebuilt on their next
+        use. Defaults to 16.
+    """
+
+    def __init__(self, root=TENANTS_DIR, scannerData_filename=SCANNER_DATA_FILE,
+                 countryCarbonIntensity_filename=COUNTRY_CARBON_FILE, max_active=16):
+        self.root = Path(root)
+        self.base = TenantFiles(Path(scannerData_filename), Path(countryCarbonIntensity_filename))
+        self.max_active = max_active
+        self._active = OrderedDict()  # tenant -> (TenantFiles, base mtimes), most recently used last
+        self._lock = threading.RLock()
+
+    def _paths(self, tenant, kind):
+        if not _TENANT_NAME.fullmatch(tenant or ""):
+            raise ValueError(f"Invalid tenant name: {tenant!r}")
+        if kind not in KINDS:
+            raise ValueError(f"Unknown dataset: {kind}")
+        name = self.base[KINDS.index(kind)].name
+        return self.root / tenant / "overrides" / name, self.root / tenant / name
+
+    def tenants(self):
+        """Names of the tenants with uploaded data."""
+        if not self.root.is_dir():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if (path / "overrides").is_dir())
+
+    def upload(self, tenant, kind, text):
+        """
+        Validates and stores the rows of a tenant for one dataset, replacing its previous upload.
+
+        Rows are read as the base file's: scanner rows add or replace the model of
+        the same full name, carbon rows the value of the same country and year.
+
+        Args:
+          tenant (str): Tenant name (letters, digits, "_", "-" and ".").
+          kind (str): "scanner" or "carbon".
+          text (str): CSV with some of the base file's columns, including the
+            required ones (see utils.validation).
+
+        Returns:
+          TenantFiles: The tenant's data files.
+
+        Raises:
+          ValueError: Invalid tenant name, columns or rows.
+        """
+        override, effective = self._paths(tenant, kind)
+        reader = csv.DictReader(io.StringIO(text))
+        rows = list(reader)
+        base_header = _read(self.base[KINDS.index(kind)])[0]
+        problems = [f"Unknown column: {column}" for column in reader.fieldnames or () if column not in base_header]
+        check = check_scanner_rows if kind == "scanner" else check_carbon_rows
+        raise_problems(problems or check(reader.fieldnames, rows), f"{kind} data of tenant {tenant}")
+        if not rows:
+            raise ValueError(f"No rows in the {kind} data of tenant {tenant}")
+
+        with self._lock:
+            self._deactivate(tenant)
+            override.parent.mkdir(parents=True, exist_ok=True)
+            # Stored with the base columns, so the effective indexes can be built from it alone
+            _write_rows(override, base_header, rows)
+            self._write_effective(kind, override, effective)
+        return self.files(tenant)
+
+    def remove(self, tenant):
+        """Deletes the data of a tenant."""
+        self._paths(tenant, KINDS[0])
+        with self._lock:
+            self._deactivate(tenant)
+            shutil.rmtree(self.root / tenant, ignore_errors=True)
+
+    def files(self, tenant=None):
+        """
+        Data files of a tenant, loading its indexes if they are not in memory.
+
+        Args:
+          tenant (str, optional): Tenant name. Defaults to None, for the base files.
+
+        Returns:
+          TenantFiles: The effective files of the datasets the tenant overrides,
+            the base files for the others.
+
+        Raises:
+          ValueError: Invalid name, or no data uploaded by the tenant.
+        """
+        if tenant is None:
+            return self.base
+        with self._lock:
+            entry = self._active.get(tenant)
+            if entry is not None and entry[1] == self._base_versions():
+                self._active.move_to_end(tenant)
+                return entry[0]
+
+            files = self._activate(tenant)
+            self._active[tenant] = (files, self._base_versions())
+            self._active.move_to_end(tenant)
+            while len(self._active) > self.max_active:
+                _, (evicted, _) = self._active.popitem(last=False)
+                datasets.evict(*(file_name for file_name in evicted if file_name not in self.base))
+            return files
+
+    def active(self):
+        """Tenants whose indexes are in memory, least recently used first."""
+        with self._lock:
+            return list(self._active)
+
+    def _base_versions(self):
+        return tuple(os.stat(file_name).st_mtime_ns for file_name in self.base)
+
+    def _deactivate(self, tenant):
+        entry = self._active.pop(tenant, None)
+        if entry is not None:
+            datasets.evict(*(file_name for file_name in entry[0] if file_name not in self.base))
+
+    def _activate(self, tenant):
+        if not (self.root / tenant / "overrides").is_dir():
+            self._paths(tenant, KINDS[0])
+            raise ValueError(f"Unknown tenant: {tenant}")
+
+        files = []
+        for kind, base in zip(KINDS, self.base):
+            override, effective = self._paths(tenant, kind)
+            if not override.exists():
+                files.append(base)
+                continue
+            # Rewritten when the base data changed since
+            if not effective.exists() or effective.stat().st_mtime_ns < max(os.stat(base).st_mtime_ns,
+                                                                              override.stat().st_mtime_ns):
+                self._write_effective(kind, override, effective)
+            self._build_indexes(kind, base, override, effective)
+            files.append(effective)
+        return TenantFiles(*files)
+
+    def _write_effective(self, kind, override, effective):
+        base = self.base[KINDS.index(kind)]
+        header, base_rows = _read(base)
+        rows = read_csv_rows(override)
+        if kind == "scanner":
+            # The override's models first, then the other base models, as overlay_records
+            replaced = {row["Manufacturer"] + " " + row["Model"] for row in rows}
+            rows += [row for row in base_rows if row["Manufacturer"] + " " + row["Model"] not in replaced]
+        else:
+            # Values replaced in place, new ones appended, as CarbonIndex.overlay
+            overrides = {_carbon_key(row): row for row in rows}
+            merged = [overrides.pop(_carbon_key(row), row) for row in base_rows]
+            rows = merged + list(overrides.values())
+        _write_rows(effective, header, rows)
+
+    def _build_indexes(self, kind, base, override, effective):
+        # The indexes the loaders would build from the effective file, sharing the base ones
+        if kind == "scanner":
+            records = overlay_records(get_scanner_records(base), read_scanner_records(override))
+            datasets.put(effective, read_scanner_records, records)
+            datasets.put(effective, load_scanner_catalog, ScannerCatalog(records))
+            datasets.put(effective, load_field_strength_table, build_field_strength_table(records))
+        else:
+            rows = read_csv_rows(override)
+            index = get_carbon_index(base).overlay((row["Entity"], row["Year"], row[INTENSITY_COLUMN]) for row in rows)
+            datasets.put(effective, load_carbon_index, index)
@@ -0,0 +1,115 @@
+import numpy as np
+
+from utils.cache import memoize, scan_cache, uncertainty_key
+from utils.carbon_index import get_carbon_index
+from utils.consumptions import COMPONENTS, footprint_consumption
+from utils.datasets import COUNTRY_CARBON_FILE, SCANNER_DATA_FILE
+from utils.metrics import timed
+from utils.scanners import get_reported_powers, get_scanner_catalog
+
+
+def sample_scanner_powers(model, field_strength, draws, rng, scannerData_filename=SCANNER_DATA_FILE):
+    """
+    Draws scan and idle powers (kW) of a scanner model.
+
+    Each power is uniform over the range reported by the manufacturer (a
+    single reported value gives that value). For "Other", each draw first
+    picks one of the models of the field strength at random.
+
+    Args:
+      model (str): Full model name, or "Other".
+      field_strength (float): Field strength in Tesla, used for "Other".
+      draws (int): Number of draws.
+      rng (numpy.random.Generator): Source of randomness.
+      scannerData_filename (str or Path): CSV file with scanner-related specs.
+
+    Returns:
+      tuple: (scan_power, idle_power) arrays of `draws` values.
+    """
+    reported = get_reported_powers(scannerData_filename)
+    if model in reported:
+        candidates = [reported[model]]
+    elif model == "Other":
+        candidates = [reported[other] for other in get_scanner_catalog(scannerData_filename).models(field_strength)]
+        if not candidates:
+            raise ValueError(f"No scan_mode entries for field strength {field_strength}")
+    else:
+        raise ValueError("Model not found in database")
+
+    # Columns: scan low, scan high, idle low, idle high
+    bounds = np.array([[*powers.scan, *powers.idle] for powers in candidates], dtype=np.float64)
+    if len(bounds) > 1:
+        bounds = bounds[rng.integers(len(bounds), size=draws)]
+    scan_power = rng.uniform(bounds[:, 0], bounds[:, 1], size=draws)
+    idle_power = rng.uniform(bounds[:, 2], bounds[:, 3], size=draws)
+    return scan_power, idle_power
+
+
+def sample_carbon_intensity(country, year, draws, rng, year_window=2,
+                            countryCarbonIntensity_filename=COUNTRY_CARBON_FILE):
+    """
+    Draws carbon intensities (gCO2/kWh) of a country around a year.
+
+    Draws are taken evenly from the values of the available years within
+    `year_window` years of the year compute_scan would use.
+
+    Args:
+      country (str): Country as spelled in the carbon data.
+      year (int): Requested year.
+      draws (int): Number of draws.
+      rng (numpy.random.Generator): Source of randomness.
+      year_window (int, optional): Years on each side of the year used. Defaults to 2.
+      countryCarbonIntensity_filename (str or Path): CSV file with carbon intensity values.
+
+    Returns:
+      numpy.ndarray: `draws` carbon intensities.
+    """
+    carbon_index = get_carbon_index(countryCarbonIntensity_filename)
+    year_eff, _ = carbon_index.lookup(country, year)
+    years, intensities = carbon_index.country_data(country)
+    values = np.array([intensity for available_year, intensity in zip(years, intensities)
+                       if abs(available_year - year_eff) <= year_window], dtype=np.float64)
+    return rng.choice(values, size=draws)
+
+
+@memoize(scan_cache, uncertainty_key)
+@timed("compute_scan_uncertainty")
+def compute_scan_uncertainty(modality, model, field_strength, scan_duration, idle_duration, country, year,
+                             scannerData_filename=SCANNER_DATA_FILE, countryCarbonIntensity_filename=COUNTRY_CARBON_FILE,
+                             draws=100_000, seed=0, year_window=2, percentiles=(2.5, 50, 97.5), **parameters):
+    """
+    Monte Carlo version of compute_scan: percentiles of the energy and emissions.
+
+    Scanner powers and carbon intensities are drawn as described in
+    sample_scanner_powers and sample_carbon_intensity, then all the draws go
+    through footprint_consumption as one NumPy batch. The seeded generator
+    makes results reproducible (and cacheable).
+
+    Args:
+      modality, model, field_strength, scan_duration, idle_duration, country,
+        year, scannerData_filename, countryCarbonIntensity_filename: As in compute_scan.
+      draws (int, optional): Number of draws. Defaults to 100,000.
+      seed (int, optional): Seed of the numpy.random.Generator. Defaults to 0.
+      year_window (int, optional): See sample_carbon_intensity. Defaults to 2.
+      percentiles (tuple of float, optional): Percentiles reported. Defaults
+        to (2.5, 50, 97.5), i.e. the median and a 95% interval.
+      **parameters: Storage and computing parameters, as in compute_scan.
+
+    Returns:
+      dict: "draws", "percentiles", and a tuple with the value at each percentile
+        for "<component>_energy" (kWh), "<component>_emissions" (gCO2e) and
+        "total_energy" / "total_emissions".
+    """
+    rng = np.random.default_rng(seed)
+    scan_power, idle_power = sample_scanner_powers(model, field_strength, draws, rng, scannerData_filename)
+    carbon_intensity = sample_carbon_intensity(country, year, draws, rng, year_window, countryCarbonIntensity_filename)
+
+    energy = footprint_consumption(idle_power, scan_power, scan_duration, idle_duration, **parameters)
+    energy["total"] = sum(energy[component] for component in COMPONENTS)
+
+    summary = {"draws": draws, "percentiles": tuple(percentiles)}
+    for component, kwh in energy.items():
+        kwh = np.broadcast_to(kwh, draws)
+        summary[f"{component}_energy"] = tuple(np.percentile(kwh, percentiles).tolist())
+        summary[f"{component}_emissions"] = tuple(np.percentile(carbon_intensity * kwh, percentiles).tolist())
+    return summary
@@ -0,0 +1,226 @@
+# Checks of data files before they are used: uploaded tenant overrides (see
+# utils/tenants.py) and the data files themselves, offline (validate and
+# compile commands of neuro_impact.py, and on load when a file has no
+# up-to-date compiled artifact), so that data errors are found before serving
+# rather than by the requests that hit them. Rows are dicts as read by
+# csv.DictReader; problems are reported with their CSV line numbers.
+
+import csv
+import math
+from typing import List, NamedTuple
+
+from utils.carbon_index import INTENSITY_COLUMN
+from utils.scanners import to_float
+
+# Columns a file must have; scanner files may have the others of the shipped file
+SCANNER_COLUMNS = ["Manufacturer", "Model", "Field strength", "scan_mode", "idle_mode"]
+CARBON_COLUMNS = ["Entity", "Year", INTENSITY_COLUMN]
+
+
+def _missing_columns(header, required):
+    missing = [column for column in required if column not in (header or ())]
+    return [f"Missing column: {column}" for column in missing]
+
+
+def _number(value, line, column, minimum=0.0, strict=False):
+    # Problem with a numeric entry, or None
+    number = to_float(value)
+    if math.isnan(number) or math.isinf(number):
+        return f"Line {line}: {column} is not a number: {value!r}"
+    if number < minimum or (strict and number == minimum):
+        return f"Line {line}: {column} must be {'over' if strict else 'at least'} {minimum:g}: {value!r}"
+    return None
+
+
+def check_scanner_rows(header, rows):
+    """
+    Problems of scanner data rows: missing columns, empty names, non-numeric or
+    negative powers, non-positive field strengths, and duplicated models.
+
+    Args:
+      header (list of str): Column names.
+      rows (iterable of dict): Rows, column -> text.
+
+    Returns:
+      list of str: The problems found, empty for valid rows.
+    """
+    problems = _missing_columns(header, SCANNER_COLUMNS)
+    if problems:
+        return problems
+
+    first_line = {}
+    for line, row in enumerate(rows, start=2):
+        if not row["Manufacturer"].strip() or not row["Model"].strip():
+            problems.append(f"Line {line}: Manufacturer and Model must not be empty")
+            continue
+        problems += filter(None, (_number(row["Field strength"], line, "Field strength", strict=True),
+                                  _number(row["scan_mode"], line, "scan_mode"),
+                                  _number(row["idle_mode"], line, "idle_mode")))
+        model_full = row["Manufacturer"] + " " + row["Model"]
+        if model_full in first_line:
+            problems.append(f"Line {line}: Duplicated model {model_full} (first on line {first_line[model_full]})")
+        else:
+            first_line[model_full] = line
+    return problems
+
+
+def check_carbon_rows(header, rows):
+    """
+    Problems of carbon intensity rows: missing columns, empty countries,
+    non-integer years, non-numeric or negative intensities, and duplicated
+    (country, year) pairs.
+
+    Args:
+      header (list of str): Column names.
+      rows (iterable of dict): Rows, column -> text.
+
+    Returns:
+      list of str: The problems found, empty for valid rows.
+    """
+    problems = _missing_columns(header, CARBON_COLUMNS)
+    if problems:
+        return problems
+
+    first_line = {}
+    for line, row in enumerate(rows, start=2):
+        if not row["Entity"].strip():
+            problems.append(f"Line {line}: Entity must not be empty")
+            continue
+        try:
+            year = int(row["Year"])
+        except ValueError:
+            problems.append(f"Line {line}: Year is not an integer: {row['Year']!r}")
+            continue
+        problem = _number(row[INTENSITY_COLUMN], line, INTENSITY_COLUMN)
+        if problem:
+            problems.append(problem)
+        key = (row["Entity"], year)
+        if key in first_line:
+            problems.append(f"Line {line}: Duplicated year {year} for {row['Entity']} (first on line {first_line[key]})")
+        else:
+            first_line[key] = line
+    return problems
+
+
+def raise_problems(problems, name, shown=10):
+    """Raises a ValueError listing the first problems, if there are any."""
+    if problems:
+        more = f"\n... and {len(problems) - shown} more" if len(problems) > shown else ""
+        raise ValueError(f"Invalid {name}:\n" + "\n".join(problems[:shown]) + more)
+
+
+class ValidationReport(NamedTuple):
+    """Result of the validation of a data file."""
+    file_name: str
+    rows: int
+    errors: List[str]  # the file must not be used
+    warnings: List[str]  # results may be less accurate, e.g. for years not covered
+
+
+def _read(file_name):
+    with open(file_name, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def read_scanner_rows(file_name):
+    """
+    Rows of a scanner data file (column -> text), once checked with check_scanner_rows.
+
+    Raises:
+      ValueError: The file has errors.
+    """
+    header, rows = _read(file_name)
+    raise_problems(check_scanner_rows(header, rows), f"data file {file_name}")
+    return rows
+
+
+def read_carbon_rows(file_name):
+    """
+    Rows of a carbon intensity file (column -> text), once checked with check_carbon_rows.
+
+    Raises:
+      ValueError: The file has errors.
+    """
+    header, rows = _read(file_name)
+    raise_problems(check_carbon_rows(header, rows), f"data file {file_name}")
+    return rows
+
+
+def year_coverage(rows):
+    """
+    Years available per country of carbon intensity rows.
+
+    Returns:
+      dict: country -> sorted list of years, in order of first appearance.
+    """
+    years = {}
+    for row in rows:
+        years.setdefault(row["Entity"], set()).add(int(row["Year"]))
+    return {country: sorted(values) for country, values in years.items()}
+
+
+def check_year_coverage(coverage, years=None):
+    """
+    Gaps in the years of each country (see year_coverage), which the
+    calculations fill with the closest year available.
+
+    Args:
+      coverage (dict): country -> sorted years.
+      years (tuple of int, optional): (first, last) years every country must
+        cover. Defaults to None: only the gaps between the first and last
+        years of each country, and the countries ending before the others,
+        are reported.
+
+    Returns:
+      list of str: The gaps found.
+    """
+    gaps = []
+    latest = max((values[-1] for values in coverage.values()), default=None)
+    for country, values in coverage.items():
+        first, last = years if years is not None else (values[0], values[-1])
+        missing = sorted(set(range(first, last + 1)).difference(values))
+        if missing:
+            gaps.append(f"{country}: no data for {_year_ranges(missing)}")
+        if years is None and values[-1] < latest:
+            gaps.append(f"{country}: no data after {values[-1]} (others up to {latest})")
+    return gaps
+
+
+def _year_ranges(years):
+    # [2001, 2002, 2003, 2007] -> "2001-2003, 2007"
+    ranges = []
+    for year in years:
+        if ranges and ranges[-1][1] == year - 1:
+            ranges[-1][1] = year
+        else:
+            ranges.append([year, year])
+    return ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def validate_scanner_file(file_name):
+    """Validates a scanner data file (see check_scanner_rows)."""
+    header, rows = _read(file_name)
+    return ValidationReport(str(file_name), len(rows), check_scanner_rows(header, rows), [])
+
+
+def validate_carbon_file(file_name, years=None):
+    """
+    Validates a carbon intensity file (see check_carbon_rows), and reports the
+    gaps of its year coverage (see check_year_coverage).
+
+    Args:
+      file_name (str or Path): CSV file with carbon intensity values.
+      years (tuple of int, optional): (first, last) years every country must
+        cover; the gaps are errors then, and warnings otherwise.
+
+    Returns:
+      ValidationReport: The report.
+    """
+    header, rows = _read(file_name)
+    errors = check_carbon_rows(header, rows)
+    if errors:
+        return ValidationReport(str(file_name), len(rows), errors, [])
+    gaps = check_year_coverage(year_coverage(rows), years)
+    return ValidationReport(str(file_name), len(rows), gaps if years is not None else [],
+                            gaps if years is None else [])